@@ -1,3 +1,4 @@
+import sqlite3
 from pathlib import Path
 from functools import partial
 
@@ -129,6 +130,64 @@ def parse_results(result_dir, binder_dir="without_ligand/data_preparation/01-ben
     return results
 
 
+def parse_results_db(result_dir, binder_dir="without_ligand/data_preparation/01-benchmark_pdbs", benchmark_definition="benchmark_pdbs.txt"):
+    """
+    Same as parse_results for searches run with params['results_db'] (results.sqlite in each
+    target directory, see masif_seed_search/source/results_sink.py) instead of .score files.
+    RMSDs are computed from the aligned PDBs of the correct partners; for searches run with
+    params['output_mode'] = 'transform', write them first with materialise.py --seeds.
+    """
+    results = {}
+
+    score_fn = 'nn_score'  # NN score
+    # score_fn = 'desc_dist_score'
+
+    correct_partner = {}
+    with open(benchmark_definition, 'r') as f:
+        for line in f.readlines():
+            line = line.strip()
+
+            if line.startswith("#"):
+                continue
+
+            pdb_id, chain_1, chain_2, drug, sdf_name = line.split(',')
+
+            correct_partner[f"{pdb_id}_{chain_1}"] = f"{pdb_id}_{chain_2}"
+            correct_partner[f"{pdb_id}_{chain_2}"] = f"{pdb_id}_{chain_1}"
+
+    target_dirs = [d for d in result_dir.iterdir() if d.is_dir() and Path(d, 'results.sqlite').exists()]
+    for target_dir in tqdm(target_dirs):
+        target = target_dir.name
+        results[target] = []
+
+        conn = sqlite3.connect(str(Path(target_dir, 'results.sqlite')))
+        # Best hit of every seed (ppi_pair_id) at every site; ties go to the first row.
+        best = {}
+        for site_ix, ppi_pair_id, pid, point_id, score in conn.execute(
+                f"SELECT site_ix, ppi_pair_id, pid, point_id, {score_fn} FROM hits ORDER BY rowid"):
+            if (site_ix, ppi_pair_id) not in best or score > best[(site_ix, ppi_pair_id)][2]:
+                best[(site_ix, ppi_pair_id)] = (pid, point_id, score)
+        conn.close()
+
+        for (site_ix, ppi_pair_id), (pid, point_id, score) in best.items():
+            fields = ppi_pair_id.split('_')
+            chain = fields[1] if pid == 'p1' else fields[2]
+            best_match = Path(target_dir, f"site_{site_ix}", ppi_pair_id, f"{fields[0]}_{chain}_{point_id}.pdb")
+
+            match_info = {'match': f"site_{site_ix}_{best_match.name}", 'score': score}
+
+            # compute RMSD
+            if ppi_pair_id == correct_partner[target]:  # correct match
+                match_info['RMSD'] = compute_rmsd(Path(binder_dir, correct_partner[target] + '.pdb'), best_match)
+                match_info['iRMSD'] = compute_irmsd(Path(binder_dir, correct_partner[target] + '.pdb'),
+                                                    best_match, Path(binder_dir, target + '.pdb'))
+
+            # append to results
+            results[target].append(match_info)
+
+    return results
+
+
 def get_topk(results, k_values):
     found_cumulated = []
     solved = set()
@@ -96,6 +96,9 @@ params['ransac_radius'] = 1.5
 # How much to expand the surface for alignment.
 params['surface_outward_shift'] = 0.25
 
+# Resume interrupted searches from out_dir/journal.jsonl (resubmit the same job).
+# params['journal'] = True
+
 #params['seed_pdb_list'] = ['3R2X000_C', '3R2X001_C', '3R2X002_C', '3R2X003_C']
 """
 
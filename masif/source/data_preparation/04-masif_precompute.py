@@ -2,7 +2,6 @@ import sys
 import time
 import os
 import numpy as np
-from IPython.core.debugger import set_trace
 import warnings 
 with warnings.catch_warnings(): 
     warnings.filterwarnings("ignore",category=FutureWarning)
@@ -14,6 +13,7 @@ np.random.seed(0)
 
 # Load training data (From many files)
 from masif_modules.read_data_from_surface import read_data_from_surface, compute_shape_complementarity
+from input_output.patch_indices import save_patch_indices
 
 print(sys.argv[2])
 
@@ -71,7 +71,7 @@ for ppi_pair_id in ppi_pair_list:
     verts = {}
 
     for pid in pids:
-        input_feat[pid], rho[pid], theta[pid], mask[pid], neigh_indices[pid], iface_labels[pid], verts[pid] = read_data_from_surface(ply_file[pid], params)
+        input_feat[pid], rho[pid], theta[pid], mask[pid], neigh_indices[pid], iface_labels[pid], verts[pid] = read_data_from_surface(ply_file[pid], params, dtype=masif_opts['precomputation_dtype'])
 
     if len(pids) > 1 and masif_app == 'masif_ppi_search':
         start_time = time.time()
@@ -88,6 +88,7 @@ for ppi_pair_id in ppi_pair_list:
         np.save(my_precomp_dir+pid+'_input_feat', input_feat[pid])
         np.save(my_precomp_dir+pid+'_mask', mask[pid])
         np.save(my_precomp_dir+pid+'_list_indices', neigh_indices[pid])
+        save_patch_indices(my_precomp_dir, pid, neigh_indices[pid])
         np.save(my_precomp_dir+pid+'_iface_labels', iface_labels[pid])
         # Save x, y, z
         np.save(my_precomp_dir+pid+'_X.npy', verts[pid][:,0])
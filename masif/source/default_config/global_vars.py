@@ -1,38 +1,37 @@
 # global_vars.py: Global variables used by MaSIF -- mainly pointing to environment variables of programs used by MaSIF.
 # Pablo Gainza - LPDI STI EPFL 2018-2019
 # Released under an Apache License 2.0
+#
+# The programs are resolved when they are first needed (e.g. get_msms_bin() in computeMSMS),
+# so that modules that never call them can be imported without the variables being set.
 
-import os 
-from IPython.core.debugger import set_trace
+import os
+import sys
 epsilon = 1.0e-6
 
-msms_bin= ""
-if 'MSMS_BIN' in os.environ:
-   msms_bin = os.environ['MSMS_BIN']
-else:
-  print("ERROR: MSMS_BIN not set. Variable should point to MSMS program.")
-  sys.exit(1)
-
-pdb2pqr_bin=""
-if 'PDB2PQR_BIN' in os.environ:
-   pdb2pqr_bin = os.environ['PDB2PQR_BIN']
-else:
-  print("ERROR: PDB2PQR_BIN not set. Variable should point to PDB2PQR_BIN program.")
-  sys.exit(1)
-
-apbs_bin=""
-if 'APBS_BIN' in os.environ:
-   apbs_bin = os.environ['APBS_BIN']
-else:
-  print("ERROR: APBS_BIN not set. Variable should point to APBS program.")
-  sys.exit(1)
-  
-multivalue_bin=""
-if 'MULTIVALUE_BIN' in os.environ:
-   multivalue_bin = os.environ['MULTIVALUE_BIN']
-else:
-  print("ERROR: MULTIVALUE_BIN not set. Variable should point to MULTIVALUE program.")
-  sys.exit(1)
+
+def get_env_bin(env_var, program):
+    """ Return the path in env_var; exit with an error message if it is not set. """
+    if env_var in os.environ:
+        return os.environ[env_var]
+    print("ERROR: {} not set. Variable should point to {} program.".format(env_var, program))
+    sys.exit(1)
+
+
+def get_msms_bin():
+    return get_env_bin("MSMS_BIN", "MSMS")
+
+
+def get_pdb2pqr_bin():
+    return get_env_bin("PDB2PQR_BIN", "PDB2PQR")
+
+
+def get_apbs_bin():
+    return get_env_bin("APBS_BIN", "APBS")
+
+
+def get_multivalue_bin():
+    return get_env_bin("MULTIVALUE_BIN", "MULTIVALUE")
 
 
 class NoSolutionError(Exception):
@@ -20,6 +20,9 @@ masif_opts["feature_interpolation"] = True
 
 # Coords params
 masif_opts["radius"] = 12.0
+# dtype of the precomputed patch arrays (rho, theta, mask, input_feat). The networks run in
+# float32; set to "float64" to reproduce precomputations made with older versions.
+masif_opts["precomputation_dtype"] = "float32"
 
 # Neural network patch application specific parameters.
 masif_opts["ppi_search"] = {}
@@ -60,6 +63,10 @@ masif_opts["site"]["model_dir"] = "nn_models/all_feat_3l/model_data/"
 masif_opts["site"]["out_pred_dir"] = "output/all_feat_3l/pred_data/"
 masif_opts["site"]["out_surf_dir"] = "output/all_feat_3l/pred_surfaces/"
 masif_opts["site"]["feat_mask"] = [1.0] * 5
+# Batch mode of masif_site_predict.py (-b): proteins are packed into one graph execution up
+# to this many patches, and up to predict_prefetch batches are loaded ahead.
+masif_opts["site"]["predict_batch_max_patches"] = 30000
+masif_opts["site"]["predict_prefetch"] = 4
 
 # Neural network ligand application specific parameters.
 masif_opts["ligand"] = {}
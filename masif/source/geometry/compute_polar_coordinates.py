@@ -6,25 +6,23 @@ Released under an Apache License 2.0
 """
 
 import sys
-from sklearn.manifold import MDS
-import networkx as nx
 import numpy as np
 import scipy.linalg
-from IPython.core.debugger import set_trace
 from  numpy.linalg import norm
 import time
 from scipy.sparse import csr_matrix, coo_matrix
-import pymesh
 
-def compute_polar_coordinates(mesh, do_fast=True, radius=12, max_vertices=200):
+def compute_polar_coordinates(mesh, do_fast=True, radius=12, max_vertices=200, dtype=np.float32):
     """
     compute_polar_coordinates: compute the polar coordinates for every patch in the mesh. 
+    dtype: dtype of the returned rho, theta and mask matrices.
     Returns: 
         rho: radial coordinates for each patch. padded to zero.
         theta: angle values for each patch. padded to zero. 
         neigh_indices: indices of members of each patch. 
         mask: the mask for rho and theta
     """
+    import networkx as nx
 
     # Vertices, faces and normals
     vertices = mesh.vertices
@@ -100,9 +98,9 @@ def compute_polar_coordinates(mesh, do_fast=True, radius=12, max_vertices=200):
     print('MDS took {:.2f}s'.format((mds_end_t-mds_start_t)))
     
     n = len(d2)
-    theta_out = np.zeros((n, max_vertices))
-    rho_out= np.zeros((n, max_vertices))
-    mask_out = np.zeros((n, max_vertices))
+    theta_out = np.zeros((n, max_vertices), dtype=dtype)
+    rho_out= np.zeros((n, max_vertices), dtype=dtype)
+    mask_out = np.zeros((n, max_vertices), dtype=dtype)
     # neighbors of each key. 
     neigh_indices = []
     
@@ -152,6 +150,7 @@ def compute_thetas(plane, vix, verts, faces, normal, neighbors, idx):
     try:
         assert(valid)
     except:
+        from IPython.core.debugger import set_trace
         set_trace()
      
     # Compute the normal for tt by averagin over the vertex normals
@@ -267,6 +266,7 @@ def output_patch_coords(subv, subf, subn, i, neigh_i, theta, rho):
     """ 
         For debugging purposes, save a patch to visualize it.
     """ 
+    import pymesh
     
     mesh = pymesh.form_mesh(subv, subf)
     n1 = subn[:,0]
@@ -298,6 +298,7 @@ def call_mds(mds_obj, pair_dist):
     return mds_obj.fit_transform(pair_dist)
 
 def compute_theta_all(D, vertices, faces, normals, idx, radius):
+    from sklearn.manifold import MDS
     mymds = MDS(n_components=2, n_init=1, max_iter=50, dissimilarity='precomputed', n_jobs=10)
     all_theta = []
     for i in range(D.shape[0]):
@@ -326,6 +327,7 @@ def compute_theta_all_fast(D, vertices, faces, normals, idx, radius):
         scaling. Then, for points farther than radius/2, the shortest line to the center is used. 
         This speeds up the method by a factor of about 100.
     """
+    from sklearn.manifold import MDS
     mymds = MDS(n_components=2, n_init=1, eps=0.1, max_iter=50, dissimilarity='precomputed', n_jobs=1)
     all_theta = []
     start_loop = time.clock()
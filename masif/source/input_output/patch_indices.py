@@ -0,0 +1,112 @@
+import os
+import sys
+import numpy as np
+
+"""
+patch_indices.py: Row-sliceable storage of the patch (neighbor) indices of a precomputed protein.
+The pickled object array pid_list_indices.npy has to be read and unpickled whole; the packed
+format stores the same lists as memory-mappable arrays:
+    pid_patch_indices.npy  int32 [n_vertices, max_len]  indices of each patch, padded with -1
+    pid_patch_lengths.npy  int32 [n_vertices]           number of indices of each patch
+04-masif_precompute.py writes both formats. To convert an existing precomputation directory:
+    python patch_indices.py precomp_dir [precomp_dir ...]
+This file is part of MaSIF.
+Released under an Apache License 2.0
+"""
+
+pad_value = -1
+
+
+def pack_patch_indices(list_indices):
+    """ Padded int32 matrix and lengths of a list of index arrays. """
+    lengths = np.array([len(x) for x in list_indices], dtype=np.int32)
+    max_len = max(np.max(lengths), 1) if len(lengths) > 0 else 1
+    matrix = np.full((len(list_indices), max_len), pad_value, dtype=np.int32)
+    for ix, neigh in enumerate(list_indices):
+        matrix[ix, : lengths[ix]] = neigh
+    return matrix, lengths
+
+
+def save_patch_indices(out_dir, pid, list_indices):
+    matrix, lengths = pack_patch_indices(list_indices)
+    np.save(os.path.join(out_dir, pid + "_patch_indices.npy"), matrix)
+    np.save(os.path.join(out_dir, pid + "_patch_lengths.npy"), lengths)
+
+
+def has_patch_indices(in_dir, pid):
+    return os.path.exists(os.path.join(in_dir, pid + "_patch_indices.npy")) and os.path.exists(
+        os.path.join(in_dir, pid + "_patch_lengths.npy")
+    )
+
+
+class PatchIndices:
+
+    """
+    Patch indices of one protein, indexed like the list_indices array: patch_indices[vix]
+    is the (int32) index array of the patch centered at vix. Only the rows that are
+    accessed are read from disk when the files are memory-mapped.
+    """
+
+    def __init__(self, matrix, lengths):
+        self.matrix = matrix
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, vix):
+        return np.asarray(self.matrix[vix, : self.lengths[vix]])
+
+    def keys(self):
+        return range(len(self))
+
+    def rows(self, cv):
+        """ Padded matrix and lengths of the patches centered at the vertices cv. """
+        cv = np.asarray(cv)
+        return np.asarray(self.matrix[cv]), np.asarray(self.lengths[cv])
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes + self.lengths.nbytes
+
+
+def load_patch_indices(in_dir, pid, mmap_mode="r"):
+    """
+    PatchIndices of in_dir/pid. Falls back to unpickling pid_list_indices.npy if the packed
+    files have not been written (see the converter in this file).
+    """
+    if has_patch_indices(in_dir, pid):
+        return PatchIndices(
+            np.load(os.path.join(in_dir, pid + "_patch_indices.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(in_dir, pid + "_patch_lengths.npy"), mmap_mode=mmap_mode),
+        )
+    list_indices = np.load(
+        os.path.join(in_dir, pid + "_list_indices.npy"), encoding="latin1", allow_pickle=True
+    )
+    return PatchIndices(*pack_patch_indices(list_indices))
+
+
+def convert_precomputation_dir(precomp_dir):
+    """ Write the packed format next to every pid_list_indices.npy below precomp_dir. """
+    n_converted = 0
+    for root, _, files in os.walk(precomp_dir):
+        for fn in sorted(files):
+            if not fn.endswith("_list_indices.npy"):
+                continue
+            pid = fn[: -len("_list_indices.npy")]
+            if has_patch_indices(root, pid):
+                continue
+            list_indices = np.load(os.path.join(root, fn), encoding="latin1", allow_pickle=True)
+            save_patch_indices(root, pid, list_indices)
+            n_converted += 1
+            if n_converted % 1000 == 0:
+                print("Converted {} patch index files".format(n_converted))
+    print("Converted {} patch index files in {}".format(n_converted, precomp_dir))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python patch_indices.py precomp_dir [precomp_dir ...]")
+        sys.exit(1)
+    for precomp_dir in sys.argv[1:]:
+        convert_precomputation_dir(precomp_dir)
@@ -127,6 +127,87 @@ class MaSIF_ppi_search:
         conv_feat = tf.nn.relu(conv_feat)
         return conv_feat
 
+    def inference_batched(
+        self,
+        input_feat,
+        rho_coords,
+        theta_coords,
+        mask,
+        W_conv,
+        b_conv,
+        mu_rho,
+        sigma_rho,
+        mu_theta,
+        sigma_theta,
+        eps=1e-5,
+        mean_gauss_activation=True,
+    ):
+        """
+        Same computation as inference(), but all rotations are evaluated in a single
+        tensor instead of a Python loop. The rho gaussians do not depend on the rotation
+        and are computed once; the rotated theta gaussians get a leading rotation axis.
+        No new variables are created, so checkpoints are interchangeable.
+        """
+        n_samples = tf.shape(rho_coords)[0]
+        n_vertices = tf.shape(rho_coords)[1]
+        n_feat = tf.shape(input_feat)[2]
+        n_out = W_conv.get_shape().as_list()[1]
+
+        rho_coords_ = tf.reshape(rho_coords, [-1, 1])  # batch_size*n_vertices
+        rho_coords_ = tf.exp(
+            -tf.square(rho_coords_ - mu_rho) / (tf.square(sigma_rho) + eps)
+        )  # batch_size*n_vertices, n_gauss
+
+        rotations = np.arange(self.n_rotations) * 2 * np.pi / self.n_rotations
+        rotations = tf.constant(
+            rotations.reshape(-1, 1, 1).astype("float32")
+        )  # n_rotations, 1, 1
+        thetas_coords_ = (
+            tf.reshape(theta_coords, [1, -1, 1]) + rotations
+        )  # n_rotations, batch_size*n_vertices, 1
+        thetas_coords_ = tf.mod(thetas_coords_, 2 * np.pi)
+        thetas_coords_ = tf.exp(
+            -tf.square(thetas_coords_ - mu_theta) / (tf.square(sigma_theta) + eps)
+        )  # n_rotations, batch_size*n_vertices, n_gauss
+
+        gauss_activations = tf.multiply(
+            tf.expand_dims(rho_coords_, 0), thetas_coords_
+        )  # n_rotations, batch_size*n_vertices, n_gauss
+        gauss_activations = tf.reshape(
+            gauss_activations, [self.n_rotations, n_samples, n_vertices, -1]
+        )  # n_rotations, batch_size, n_vertices, n_gauss
+        gauss_activations = tf.multiply(gauss_activations, mask)
+        if (
+            mean_gauss_activation
+        ):  # computes mean weights for the different gaussians
+            gauss_activations /= (
+                tf.reduce_sum(gauss_activations, 2, keep_dims=True) + eps
+            )  # n_rotations, batch_size, n_vertices, n_gauss
+
+        gauss_activations = tf.expand_dims(
+            gauss_activations, 3
+        )  # n_rotations, batch_size, n_vertices, 1, n_gauss
+        input_feat_ = tf.expand_dims(input_feat, 3)  # batch_size, n_vertices, n_feat, 1
+
+        gauss_desc = tf.multiply(
+            gauss_activations, input_feat_
+        )  # n_rotations, batch_size, n_vertices, n_feat, n_gauss
+        gauss_desc = tf.reduce_sum(
+            gauss_desc, 2
+        )  # n_rotations, batch_size, n_feat, n_gauss
+        gauss_desc = tf.reshape(
+            gauss_desc,
+            [self.n_rotations * n_samples, self.n_thetas * self.n_rhos * n_feat],
+        )  # n_rotations*batch_size, self.n_thetas*self.n_rhos*n_feat
+
+        conv_feat = tf.matmul(gauss_desc, W_conv) + b_conv
+        conv_feat = tf.reshape(
+            conv_feat, [self.n_rotations, -1, n_out]
+        )  # n_rotations, batch_size, n_out
+        conv_feat = tf.reduce_max(conv_feat, 0)
+        conv_feat = tf.nn.relu(conv_feat)
+        return conv_feat
+
     # Softmax cross entropy
     def compute_data_loss_cross_entropy(self, pos, neg):
         epsilon = tf.constant(value=0.00001)
@@ -181,6 +262,7 @@ class MaSIF_ppi_search:
         n_rotations=16,
         idx_gpu="/device:GPU:0",
         feat_mask=[1.0, 1.0, 1.0, 1.0, 1.0],
+        batch_rotations=False,
     ):
 
         # order of the spectral filters
@@ -193,6 +275,11 @@ class MaSIF_ppi_search:
         )  # in MoNet was 0.005 with max radius=0.04 (i.e. 8 times smaller)
         self.sigma_theta_init = 1.0  # 0.25
         self.n_rotations = n_rotations
+        # Evaluate all rotations in one tensor (inference only; same variables).
+        if batch_rotations:
+            inference = self.inference_batched
+        else:
+            inference = self.inference
         self.n_feat = int(sum(feat_mask))
 
         with tf.Graph().as_default() as g:
@@ -231,19 +318,21 @@ class MaSIF_ppi_search:
                         )
                     )  # 1, n_gauss
 
-                self.keep_prob = tf.placeholder(tf.float32)
+                # Inputs and outputs used at inference are named, so that they can be
+                # looked up in a frozen graph (see masif_modules/frozen_model.py).
+                self.keep_prob = tf.placeholder(tf.float32, name="keep_prob")
                 # **Features for binder should be flipped before feeding to the NN.
                 self.rho_coords = tf.placeholder(
-                    tf.float32, shape=[None, None, 1]
+                    tf.float32, shape=[None, None, 1], name="rho_coords"
                 )  # batch_size, n_vertices, 1
                 self.theta_coords = tf.placeholder(
-                    tf.float32, shape=[None, None, 1]
+                    tf.float32, shape=[None, None, 1], name="theta_coords"
                 )  # batch_size, n_vertices, 1
                 self.input_feat = tf.placeholder(
-                    tf.float32, shape=[None, None, self.n_feat]
+                    tf.float32, shape=[None, None, self.n_feat], name="input_feat"
                 )  # batch_size, n_vertices, n_feat
                 self.mask = tf.placeholder(
-                    tf.float32, shape=[None, None, 1]
+                    tf.float32, shape=[None, None, 1], name="mask"
                 )  # batch_size, n_vertices, 1
 
                 self.global_desc = []
@@ -270,7 +359,7 @@ class MaSIF_ppi_search:
                         initializer=tf.contrib.layers.xavier_initializer(),
                     )
 
-                    desc = self.inference(
+                    desc = inference(
                         my_input_feat,
                         self.rho_coords,
                         self.theta_coords,
@@ -297,6 +386,7 @@ class MaSIF_ppi_search:
                     self.n_thetas * self.n_rhos,
                     activation_fn=tf.identity,
                 )  # batch_size, n_thetas
+                self.global_desc = tf.identity(self.global_desc, name="global_desc")
 
                 # compute data loss
                 self.n_patches = tf.shape(self.global_desc)[0] // 4
@@ -130,6 +130,87 @@ class MaSIF_site:
         conv_feat = tf.nn.relu(conv_feat)
         return conv_feat
 
+    def inference_batched(
+        self,
+        input_feat,
+        rho_coords,
+        theta_coords,
+        mask,
+        W_conv,
+        b_conv,
+        mu_rho,
+        sigma_rho,
+        mu_theta,
+        sigma_theta,
+        eps=1e-5,
+        mean_gauss_activation=True,
+    ):
+        """
+        Same computation as inference(), but all rotations are evaluated in a single
+        tensor instead of a Python loop. The rho gaussians do not depend on the rotation
+        and are computed once; the rotated theta gaussians get a leading rotation axis.
+        No new variables are created, so checkpoints are interchangeable.
+        """
+        n_samples = tf.shape(rho_coords)[0]
+        n_vertices = tf.shape(rho_coords)[1]
+        n_feat = tf.shape(input_feat)[2]
+        n_out = W_conv.get_shape().as_list()[1]
+
+        rho_coords_ = tf.reshape(rho_coords, [-1, 1])  # batch_size*n_vertices
+        rho_coords_ = tf.exp(
+            -tf.square(rho_coords_ - mu_rho) / (tf.square(sigma_rho) + eps)
+        )  # batch_size*n_vertices, n_gauss
+
+        rotations = np.arange(self.n_rotations) * 2 * np.pi / self.n_rotations
+        rotations = tf.constant(
+            rotations.reshape(-1, 1, 1).astype("float32")
+        )  # n_rotations, 1, 1
+        thetas_coords_ = (
+            tf.reshape(theta_coords, [1, -1, 1]) + rotations
+        )  # n_rotations, batch_size*n_vertices, 1
+        thetas_coords_ = tf.mod(thetas_coords_, 2 * np.pi)
+        thetas_coords_ = tf.exp(
+            -tf.square(thetas_coords_ - mu_theta) / (tf.square(sigma_theta) + eps)
+        )  # n_rotations, batch_size*n_vertices, n_gauss
+
+        gauss_activations = tf.multiply(
+            tf.expand_dims(rho_coords_, 0), thetas_coords_
+        )  # n_rotations, batch_size*n_vertices, n_gauss
+        gauss_activations = tf.reshape(
+            gauss_activations, [self.n_rotations, n_samples, n_vertices, -1]
+        )  # n_rotations, batch_size, n_vertices, n_gauss
+        gauss_activations = tf.multiply(gauss_activations, mask)
+        if (
+            mean_gauss_activation
+        ):  # computes mean weights for the different gaussians
+            gauss_activations /= (
+                tf.reduce_sum(gauss_activations, 2, keep_dims=True) + eps
+            )  # n_rotations, batch_size, n_vertices, n_gauss
+
+        gauss_activations = tf.expand_dims(
+            gauss_activations, 3
+        )  # n_rotations, batch_size, n_vertices, 1, n_gauss
+        input_feat_ = tf.expand_dims(input_feat, 3)  # batch_size, n_vertices, n_feat, 1
+
+        gauss_desc = tf.multiply(
+            gauss_activations, input_feat_
+        )  # n_rotations, batch_size, n_vertices, n_feat, n_gauss
+        gauss_desc = tf.reduce_sum(
+            gauss_desc, 2
+        )  # n_rotations, batch_size, n_feat, n_gauss
+        gauss_desc = tf.reshape(
+            gauss_desc,
+            [self.n_rotations * n_samples, self.n_thetas * self.n_rhos * n_feat],
+        )  # n_rotations*batch_size, self.n_thetas*self.n_rhos*n_feat
+
+        conv_feat = tf.matmul(gauss_desc, W_conv) + b_conv
+        conv_feat = tf.reshape(
+            conv_feat, [self.n_rotations, -1, n_out]
+        )  # n_rotations, batch_size, n_out
+        conv_feat = tf.reduce_max(conv_feat, 0)
+        conv_feat = tf.nn.relu(conv_feat)
+        return conv_feat
+
     def compute_data_loss(self, neg_thresh=1e1):
         pos_thresh = 4.0
         neg_thresh = 0.0
@@ -158,6 +239,7 @@ class MaSIF_site:
         feat_mask=[1.0, 1.0, 1.0, 1.0, 1.0],
         n_conv_layers=1,
         optimizer_method="Adam",
+        batch_rotations=False,
     ):
 
         # order of the spectral filters
@@ -170,6 +252,11 @@ class MaSIF_site:
         )  # in MoNet was 0.005 with max radius=0.04 (i.e. 8 times smaller)
         self.sigma_theta_init = 1.0  # 0.25
         self.n_rotations = n_rotations
+        # Evaluate all rotations in one tensor (inference only; same variables).
+        if batch_rotations:
+            inference = self.inference_batched
+        else:
+            inference = self.inference
         self.n_feat = int(sum(feat_mask))
         self.n_labels = 2
 
@@ -254,24 +341,28 @@ class MaSIF_site:
                         name="sigma_theta_{}".format("l4"),
                     )
 
+                # Inputs and outputs used at inference are named, so that they can be
+                # looked up in a frozen graph (see masif_modules/frozen_model.py).
                 self.rho_coords = tf.placeholder(
-                    tf.float32
+                    tf.float32, name="rho_coords"
                 )  # batch_size, n_vertices, 1
                 self.theta_coords = tf.placeholder(
-                    tf.float32
+                    tf.float32, name="theta_coords"
                 )  # batch_size, n_vertices, 1
                 self.input_feat = tf.placeholder(
-                    tf.float32, shape=[None, None, self.n_feat]
+                    tf.float32, shape=[None, None, self.n_feat], name="input_feat"
                 )  # batch_size, n_vertices, n_feat
-                self.mask = tf.placeholder(tf.float32)  # batch_size, n_vertices, 1
+                self.mask = tf.placeholder(
+                    tf.float32, name="mask"
+                )  # batch_size, n_vertices, 1
 
                 self.pos_idx = tf.placeholder(tf.int32)  # batch_size/2
                 self.neg_idx = tf.placeholder(tf.int32)  # batch_size/2
                 self.labels = tf.placeholder(tf.int32)  # batch_size, n_labels
                 self.indices_tensor = tf.placeholder(
-                    tf.int32
+                    tf.int32, name="indices_tensor"
                 )  # batch_size, max_verts (< 30)
-                self.keep_prob = tf.placeholder(tf.float32)  # scalar
+                self.keep_prob = tf.placeholder(tf.float32, name="keep_prob")  # scalar
 
                 self.global_desc = []
 
@@ -301,7 +392,7 @@ class MaSIF_site:
                     mask = self.mask
 
                     self.global_desc.append(
-                        self.inference(
+                        inference(
                             my_input_feat,
                             rho_coords,
                             theta_coords,
@@ -347,7 +438,7 @@ class MaSIF_site:
                         tf.zeros([self.n_thetas * self.n_rhos * self.n_feat]),
                         name="b_conv_l2",
                     )
-                    self.global_desc = self.inference(
+                    self.global_desc = inference(
                         self.global_desc,
                         rho_coords,
                         theta_coords,
@@ -387,7 +478,7 @@ class MaSIF_site:
                         tf.zeros([self.n_thetas * self.n_rhos * self.n_feat]),
                         name="b_conv_l3",
                     )
-                    self.global_desc = self.inference(
+                    self.global_desc = inference(
                         self.global_desc,
                         rho_coords,
                         theta_coords,
@@ -426,7 +517,7 @@ class MaSIF_site:
                         ),
                         name="b_conv_l4",
                     )
-                    self.global_desc = self.inference(
+                    self.global_desc = inference(
                         self.global_desc,
                         rho_coords,
                         theta_coords,
@@ -482,7 +573,9 @@ class MaSIF_site:
                 self.eval_score = tf.squeeze(self.eval_logits)[:, 0]
 
                 self.full_logits = tf.nn.sigmoid(self.logits)
-                self.full_score = tf.squeeze(self.full_logits)[:, 0]
+                self.full_score = tf.identity(
+                    tf.squeeze(self.full_logits)[:, 0], name="full_score"
+                )
 
                 # definition of the solver
                 if optimizer_method == "AMSGrad":
@@ -0,0 +1,100 @@
+"""
+benchmark_import_time.py: Measure the start-up cost of the MaSIF entry scripts.
+The module-level import statements of each script are executed in a fresh interpreter
+(with masif/source and the script directory on the path, as in the shell wrappers), and
+the total time and the slowest statements are reported. The rest of the script is not run.
+This file is part of MaSIF.
+Released under an Apache License 2.0
+
+Usage: python benchmark_import_time.py [n_repeats] [script.py ...]
+"""
+
+import os
+import ast
+import sys
+import json
+import subprocess
+
+masif_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+masif_source = os.path.join(masif_root, "masif", "source")
+
+entry_scripts = [
+    "masif/source/data_preparation/01-pdb_extract_and_triangulate.py",
+    "masif/source/data_preparation/04-masif_precompute.py",
+    "masif/source/masif_site/masif_site_predict.py",
+    "masif/source/masif_site/masif_site_label_surface.py",
+    "masif/source/masif_ppi_search/masif_ppi_search_comp_desc.py",
+    "masif_seed_search/source/masif_seed_search_nn.py",
+    "masif_seed_search/source/masif_seed_search_score_only.py",
+]
+
+# Executed in the child interpreter: time each statement, keep going on failures.
+timer_code = """
+import sys, time, json
+timings = []
+for statement in json.loads(sys.argv[1]):
+    tic = time.time()
+    try:
+        exec(statement)
+        error = None
+    except BaseException as e:
+        error = "{}: {}".format(type(e).__name__, e)
+    timings.append((statement, time.time() - tic, error))
+print(json.dumps(timings))
+"""
+
+
+def top_level_imports(script_fn):
+    """ Return the module-level import statements of script_fn as source strings. """
+    with open(script_fn) as f:
+        tree = ast.parse(f.read())
+    statements = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = node.names
+            prefix = "import "
+        elif isinstance(node, ast.ImportFrom):
+            names = node.names
+            prefix = "from {}{} import ".format("." * node.level, node.module or "")
+        else:
+            continue
+        statements.append(
+            prefix
+            + ", ".join(
+                alias.name + (" as " + alias.asname if alias.asname else "")
+                for alias in names
+            )
+        )
+    return statements
+
+
+def time_imports(script_fn, statements):
+    script_dir = os.path.dirname(os.path.abspath(script_fn))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [masif_source, script_dir] + [p for p in [env.get("PYTHONPATH")] if p]
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-c", timer_code, json.dumps(statements)], cwd=script_dir, env=env
+    )
+    return json.loads(output.decode("utf-8").strip().split("\n")[-1])
+
+
+if __name__ == "__main__":
+    n_repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    scripts = sys.argv[2:] or [os.path.join(masif_root, fn) for fn in entry_scripts]
+
+    for script_fn in scripts:
+        statements = top_level_imports(script_fn)
+        # Keep the fastest repetition (warm file system cache, compiled bytecode).
+        runs = [time_imports(script_fn, statements) for _ in range(n_repeats)]
+        timings = min(runs, key=lambda run: sum(t for _, t, _ in run))
+        total = sum(t for _, t, _ in timings)
+        print("{}: {:.2f}s ({} import statements)".format(
+            os.path.relpath(script_fn, masif_root), total, len(statements)
+        ))
+        for statement, t, _ in sorted(timings, key=lambda x: -x[1])[:3]:
+            print("    {:.2f}s  {}".format(t, statement))
+        for statement, _, error in timings:
+            if error is not None:
+                print("    failed: {} ({})".format(statement, error))
@@ -0,0 +1,113 @@
+"""
+benchmark_rotation_batching.py: Compare the looped and the rotation-batched inference graphs
+of MaSIF-site and MaSIF-search (graph build time, inference time, and outputs).
+Weights of the looped model are saved to a temporary checkpoint and restored into the
+batched model, which also checks that both graphs share the same checkpoint layout.
+This file is part of MaSIF.
+Released under an Apache License 2.0
+
+Usage: python benchmark_rotation_batching.py {masif_site | masif_ppi_search} [n_patches] [n_repeats]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+from default_config.masif_opts import masif_opts
+from masif_modules import frozen_model
+
+
+def build_model(masif_app, params, batch_rotations):
+    tic = time.time()
+    learning_obj = frozen_model.build_model(masif_app, params, batch_rotations)
+    return learning_obj, time.time() - tic
+
+
+def random_patches(n_patches, max_verts, max_rho, n_feat, seed=0):
+    """ Random but well-formed patches: a prefix of each row is masked in. """
+    rng = np.random.RandomState(seed)
+    n_members = rng.randint(max_verts // 4, max_verts + 1, size=n_patches)
+    mask = (np.arange(max_verts)[None, :] < n_members[:, None]).astype(np.float32)
+    rho = rng.uniform(0, max_rho, size=(n_patches, max_verts)).astype(np.float32) * mask
+    theta = (
+        rng.uniform(0, 2 * np.pi, size=(n_patches, max_verts)).astype(np.float32) * mask
+    )
+    input_feat = rng.normal(size=(n_patches, max_verts, n_feat)).astype(np.float32)
+    input_feat *= mask[:, :, None]
+    indices = rng.randint(0, n_patches, size=(n_patches, max_verts))
+    return rho, theta, input_feat, mask, indices
+
+
+def make_feed(masif_app, learning_obj, rho, theta, input_feat, mask, indices):
+    if masif_app == "masif_site":
+        feed_dict = {
+            learning_obj.rho_coords: rho,
+            learning_obj.theta_coords: theta,
+            learning_obj.input_feat: input_feat,
+            learning_obj.mask: np.expand_dims(mask, 2),
+            learning_obj.indices_tensor: indices,
+        }
+        return learning_obj.full_score, feed_dict
+    feed_dict = {
+        learning_obj.rho_coords: np.expand_dims(rho, 2),
+        learning_obj.theta_coords: np.expand_dims(theta, 2),
+        learning_obj.input_feat: input_feat,
+        learning_obj.mask: np.expand_dims(mask, 2),
+        learning_obj.keep_prob: 1.0,
+    }
+    return learning_obj.global_desc, feed_dict
+
+
+def time_inference(learning_obj, output, feed_dict, n_repeats):
+    # First call includes one-off allocation costs; report it separately.
+    tic = time.time()
+    result = learning_obj.session.run(output, feed_dict=feed_dict)
+    first = time.time() - tic
+    times = []
+    for _ in range(n_repeats):
+        tic = time.time()
+        learning_obj.session.run(output, feed_dict=feed_dict)
+        times.append(time.time() - tic)
+    return result, first, np.median(times)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ["masif_site", "masif_ppi_search"]:
+        print(__doc__)
+        sys.exit(1)
+    masif_app = sys.argv[1]
+    params = masif_opts["site"] if masif_app == "masif_site" else masif_opts["ppi_search"]
+    n_patches = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    n_repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    patches = random_patches(
+        n_patches,
+        params["max_shape_size"],
+        params["max_distance"],
+        int(sum(params["feat_mask"])),
+    )
+
+    ckpt_dir = tempfile.mkdtemp()
+    results = {}
+    for batch_rotations in [False, True]:
+        learning_obj, build_time = build_model(masif_app, params, batch_rotations)
+        if not batch_rotations:
+            learning_obj.saver.save(learning_obj.session, os.path.join(ckpt_dir, "model"))
+        else:
+            learning_obj.saver.restore(learning_obj.session, os.path.join(ckpt_dir, "model"))
+        n_nodes = len(learning_obj.graph.as_graph_def().node)
+        output, feed_dict = make_feed(masif_app, learning_obj, *patches)
+        result, first, median = time_inference(learning_obj, output, feed_dict, n_repeats)
+        results[batch_rotations] = result
+        print(
+            "{} batch_rotations={}: graph nodes: {}; build time: {:.2f}s; "
+            "first run: {:.3f}s; median run ({} patches): {:.3f}s".format(
+                masif_app, batch_rotations, n_nodes, build_time, first, n_patches, median
+            )
+        )
+        learning_obj.session.close()
+
+    max_diff = np.max(np.abs(results[True] - results[False]))
+    print("Maximum absolute difference between outputs: {:.3g}".format(max_diff))
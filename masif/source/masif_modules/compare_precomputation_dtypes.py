@@ -0,0 +1,121 @@
+"""
+compare_precomputation_dtypes.py: Validate a float32 precomputation against a float64 one.
+For each ppi_pair_id, reports the on-disk size of both precomputations, the largest
+difference in the patch arrays, and the largest difference in the MaSIF-site scores or
+MaSIF-search descriptors computed from them.
+This file is part of MaSIF.
+Released under an Apache License 2.0
+
+Usage: python compare_precomputation_dtypes.py {masif_site | masif_ppi_search} {custom_params_module}
+           {float64_precomputation_dir} PPI_PAIR_ID [PPI_PAIR_ID ...]
+The float32 precomputation is read from params["masif_precomputation_dir"]. The float64 one
+is produced by running 04-masif_precompute.py with masif_opts["precomputation_dtype"] = "float64"
+and a different masif_precomputation_dir.
+"""
+
+import os
+import sys
+import importlib
+import numpy as np
+
+from default_config.masif_opts import masif_opts
+from masif_modules.frozen_model import load_inference_model
+from masif_modules.train_masif_site import run_masif_site, mask_input_feat
+from masif_modules.train_ppi_search import compute_val_test_desc
+
+patch_arrays = ["rho_wrt_center", "theta_wrt_center", "input_feat", "mask"]
+
+
+def load_precomputation(in_dir, pid):
+    data = {}
+    for name in patch_arrays:
+        data[name] = np.load(os.path.join(in_dir, pid + "_" + name + ".npy"))
+    data["list_indices"] = np.load(
+        os.path.join(in_dir, pid + "_list_indices.npy"), encoding="latin1", allow_pickle=True
+    )
+    return data
+
+
+def precomputation_size(in_dir, pid):
+    return sum(
+        os.path.getsize(os.path.join(in_dir, pid + "_" + name + ".npy")) for name in patch_arrays
+    )
+
+
+def run_model(masif_app, params, learning_obj, data):
+    input_feat = mask_input_feat(data["input_feat"], params["feat_mask"])
+    if masif_app == "masif_site":
+        return run_masif_site(
+            params,
+            learning_obj,
+            data["rho_wrt_center"],
+            data["theta_wrt_center"],
+            input_feat,
+            data["mask"],
+            data["list_indices"],
+        )[0]
+    idx = np.arange(len(data["mask"]))
+    return compute_val_test_desc(
+        learning_obj,
+        idx,
+        data["rho_wrt_center"],
+        data["theta_wrt_center"],
+        input_feat,
+        data["mask"],
+        batch_size=1000,
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 5 or sys.argv[1] not in ["masif_site", "masif_ppi_search"]:
+        print(__doc__)
+        sys.exit(1)
+    masif_app = sys.argv[1]
+    params = masif_opts["site"] if masif_app == "masif_site" else masif_opts["ppi_search"]
+    custom_params = importlib.import_module(sys.argv[2], package=None)
+    custom_params = custom_params.custom_params
+    for key in custom_params:
+        params[key] = custom_params[key]
+    ref_dir = sys.argv[3]
+    ppi_pair_ids = sys.argv[4:]
+
+    learning_obj = load_inference_model(masif_app, params)
+
+    max_output_diff = 0.0
+    total_size = {"float32": 0, "float64": 0}
+    for ppi_pair_id in ppi_pair_ids:
+        dirs = {
+            "float32": os.path.join(params["masif_precomputation_dir"], ppi_pair_id),
+            "float64": os.path.join(ref_dir, ppi_pair_id),
+        }
+        fields = ppi_pair_id.split("_")
+        pids = ["p1"] if len(fields) == 2 or fields[2] == "" else ["p1", "p2"]
+        for pid in pids:
+            data = {key: load_precomputation(dirs[key], pid) for key in dirs}
+            sizes = {key: precomputation_size(dirs[key], pid) for key in dirs}
+            for key in sizes:
+                total_size[key] += sizes[key]
+            input_diff = max(
+                np.max(np.abs(data["float32"][name].astype(np.float64) - data["float64"][name]))
+                for name in patch_arrays
+            )
+            outputs = {key: run_model(masif_app, params, learning_obj, data[key]) for key in data}
+            output_diff = np.max(np.abs(outputs["float32"] - outputs["float64"]))
+            max_output_diff = max(max_output_diff, output_diff)
+            print(
+                "{} {}: size float32 {:.1f} MB, float64 {:.1f} MB; "
+                "max input diff {:.3g}; max output diff {:.3g}".format(
+                    ppi_pair_id,
+                    pid,
+                    sizes["float32"] / 1e6,
+                    sizes["float64"] / 1e6,
+                    input_diff,
+                    output_diff,
+                )
+            )
+
+    print(
+        "Total size float32 {:.1f} MB, float64 {:.1f} MB; max output diff {:.3g}".format(
+            total_size["float32"] / 1e6, total_size["float64"] / 1e6, max_output_diff
+        )
+    )
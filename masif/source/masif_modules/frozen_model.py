@@ -0,0 +1,148 @@
+"""
+frozen_model.py: Export the inference subgraph of a trained MaSIF-site or MaSIF-search
+network, with its weights folded into constants, to a single GraphDef file; load it back
+for prediction without rebuilding the training graph or restoring a checkpoint.
+This file is part of MaSIF.
+Released under an Apache License 2.0
+
+Usage: python frozen_model.py {masif_site | masif_ppi_search} {custom_params_module}
+The frozen graph is written to params["model_dir"] + "frozen_model.pb"; masif_site_predict.py
+and masif_ppi_search_comp_desc.py use it automatically when it exists.
+"""
+
+import os
+import sys
+import importlib
+import tensorflow as tf
+
+from default_config.masif_opts import masif_opts
+
+frozen_model_fn = "frozen_model.pb"
+
+# Tensors fed and fetched by the prediction scripts. Placeholders that do not feed the
+# outputs (e.g. keep_prob) are kept explicitly so that existing feed_dicts still work.
+input_names = {
+    "masif_site": ["rho_coords", "theta_coords", "input_feat", "mask", "indices_tensor"],
+    "masif_ppi_search": ["rho_coords", "theta_coords", "input_feat", "mask", "keep_prob"],
+}
+output_names = {
+    "masif_site": ["full_score"],
+    "masif_ppi_search": ["global_desc"],
+}
+
+
+def build_model(masif_app, params, batch_rotations=True):
+    """ Build the network with the hyperparameters used by the prediction scripts. """
+    if masif_app == "masif_site":
+        from masif_modules.MaSIF_site import MaSIF_site
+
+        return MaSIF_site(
+            params["max_distance"],
+            n_thetas=4,
+            n_rhos=3,
+            n_rotations=4,
+            idx_gpu="/gpu:0",
+            feat_mask=params["feat_mask"],
+            n_conv_layers=params["n_conv_layers"],
+            batch_rotations=batch_rotations,
+        )
+    elif masif_app == "masif_ppi_search":
+        from masif_modules.MaSIF_ppi_search import MaSIF_ppi_search
+
+        return MaSIF_ppi_search(
+            params["max_distance"],
+            n_thetas=16,
+            n_rhos=5,
+            n_rotations=16,
+            idx_gpu="/gpu:0",
+            feat_mask=params["feat_mask"],
+            batch_rotations=batch_rotations,
+        )
+    raise ValueError("Unknown MaSIF application: {}".format(masif_app))
+
+
+def export_frozen_model(learning_obj, masif_app, out_fn):
+    """ Freeze the inference subgraph of learning_obj and write it to out_fn. """
+    graph_def = learning_obj.graph.as_graph_def()
+    # Let the loader decide on placement.
+    for node in graph_def.node:
+        node.device = ""
+    frozen_graph_def = tf.graph_util.convert_variables_to_constants(
+        learning_obj.session,
+        graph_def,
+        input_names[masif_app] + output_names[masif_app],
+    )
+    with tf.gfile.GFile(out_fn, "wb") as f:
+        f.write(frozen_graph_def.SerializeToString())
+    return frozen_graph_def
+
+
+class FrozenModel:
+
+    """
+    Inference-only stand-in for MaSIF_site / MaSIF_ppi_search, backed by a frozen graph.
+    Exposes the same tensor attributes and session used by run_masif_site and
+    compute_val_test_desc.
+    """
+
+    def __init__(self, frozen_fn, masif_app):
+        graph_def = tf.GraphDef()
+        with tf.gfile.GFile(frozen_fn, "rb") as f:
+            graph_def.ParseFromString(f.read())
+        with tf.Graph().as_default() as g:
+            self.graph = g
+            tf.import_graph_def(graph_def, name="")
+        for name in input_names[masif_app] + output_names[masif_app]:
+            setattr(self, name, g.get_tensor_by_name(name + ":0"))
+        config = tf.ConfigProto(allow_soft_placement=True)
+        config.gpu_options.allow_growth = True
+        self.session = tf.Session(graph=g, config=config)
+
+
+def load_inference_model(masif_app, params):
+    """
+    Return the frozen model from params["model_dir"] if it exists and is not older than
+    the checkpoint; otherwise build the full network and restore the checkpoint.
+    """
+    frozen_fn = os.path.join(params["model_dir"], frozen_model_fn)
+    ckpt_index = params["model_dir"] + "model.index"
+    if os.path.exists(frozen_fn):
+        if os.path.exists(ckpt_index) and os.path.getmtime(ckpt_index) > os.path.getmtime(
+            frozen_fn
+        ):
+            print("Frozen model {} is older than the checkpoint; ignoring it.".format(frozen_fn))
+        else:
+            print("Loading frozen model from: " + frozen_fn)
+            return FrozenModel(frozen_fn, masif_app)
+
+    learning_obj = build_model(masif_app, params)
+    print("Restoring model from: " + params["model_dir"] + "model")
+    learning_obj.saver.restore(learning_obj.session, params["model_dir"] + "model")
+    return learning_obj
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in input_names:
+        print(__doc__)
+        sys.exit(1)
+    masif_app = sys.argv[1]
+    params = masif_opts["site"] if masif_app == "masif_site" else masif_opts["ppi_search"]
+    custom_params = importlib.import_module(sys.argv[2], package=None)
+    custom_params = custom_params.custom_params
+    for key in custom_params:
+        print("Setting {} to {} ".format(key, custom_params[key]))
+        params[key] = custom_params[key]
+
+    learning_obj = build_model(masif_app, params)
+    print("Restoring model from: " + params["model_dir"] + "model")
+    learning_obj.saver.restore(learning_obj.session, params["model_dir"] + "model")
+    out_fn = os.path.join(params["model_dir"], frozen_model_fn)
+    frozen_graph_def = export_frozen_model(learning_obj, masif_app, out_fn)
+    print(
+        "Wrote frozen {} graph ({} nodes, full graph had {}) to {}".format(
+            masif_app,
+            len(frozen_graph_def.node),
+            len(learning_obj.graph.as_graph_def().node),
+            out_fn,
+        )
+    )
@@ -1,25 +1,22 @@
 # coding: utf-8
 # ## Imports and helper functions
-from IPython.core.debugger import set_trace
-import pymesh
 import time
 import numpy as np
 
 from geometry.compute_polar_coordinates import compute_polar_coordinates
-from input_output.save_ply import save_ply
 
-from sklearn import metrics
 
-
-def read_data_from_surface(ply_fn, params):
+def read_data_from_surface(ply_fn, params, dtype=np.float32):
     """
     # Read data from a ply file -- decompose into patches. 
+    # dtype: dtype of the patch matrices (input_feat, rho, theta, mask).
     # Returns: 
     # list_desc: List of features per patch
     # list_coords: list of angular and polar coordinates.
     # list_indices: list of indices of neighbors in the patch.
     # list_sc_labels: list of shape complementarity labels (computed here).
     """
+    import pymesh
     mesh = pymesh.load_mesh(ply_fn)
 
     # Normals: 
@@ -29,7 +26,7 @@ def read_data_from_surface(ply_fn, params):
     normals = np.stack([n1,n2,n3], axis=1)
 
     # Compute the angular and radial coordinates. 
-    rho, theta, neigh_indices, mask = compute_polar_coordinates(mesh, radius=params['max_distance'], max_vertices=params['max_shape_size'])
+    rho, theta, neigh_indices, mask = compute_polar_coordinates(mesh, radius=params['max_distance'], max_vertices=params['max_shape_size'], dtype=dtype)
 
     # Compute the principal curvature components for the shape index. 
     mesh.add_attribute("vertex_mean_curvature")
@@ -66,7 +63,7 @@ def read_data_from_surface(ply_fn, params):
     # n: number of patches, equal to the number of vertices.
     n = len(mesh.vertices)
     
-    input_feat = np.zeros((n, params['max_shape_size'], 5))
+    input_feat = np.zeros((n, params['max_shape_size'], 5), dtype=dtype)
 
     # Compute the input features for each patch.
     for vix in range(n):
@@ -143,6 +140,7 @@ def compute_shape_complementarity(ply_fn1, ply_fn2, neigh1, neigh2, rho1, rho2,
         Returns: vX_sc (2,N,10) matrix with the shape complementarity (shape complementarity 25 and 50) 
         of each vertex to its nearest neighbor in the other protein, in 10 rings.
     """
+    import pymesh
     # Mesh 1
     mesh1 = pymesh.load_mesh(ply_fn1)
     # Normals: 
@@ -1,9 +1,6 @@
 import time
 import os
-from sklearn import metrics
 import numpy as np
-from IPython.core.debugger import set_trace
-from sklearn.metrics import accuracy_score, roc_auc_score
 
 # Apply mask to input_feat
 def mask_input_feat(input_feat, mask):
@@ -25,7 +22,11 @@ def run_masif_site(
     params, learning_obj, rho_wrt_center, theta_wrt_center, input_feat, mask, indices
 ):
     indices = pad_indices(indices, mask.shape[1])
-    mask = np.expand_dims(mask, 2)
+    # Feed float32 directly (no-op for float32 precomputations) instead of letting TF cast.
+    rho_wrt_center = np.asarray(rho_wrt_center, dtype=np.float32)
+    theta_wrt_center = np.asarray(theta_wrt_center, dtype=np.float32)
+    input_feat = np.asarray(input_feat, dtype=np.float32)
+    mask = np.expand_dims(np.asarray(mask, dtype=np.float32), 2)
     feed_dict = {
         learning_obj.rho_coords: rho_wrt_center,
         learning_obj.theta_coords: theta_wrt_center,
@@ -38,7 +39,41 @@ def run_masif_site(
     return score
 
 
+# Run masif site on several proteins with a single session.run.
+def run_masif_site_batch(params, learning_obj, proteins):
+    """
+    proteins: list of (rho_wrt_center, theta_wrt_center, input_feat, mask, indices) tuples.
+    The patches are concatenated and the indices of each protein are shifted by the number
+    of preceding patches, so proteins do not interact in the second convolutional layer.
+    Returns one score per protein, in the format returned by run_masif_site.
+    """
+    counts = [len(protein[3]) for protein in proteins]
+    offsets = np.cumsum([0] + counts)
+    max_verts = proteins[0][3].shape[1]
+    indices = np.concatenate(
+        [
+            pad_indices(protein[4], max_verts) + offsets[ix]
+            for ix, protein in enumerate(proteins)
+        ]
+    )
+    rho_wrt_center, theta_wrt_center, input_feat, mask = [
+        np.asarray(np.concatenate([protein[k] for protein in proteins]), dtype=np.float32)
+        for k in range(4)
+    ]
+    feed_dict = {
+        learning_obj.rho_coords: rho_wrt_center,
+        learning_obj.theta_coords: theta_wrt_center,
+        learning_obj.input_feat: input_feat,
+        learning_obj.mask: np.expand_dims(mask, 2),
+        learning_obj.indices_tensor: indices,
+    }
+
+    score = learning_obj.session.run(learning_obj.full_score, feed_dict=feed_dict)
+    return [[score[offsets[ix] : offsets[ix + 1]]] for ix in range(len(proteins))]
+
+
 def compute_roc_auc(pos, neg):
+    from sklearn import metrics
     labels = np.concatenate([np.ones((len(pos))), np.zeros((len(neg)))])
     dist_pairs = np.concatenate([pos, neg])
     return metrics.roc_auc_score(labels, dist_pairs)
@@ -52,6 +87,7 @@ def train_masif_site(
     num_iter_test=1000,
     batch_size_val_test=50,
 ):
+    from sklearn import metrics
 
     # Open training list.
 
@@ -1,11 +1,8 @@
 import time
 import math
-from sklearn import metrics
 import numpy as np
 import sys
 import os
-from IPython.core.debugger import set_trace
-from sklearn.metrics import accuracy_score, roc_auc_score
 
 # Features and theta are flipped for the binder in construct_batch (except for hydrophobicity).
 def construct_batch(
@@ -104,10 +101,11 @@ def compute_dists(descs1, descs2):
 def construct_batch_val_test(
     c_idx, rho_wrt_center, theta_wrt_center, input_feat, mask, flip=False
 ):
-    batch_rho_coords = np.expand_dims(rho_wrt_center[c_idx], 2)
-    batch_theta_coords = np.expand_dims(theta_wrt_center[c_idx], 2)
-    batch_input_feat = input_feat[c_idx]
-    batch_mask = mask[c_idx]
+    # Feed float32 directly (no-op for float32 precomputations) instead of letting TF cast.
+    batch_rho_coords = np.expand_dims(np.asarray(rho_wrt_center[c_idx], dtype=np.float32), 2)
+    batch_theta_coords = np.expand_dims(np.asarray(theta_wrt_center[c_idx], dtype=np.float32), 2)
+    batch_input_feat = np.asarray(input_feat[c_idx], dtype=np.float32)
+    batch_mask = np.asarray(mask[c_idx], dtype=np.float32)
     batch_mask = np.expand_dims(batch_mask,2)
     # Flip features and theta (except hydrophobicity)
     if flip:
@@ -163,6 +161,7 @@ def compute_val_test_desc(
 
 
 def compute_roc_auc(pos, neg):
+    from sklearn import metrics
     labels = np.concatenate([np.ones((len(pos))), np.zeros((len(neg)))])
     dist_pairs = np.concatenate([pos, neg])
     return metrics.roc_auc_score(labels, dist_pairs)
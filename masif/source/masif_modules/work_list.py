@@ -0,0 +1,43 @@
+"""
+work_list.py: Resolve the chains to process from the ppi_pair_ids of a precomputation
+directory and an optional list of PDBID_CHAIN entries.
+This file is part of MaSIF.
+Released under an Apache License 2.0
+"""
+
+
+def read_eval_list(list_fn):
+    """ Read a file with one PDBID_CHAIN entry per line into a set. """
+    with open(list_fn) as f:
+        return set(line.rstrip() for line in f if line.strip())
+
+
+def split_ppi_pair_id(ppi_pair_id):
+    """ Split PDBID_CHAIN1[_CHAIN2] into the pdbid and a list of (pid, chain) tuples. """
+    fields = ppi_pair_id.split("_")
+    if len(fields) == 2 or fields[2] == "":
+        return fields[0], [("p1", fields[1])]
+    return fields[0], [("p1", fields[1]), ("p2", fields[2])]
+
+
+def resolve_work_list(ppi_pair_ids, eval_set=None):
+    """
+    Return a list of (ppi_pair_id, pid, pdb_chain_id) tuples, one per chain of
+    ppi_pair_ids that appears in eval_set (as PDBID_CHAIN or PDBID_CHAIN_).
+    All chains are returned if eval_set is empty.
+    """
+    work_list = []
+    for ppi_pair_id in ppi_pair_ids:
+        if len(ppi_pair_id.split("_")) < 2:
+            continue
+        pdbid, chains = split_ppi_pair_id(ppi_pair_id)
+        for pid, chain in chains:
+            pdb_chain_id = pdbid + "_" + chain
+            if (
+                eval_set
+                and pdb_chain_id not in eval_set
+                and pdb_chain_id + "_" not in eval_set
+            ):
+                continue
+            work_list.append((ppi_pair_id, pid, pdb_chain_id))
+    return work_list
@@ -4,8 +4,6 @@ import sys
 import os
 import time
 import numpy as np
-from IPython.core.debugger import set_trace
-from sklearn import metrics
 import importlib
 from default_config.masif_opts import masif_opts
 
@@ -16,6 +14,7 @@ def mask_input_feat(input_feat, mask):
 
 
 def compute_roc_auc(pos, neg):
+    from sklearn import metrics
     labels = np.concatenate([np.ones((len(pos))), np.zeros((len(neg)))])
     dist_pairs = np.concatenate([pos, neg])
     return metrics.roc_auc_score(labels, dist_pairs)
@@ -37,19 +36,11 @@ parent_in_dir = params["masif_precomputation_dir"]
 np.random.seed(0)
 
 
-#   Load existing network.
+#   Load existing network (frozen graph if it was exported).
 print("Reading pre-trained network")
-from masif_modules.MaSIF_ppi_search import MaSIF_ppi_search
-
-learning_obj = MaSIF_ppi_search(
-    params["max_distance"],
-    n_thetas=16,
-    n_rhos=5,
-    n_rotations=16,
-    idx_gpu="/gpu:0",
-    feat_mask=params["feat_mask"],
-)
-learning_obj.saver.restore(learning_obj.session, params["model_dir"] + "model")
+from masif_modules.frozen_model import load_inference_model
+
+learning_obj = load_inference_model("masif_ppi_search", params)
 # # from pdb import set_trace; set_trace()
 # # print(learning_obj.session.run(learning_obj.mu_rho[0]))
 # assert not np.any(np.isnan(learning_obj.session.run(learning_obj.mu_rho[0])))
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 # coding: utf-8
 import pymesh
-from IPython.core.debugger import set_trace
 from scipy.spatial import cKDTree
 import time
 import os
@@ -2,7 +2,6 @@ import tensorflow as tf
 import numpy.matlib 
 import os
 import numpy as np
-from IPython.core.debugger import set_trace
 from scipy.spatial import cKDTree
 from sklearn.metrics import roc_auc_score
 from tensorflow import keras
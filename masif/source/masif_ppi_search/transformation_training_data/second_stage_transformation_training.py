@@ -1,5 +1,4 @@
 #!/usr/bin/env python
-from IPython.core.debugger import set_trace
 #from transformation_training_data.second_stage_transformation_training_helper import * 
 from second_stage_transformation_training_helper import * 
 # coding: utf-8
@@ -2,10 +2,10 @@
 import time
 import os
 import numpy as np
-from IPython.core.debugger import set_trace
 import sys
 import importlib
-from masif_modules.train_masif_site import run_masif_site
+from masif_modules.train_masif_site import run_masif_site, run_masif_site_batch
+from masif_modules.work_list import read_eval_list, resolve_work_list
 from default_config.masif_opts import masif_opts
 
 """
@@ -33,77 +33,148 @@ for key in custom_params:
 
 # Shape precomputation dir.
 parent_in_dir = params["masif_precomputation_dir"]
-eval_list = []
+eval_set = set()
+batch_mode = False
 
 if len(sys.argv) == 3:
     ppi_pair_ids = [sys.argv[2]]
-# Read a list of pdb_chain entries to evaluate.
-elif len(sys.argv) == 4 and sys.argv[2] == "-l":
-    listfile = open(sys.argv[3])
-    ppi_pair_ids = []
-    for line in listfile:
-        eval_list.append(line.rstrip())
-    for mydir in os.listdir(parent_in_dir):
-        ppi_pair_ids.append(mydir)
+# Read a list of pdb_chain entries to evaluate; -b packs several proteins per graph execution.
+elif len(sys.argv) == 4 and sys.argv[2] in ["-l", "-b"]:
+    eval_set = read_eval_list(sys.argv[3])
+    ppi_pair_ids = os.listdir(parent_in_dir)
+    batch_mode = sys.argv[2] == "-b"
 else:
     sys.exit(1)
 
-# Build the neural network model
-from masif_modules.MaSIF_site import MaSIF_site
-
-learning_obj = MaSIF_site(
-    params["max_distance"],
-    n_thetas=4,
-    n_rhos=3,
-    n_rotations=4,
-    idx_gpu="/gpu:0",
-    feat_mask=params["feat_mask"],
-    n_conv_layers=params["n_conv_layers"],
-)
-print("Restoring model from: " + params["model_dir"] + "model")
-learning_obj.saver.restore(learning_obj.session, params["model_dir"] + "model")
+work_list = resolve_work_list(ppi_pair_ids, eval_set)
+
+# Load the frozen model if it was exported, otherwise build the network and restore it.
+from masif_modules.frozen_model import load_inference_model
+
+learning_obj = load_inference_model("masif_site", params)
 if not os.path.exists(params["out_pred_dir"]):
     os.makedirs(params["out_pred_dir"])
 
-idx_count = 0
-for ppi_pair_id in ppi_pair_ids:
-    print(ppi_pair_id)
-    in_dir = parent_in_dir + ppi_pair_id + "/"
-
-    fields = ppi_pair_id.split('_')
-    if len(fields) < 2:
-        continue
-    pdbid = ppi_pair_id.split("_")[0]
-    chain1 = ppi_pair_id.split("_")[1]
-    pids = ["p1"]
-    chains = [chain1]
-    if len(fields) == 3 and fields[2] != "":
-        chain2 = fields[2]
-        pids = ["p1", "p2"]
-        chains = [chain1, chain2]
-
-    for ix, pid in enumerate(pids):
-        pdb_chain_id = pdbid + "_" + chains[ix]
-        if (
-            len(eval_list) > 0
-            and pdb_chain_id not in eval_list
-            and pdb_chain_id + "_" not in eval_list
-        ):
-            continue
-
-        print("Evaluating {}".format(pdb_chain_id))
 
+def pred_filename(pdb_chain_id):
+    return params["out_pred_dir"] + "/pred_" + pdb_chain_id + ".npy"
+
+
+def load_protein(in_dir, pid):
+    """ Load the inputs of run_masif_site for one chain; None if it was not precomputed. """
+    try:
+        rho_wrt_center = np.load(in_dir + pid + "_rho_wrt_center.npy")
+    except:
+        print("File not found: {}".format(in_dir + pid + "_rho_wrt_center.npy"))
+        return None
+    theta_wrt_center = np.load(in_dir + pid + "_theta_wrt_center.npy")
+    input_feat = np.load(in_dir + pid + "_input_feat.npy")
+    input_feat = mask_input_feat(input_feat, params["feat_mask"])
+    mask = np.load(in_dir + pid + "_mask.npy")
+    indices = np.load(in_dir + pid + "_list_indices.npy", encoding="latin1", allow_pickle=True)
+    return rho_wrt_center, theta_wrt_center, input_feat, mask, indices
+
+
+def batch_loader(work_list, batch_queue, max_patches):
+    """
+    Load proteins and group them into batches of at most max_patches patches. An error is
+    put on the queue, for the main thread to raise.
+    """
+    try:
+        batch = []
+        n_patches = 0
+        for ppi_pair_id, pid, pdb_chain_id in work_list:
+            protein = load_protein(parent_in_dir + ppi_pair_id + "/", pid)
+            if protein is None:
+                continue
+            if len(batch) > 0 and n_patches + len(protein[3]) > max_patches:
+                batch_queue.put(batch)
+                batch = []
+                n_patches = 0
+            batch.append((pdb_chain_id, protein))
+            n_patches += len(protein[3])
+        if len(batch) > 0:
+            batch_queue.put(batch)
+    except Exception as e:
+        batch_queue.put(e)
+    finally:
+        batch_queue.put(None)
+
+
+def prediction_writer(write_queue, errors):
+    """ Save predictions until None is read; stops at the first error, kept in errors for the main thread. """
+    while True:
+        item = write_queue.get()
+        if item is None:
+            break
         try:
-            rho_wrt_center = np.load(in_dir + pid + "_rho_wrt_center.npy")
-        except:
-            print("File not found: {}".format(in_dir + pid + "_rho_wrt_center.npy"))
+            np.save(*item)
+        except Exception as e:
+            errors.append(e)
+            break
+
+
+if batch_mode:
+    import threading
+    import queue
+
+    batch_queue = queue.Queue(maxsize=params["predict_prefetch"])
+    write_queue = queue.Queue()
+    writer_errors = []
+    loader = threading.Thread(
+        target=batch_loader,
+        args=(work_list, batch_queue, params["predict_batch_max_patches"]),
+    )
+    writer = threading.Thread(target=prediction_writer, args=(write_queue, writer_errors))
+    loader.daemon = True
+    loader.start()
+    writer.start()
+
+    start = time.time()
+    n_proteins = 0
+    n_patches = 0
+    try:
+        while True:
+            batch = batch_queue.get()
+            if batch is None:
+                break
+            # Errors of the loader and writer threads end the run here.
+            if isinstance(batch, Exception):
+                raise batch
+            if len(writer_errors) > 0:
+                raise writer_errors[0]
+            tic = time.time()
+            scores = run_masif_site_batch(
+                params, learning_obj, [protein for _, protein in batch]
+            )
+            toc = time.time()
+            batch_patches = sum(len(protein[3]) for _, protein in batch)
+            print(
+                "Evaluated {} proteins ({} patches) in {:.3f}s".format(
+                    len(batch), batch_patches, toc - tic
+                )
+            )
+            for (pdb_chain_id, _), protein_scores in zip(batch, scores):
+                write_queue.put((pred_filename(pdb_chain_id), protein_scores))
+            n_proteins += len(batch)
+            n_patches += batch_patches
+    finally:
+        write_queue.put(None)
+        writer.join()
+    if len(writer_errors) > 0:
+        raise writer_errors[0]
+    print(
+        "Evaluated {} proteins ({} patches) in {:.1f}s".format(
+            n_proteins, n_patches, time.time() - start
+        )
+    )
+else:
+    for ppi_pair_id, pid, pdb_chain_id in work_list:
+        print("Evaluating {}".format(pdb_chain_id))
+        protein = load_protein(parent_in_dir + ppi_pair_id + "/", pid)
+        if protein is None:
             continue
-        theta_wrt_center = np.load(in_dir + pid + "_theta_wrt_center.npy")
-        input_feat = np.load(in_dir + pid + "_input_feat.npy")
-        input_feat = mask_input_feat(input_feat, params["feat_mask"])
-        mask = np.load(in_dir + pid + "_mask.npy")
-        indices = np.load(in_dir + pid + "_list_indices.npy", encoding="latin1", allow_pickle=True)
-        labels = np.zeros((len(mask)))
+        rho_wrt_center, theta_wrt_center, input_feat, mask, indices = protein
 
         print("Total number of patches:{} \n".format(len(mask)))
 
@@ -124,8 +195,4 @@ for ppi_pair_id in ppi_pair_ids:
             )
         )
         print("GPU time (real time, not actual GPU time): {:.3f}s".format(toc-tic))
-        np.save(
-            params["out_pred_dir"] + "/pred_" + pdbid + "_" + chains[ix] + ".npy",
-            scores,
-        )
-
+        np.save(pred_filename(pdb_chain_id), scores)
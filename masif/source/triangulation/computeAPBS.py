@@ -1,10 +1,8 @@
 import os
 import numpy
-from IPython.core.debugger import set_trace
 from subprocess import Popen, PIPE
-import pymesh
 
-from default_config.global_vars import apbs_bin, pdb2pqr_bin, multivalue_bin
+from default_config.global_vars import get_apbs_bin, get_pdb2pqr_bin, get_multivalue_bin
 import random
 
 """
@@ -23,7 +21,7 @@ def computeAPBS(vertices, pdb_file, tmp_file_base, mol2_file=None):
     filename_base = tmp_file_base.split("/")[-1]
     pdbname = pdb_file.split("/")[-1]
     args = [
-        pdb2pqr_bin, pdbname, filename_base,
+        get_pdb2pqr_bin(), pdbname, filename_base,
         "--ff=PARSE",
         "--whitespace",
         "--noopt",
@@ -37,7 +35,7 @@ def computeAPBS(vertices, pdb_file, tmp_file_base, mol2_file=None):
     print("### PDB2PQR ###\n", stderr.decode('utf-8'))
     # from pdb import set_trace; set_trace()
 
-    args = [apbs_bin, filename_base + ".in"]
+    args = [get_apbs_bin(), filename_base + ".in"]
     p2 = Popen(args, stdout=PIPE, stderr=PIPE, cwd=directory)
     stdout, stderr = p2.communicate()
     vertfile = open(directory + "/" + filename_base + ".csv", "w")
@@ -49,7 +47,7 @@ def computeAPBS(vertices, pdb_file, tmp_file_base, mol2_file=None):
     # from pdb import set_trace; set_trace()
 
     args = [
-        multivalue_bin,
+        get_multivalue_bin(),
         filename_base + ".csv",
         filename_base + ".dx",
         filename_base + "_out.csv",
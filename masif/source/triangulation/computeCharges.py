@@ -1,7 +1,6 @@
 from Bio.PDB import *
 import numpy as np
 from sklearn.neighbors import KDTree
-from IPython.core.debugger import set_trace
 
 """
 computeCharges.py: Wrapper function to compute hydrogen bond potential (free electrons/protons) in the surface
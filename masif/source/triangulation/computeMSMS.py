@@ -1,9 +1,10 @@
 import os
+import sys
 from subprocess import Popen, PIPE
 
 from input_output.read_msms import read_msms
 from triangulation.xyzrn import output_pdb_as_xyzrn
-from default_config.global_vars import msms_bin 
+from default_config.global_vars import get_msms_bin
 from default_config.masif_opts import masif_opts
 import random
 
@@ -25,7 +26,7 @@ def computeMSMS(pdb_file,  protonate=True, ligand_code=None):
         sys.exit(1)
     # Now run MSMS on xyzrn file
     FNULL = open(os.devnull, 'w')
-    args = [msms_bin, "-density", "3.0", "-hdensity", "3.0", "-probe",\
+    args = [get_msms_bin(), "-density", "3.0", "-hdensity", "3.0", "-probe",\
                     "1.5", "-if",out_xyzrn,"-of",file_base, "-af", file_base]
     #print msms_bin+" "+`args`
     p2 = Popen(args, stdout=PIPE, stderr=PIPE)
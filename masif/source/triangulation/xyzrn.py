@@ -1,6 +1,5 @@
 from Bio.PDB import *
 from default_config.chemistry import radii, polarHydrogens
-from IPython.core.debugger import set_trace
 
 """
 xyzrn.py: Read a pdb file and output it is in xyzrn for use in MSMS
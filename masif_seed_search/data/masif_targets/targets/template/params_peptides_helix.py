@@ -50,6 +50,33 @@ params['seed_iface_dir'] = os.path.join(params['top_seed_dir'],masif_opts['site'
 params['seed_ply_iface_dir'] = os.path.join(params['top_seed_dir'],masif_opts['site']['out_surf_dir'])
 params['seed_pdb_dir'] = os.path.join(params['top_seed_dir'],masif_opts['pdb_chain_dir'])
 params['seed_desc_dir'] = os.path.join(params['top_seed_dir'],masif_opts['ppi_search']['desc_dir'])
+# Packed descriptor database built by seed_descriptor_db.py (used by match_descriptors when set).
+#params['seed_db_dir'] = os.path.join(params['top_seed_dir'], 'seed_db')
+# Scan seed_db_dir without its PCA prefilter (seed_descriptor_db.py --pca); the matches are the same.
+#params['seed_db_prefilter'] = False
+# Scan the compressed descriptors of seed_db_dir built by seed_descriptor_codes.py ('pq' or 'float16');
+# matches within desc_dist_cutoff * (1 + seed_db_code_margin) are re-ranked with the full descriptors.
+#params['seed_db_codes'] = 'pq'
+#params['seed_db_code_margin'] = 0.1
+#params['seed_db_rerank'] = True
+# IVF index over seed_db_dir built by seed_descriptor_index.py (queried instead of scanning when set).
+#params['seed_index_dir'] = os.path.join(params['top_seed_dir'], 'seed_index')
+# Visit only the n nearest index lists (faster, approximate); unset for exact matching.
+#params['seed_index_n_probe'] = 32
+# Number of processes aligning the matched seeds of a site (1: serial).
+#params['num_workers'] = 8
+# Size bound (MB) of the in-process cache of seed surfaces, descriptors and patches (0: no cache).
+#params['seed_cache_mb'] = 1024
+# Skip the per-point importance of alignment scores, which no output uses (default); False computes it for every scored alignment.
+#params['defer_point_importance'] = True
+# Record accepted alignments in out_dir/<target>/results.sqlite (results_sink.py) instead of a .score file per alignment.
+#params['results_db'] = True
+# With results_db: keep (and write the PDBs of) only the n best alignments of each site by NN score (0: all).
+#params['site_top_k'] = 100
+# 'transform': record only the transformation of each hit in results.sqlite, no PDBs (write them with materialise.py).
+#params['output_mode'] = 'pdb'
+# Record finished sites and seeds in out_dir/<target>/journal.jsonl; a search started again skips them (resume).
+#params['journal'] = True
 # Here is where you set up the radius - right now at 9A.
 #params['seed_precomp_dir'] = os.path.join(params['top_seed_dir'],masif_opts['site']['masif_precomputation_dir'])
 # 12 A
@@ -74,5 +101,9 @@ params['ransac_iter'] = 2000
 params['ransac_radius'] = 1.5
 # How much to expand the surface for alignment.
 params['surface_outward_shift'] = 0.25
+# Patch registration: 'open3d' (default) or 'batch' (numpy RANSAC + ICP over all candidate patches of a seed, see batch_registration.py).
+#params['registration_engine'] = 'batch'
+# Stop RANSAC of a patch once this fitness is reached ('batch' engine only).
+#params['registration_fitness_stop'] = 0.9
 
 #params['seed_pdb_list'] = ['3R2X000_C', '3R2X001_C', '3R2X002_C', '3R2X003_C']
@@ -1,5 +1,4 @@
 from Bio.PDB import *
-from IPython.core.debugger import set_trace
 from scipy.spatial import cKDTree
 import numpy as np 
 import os
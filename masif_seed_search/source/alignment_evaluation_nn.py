@@ -2,8 +2,6 @@ import tensorflow as tf
 import numpy as np
 from pathlib import Path
 from scipy.spatial import cKDTree
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import roc_auc_score
 from tensorflow import keras
 import os
 import time
@@ -39,6 +37,7 @@ class RocCallback(Callback):
         return
 
     def on_epoch_end(self, epoch, logs={}):
+        from sklearn.metrics import roc_auc_score
         y_pred_train = self.model.predict_proba(self.x)
         roc_train = roc_auc_score(self.y, y_pred_train[:,1])
         y_pred_val = self.model.predict_proba(self.x_val)
@@ -122,41 +121,85 @@ class AlignmentEvaluationNN:
         self.model.load_weights(self.model_name)
         
     def eval_model(self, features, nn_score_cutoff):
+            y_test_pred, point_importance = self.eval_model_batch([features], nn_score_cutoff)
+            return y_test_pred, point_importance[0]
+
+    def eval_model_batch(self, features_list, nn_score_cutoff, random_state=None, point_importance=True):
+            """
+            Score several alignments with one predict call. features_list holds one
+            [n_points, n_features] matrix per alignment; alignments with more than max_npoints
+            points are subsampled with random_state (numpy's global generator if None, in the
+            order of features_list, as successive eval_model calls would).
+            Returns the scores [n_alignments, 1] and the point importance of each alignment
+            (None for every alignment if point_importance is False; see eval_point_importance).
+            """
             max_npoints = self.max_npoints
 
             assert(max_npoints == 100 or max_npoints == 200)
             self.nn_score_cutoff = nn_score_cutoff
-            features = np.expand_dims(features, 0)
-            n_features = features.shape[2]
-            distance = features[0,:,0]
-    
-            features_trimmed = np.zeros((1,max_npoints,n_features))
-            for j,f in enumerate(features):
+            if random_state is None:
+                random_state = np.random
+            if len(features_list) == 0:
+                return np.zeros((0,1)), []
+            n_features = features_list[0].shape[1]
+
+            features_trimmed = np.zeros((len(features_list),max_npoints,n_features))
+            for j,f in enumerate(features_list):
                 if f.shape[0]<=max_npoints:
                     features_trimmed[j,:f.shape[0],:] = f
                 else:
-                    selected_rows = np.random.choice(f.shape[0],max_npoints,replace=False)
+                    selected_rows = random_state.choice(f.shape[0],max_npoints,replace=False)
                     features_trimmed[j,:,:] = f[selected_rows]
         
-            y_test_pred = self.model.predict(features_trimmed)
+            y_test_pred = self.model.predict(features_trimmed, batch_size=256)
             y_test_pred = y_test_pred[:,1].reshape((-1,1))
 
-            point_importance = np.zeros(len(distance))
-
-            # Compute point importance.
-            if len(distance) <= max_npoints and y_test_pred[0,0] > self.nn_score_cutoff:
-                # Evaluate point by point. 
-                for i in range(len(distance)):
-                    feat_copy = np.copy(features_trimmed)
-                    feat_copy[0,i,:] = 0.0
-                    point_val = self.model.predict(feat_copy)
-                    point_val = point_val[:,1].reshape((-1,1))
-                    point_importance[i] = point_val[0,0] - y_test_pred[0,0]
+            if not point_importance:
+                return y_test_pred, [None]*len(features_list)
+            return y_test_pred, self.occlusion_importance(features_trimmed, [len(f) for f in features_list], y_test_pred)
+
+    def eval_point_importance(self, features_list, y_pred, nn_score_cutoff):
+            """
+            Point importance of alignments already scored by eval_model_batch (y_pred), e.g.
+            only for the alignments that are kept. Points are not subsampled: importance is
+            only computed for alignments with at most max_npoints points.
+            """
+            self.nn_score_cutoff = nn_score_cutoff
+            n_features = features_list[0].shape[1]
+            features_trimmed = np.zeros((len(features_list),self.max_npoints,n_features))
+            for j,f in enumerate(features_list):
+                if f.shape[0]<=self.max_npoints:
+                    features_trimmed[j,:f.shape[0],:] = f
+            return self.occlusion_importance(features_trimmed, [len(f) for f in features_list], np.reshape(y_pred, (-1,1)))
+
+    def occlusion_importance(self, features_trimmed, n_points, y_test_pred):
+            """
+            Change of the score when each point is zeroed in turn, normalized. All occluded
+            copies of all alignments are evaluated with one predict call.
+            """
+            # Evaluate point by point. 
+            occluded = []
+            owners = []
+            for j,n in enumerate(n_points):
+                if n <= self.max_npoints and y_test_pred[j,0] > self.nn_score_cutoff:
+                    feat_copy = np.repeat(features_trimmed[j:j+1], n, axis=0)
+                    feat_copy[np.arange(n),np.arange(n),:] = 0.0
+                    occluded.append(feat_copy)
+                    owners.append(j)
+            all_point_importance = [np.zeros(n) for n in n_points]
+            if len(occluded) == 0:
+                return all_point_importance
+
+            point_val = self.model.predict(np.concatenate(occluded), batch_size=256)
+            point_val = point_val[:,1]
+            start = 0
+            for j in owners:
+                n = n_points[j]
+                d = point_val[start:start+n] - y_test_pred[j,0]
+                start += n
                 # Normalize
-                d = point_importance
                 const = np.max(np.abs(d))/np.std(d)
                 d_std = d/(const*np.std(d))
-                point_importance = d_std
-
-            return y_test_pred, point_importance
+                all_point_importance[j] = d_std
 
+            return all_point_importance
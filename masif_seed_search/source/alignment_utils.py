@@ -1,17 +1,18 @@
 from geometry.open3d_import import *
 import scipy.linalg
-import networkx as nx 
 from scipy.spatial import cKDTree
 import copy 
-from IPython.core.debugger import set_trace
 import numpy as np
 from simple_mesh import Simple_mesh
+from seed_descriptor_db import open_seed_db, descriptor_pairs
+from seed_descriptor_index import open_seed_index
+from seed_cache import load_seed
+from patch_sampling import mesh_graph
+from results_sink import Hit, uses_results_db
+from input_output.patch_indices import load_patch_indices, pack_patch_indices, PatchIndices
+from batch_registration import multidock_batch
 from pathlib import Path
-import scipy.sparse as spio
-import pymesh
 from Bio.PDB import PDBParser, PDBIO, Selection
-import tensorflow as tf
-from tensorflow import keras
 import os
 
 def rand_rotation_matrix(deflection=1.0, randnums=None):
@@ -66,19 +67,27 @@ def get_center_and_random_rotate(pcd):
     transform = np.vstack([transform, [0, 0, 0, 1]])
     return transform
 
+# Apply a 4x4 transformation to coordinates [n, 3]
+def transform_coords(transformation, coords):
+    return np.dot(coords, transformation[:3,:3].T) + transformation[:3,3]
+
 # Apply transformation to source struct
 def random_rotate_source_struct(source_struct, transformation):
     # Randomly rotate the source struct 
     structure_atoms = [atom for atom in source_struct.get_atoms()]
     structure_coords = np.array([atom.get_coord() for atom in structure_atoms])
-    structure_coord_pcd = PointCloud()
-    structure_coord_pcd.points = Vector3dVector(structure_coords)
-    structure_coord_pcd_notTransformed = copy.deepcopy(structure_coord_pcd)
-    structure_coord_pcd.transform(transformation)
+    structure_coords = transform_coords(transformation, structure_coords)
     # - This is a bit of a bad programming practice: shouldn't be a for loop..
-    for ix, v in enumerate(structure_coord_pcd.points):
+    for ix, v in enumerate(structure_coords):
         structure_atoms[ix].set_coord(v)
 
+# CA and heavy atoms of a structure, with their coordinates as arrays.
+def get_structure_coords(source_struct):
+    ca_coords = np.array([atom.get_coord() for atom in source_struct.get_atoms() if atom.get_id() == 'CA'])
+    heavy_atoms = [atom for atom in source_struct.get_atoms() if not atom.get_name().startswith('H')]
+    heavy_coords = np.array([atom.get_coord() for atom in heavy_atoms])
+    return ca_coords, heavy_atoms, heavy_coords
+
 
 def load_protein_pcd(full_pdb_id, chain_number, paths, flipped_features=False, read_mesh=True):
     """
@@ -161,21 +170,19 @@ def get_patch_geo(
 
 def get_patch_coords(top_dir, pdb, pid, cv=None):
     """ 
-    Load precomputed patch coordinates.
+    Load precomputed patch coordinates: {vix: patch indices} for the vertices cv, or a
+    PatchIndices view over all vertices if cv is None (rows are read when accessed).
     """
+    patch_indices = load_patch_indices(os.path.join(top_dir, pdb), pid)
     if cv is None:
-        patch_coords = np.load(os.path.join(
-            top_dir, pdb, pid+'_list_indices.npy'), allow_pickle=True)
-        cv = np.arange(0, patch_coords.shape[0])
-    else:
-        patch_coords = np.load(os.path.join(
-            top_dir, pdb, pid+'_list_indices.npy'), allow_pickle=True)[cv]
-    patch_coords = {key: patch_coords[ii] for ii, key in enumerate(cv)}
+        return patch_indices
+    patch_coords = {key: patch_indices[key] for key in cv}
     return patch_coords 
 
 
 # Get the center of the interface based on the ground truth: find the most shape complementary patch. 
 def geodists(verts, faces):
+    import networkx as nx
     # Graph 
     G=nx.Graph()
     n = len(verts)
@@ -198,15 +205,24 @@ def geodists(verts, faces):
         d2[key_tuple[0]] = key_tuple[1]
     return d2
 
+def geodists_from(verts, faces, sources, cutoff=12.0, chunk_size=256):
+    """
+    Geodesic distances (as geodists) from the vertices in sources only, computed with
+    Dijkstra bounded at cutoff. Yields (chunk of sources, dense distances [len(chunk), n],
+    inf beyond the cutoff) so that at most chunk_size rows are in memory.
+    """
+    from scipy.sparse.csgraph import dijkstra
+    graph = mesh_graph(verts, faces)
+    for start in range(0, len(sources), chunk_size):
+        chunk = sources[start:start+chunk_size]
+        yield chunk, dijkstra(graph, directed=False, indices=chunk, limit=cutoff)
+
 def get_target_vix_sc(target_mesh, binder_mesh):
     binder_vert_ckd = cKDTree(binder_mesh.vertices)
     dists, ckd_results = binder_vert_ckd.query(target_mesh.vertices)
     n1 = np.array([target_mesh.get_attribute('vertex_nx'), target_mesh.get_attribute('vertex_ny'), target_mesh.get_attribute('vertex_nz')]).T
     n2 = np.array([binder_mesh.get_attribute('vertex_nx'), binder_mesh.get_attribute('vertex_ny'), binder_mesh.get_attribute('vertex_nz')]).T
-    v1 = target_mesh.vertices
-    v2 = binder_mesh.vertices
 
-    geodists_target = geodists(target_mesh.vertices, target_mesh.faces)
     w = 0.5
     num_rings = 10
     radius =12
@@ -215,33 +231,34 @@ def get_target_vix_sc(target_mesh, binder_mesh):
     v1_sc_25 = np.zeros((n, 10))
     v1_sc_50 = np.zeros((n, 10))
 
-    for vix in range(len(target_mesh.vertices)):
-        if dists[vix] <= 1.5:
-            # Compute sc
-            p1ix = np.array([int(x) for x in geodists_target[vix].keys()])
-            patch_dists = [geodists_target[vix][x] for x in p1ix]
-            p2ix = ckd_results[p1ix]
-
-            # First v1->v2
-            comp1 = [np.dot(n1[p1ix[x]], -n2[p2ix[x]]) for x in range(len(p1ix))]
-            comp1 = np.multiply(comp1, np.exp(-w * np.square(dists[p1ix])))
-            # Use 10 rings such that each ring has equal weight in shape complementarity
-            comp_rings1_25 = np.zeros(num_rings)
-            comp_rings1_50 = np.zeros(num_rings)
-
-            for ring in range(num_rings-1):
-                scale = scales[ring]
-                members = [int(x) for x in range(len(p1ix)) if patch_dists[x] >= scales[ring] and \
-                                                                        patch_dists[x] < scales[ring+1]]
-                if len(members) == 0:
-                    comp_rings1_25[ring] = 0.0
-                    comp_rings1_50[ring] = 0.0
-                else:
-                    comp_rings1_25[ring] = np.percentile(comp1[members], 25)
-                    comp_rings1_50[ring] = np.percentile(comp1[members], 50)
-            
-            v1_sc_25[vix] = comp_rings1_25
-            v1_sc_50[vix] = comp_rings1_50
+    # Complementarity of each target vertex with its closest binder vertex: v1->v2
+    comp1 = np.matmul(n1[:,None,:], -n2[ckd_results][:,:,None])[:,0,0]
+    comp1 = np.multiply(comp1, np.exp(-w * np.square(dists)))
+
+    # Only patches centered within 1.5A of the binder are scored.
+    sources = np.where(dists <= 1.5)[0]
+    for chunk, patch_dists in geodists_from(target_mesh.vertices, target_mesh.faces, sources, cutoff=radius):
+        # Use 10 rings such that each ring has equal weight in shape complementarity;
+        # ring r holds the patch vertices with scales[r] <= distance < scales[r+1].
+        ring = np.searchsorted(scales, patch_dists, side='right') - 1
+        row_ix, p1ix = np.nonzero(ring < num_rings-1)
+        cell = row_ix * num_rings + ring[row_ix, p1ix]
+        order = np.argsort(cell, kind='stable')
+        cell = cell[order]
+        values = comp1[p1ix[order]]
+        # Cells (patch, ring) are contiguous in values; take the percentiles of all cells
+        # with the same number of members at once.
+        cells, cell_start, cell_size = np.unique(cell, return_index=True, return_counts=True)
+        comp_rings1_25 = np.zeros(len(chunk) * num_rings)
+        comp_rings1_50 = np.zeros(len(chunk) * num_rings)
+        for size in np.unique(cell_size):
+            same_size = np.where(cell_size == size)[0]
+            members = values[cell_start[same_size][:,None] + np.arange(size)]
+            comp_rings1_25[cells[same_size]], comp_rings1_50[cells[same_size]] = \
+                np.percentile(members, [25, 50], axis=1)
+
+        v1_sc_25[chunk] = comp_rings1_25.reshape(len(chunk), num_rings)
+        v1_sc_50[chunk] = comp_rings1_50.reshape(len(chunk), num_rings)
 
     #center_point = np.argmax(np.median(np.nan_to_num(v1_sc_25), axis=1))
     center_point = np.argmax(np.median(np.nan_to_num(v1_sc_50), axis=1))
@@ -249,27 +266,59 @@ def get_target_vix_sc(target_mesh, binder_mesh):
 
 # Get the vertex indices of target sites.
 def get_target_vix(pc, iface, num_sites=1, selected_vertices=None):
-    target_vertices = []
+    """
+    Pick num_sites target vertices: the selected vertex whose patch has the highest mean
+    interface score (first one on ties), then halve the scores of that patch and repeat.
+    Patch means are computed on a padded patch matrix and, after each pick, only updated for
+    the patches that share a vertex with the picked one; near-ties are resolved with the
+    exact per-patch mean, so the picks are those of the vertex by vertex loop.
+    """
     iface = np.copy(iface)
     if selected_vertices is None:
         selected_vertices = np.arange(len(iface))
+    selected_vertices = np.asarray(selected_vertices)
+    if isinstance(pc, PatchIndices):
+        patches, lengths = pc.rows(selected_vertices)
+    else:
+        patches, lengths = pack_patch_indices([pc[ii] for ii in selected_vertices])
+    mask = patches >= 0
+    patches = np.where(mask, patches, 0)
+    lengths = lengths.astype(np.int64)
+
+    # Inverted index: patch rows containing each vertex.
+    flat_rows = np.repeat(np.arange(len(patches)), lengths)
+    flat_verts = patches[mask]
+    order = np.argsort(flat_verts, kind='mergesort')
+    vertex_rows = flat_rows[order]
+    vertex_offsets = np.searchsorted(flat_verts[order], np.arange(len(iface) + 1))
+
+    sums = np.sum(np.where(mask, iface[patches], 0.0), axis=1)
+    valid = lengths > 0
+    target_vertices = []
     for site_ix in range(num_sites):
-        iface_patch_vals = []
-        # Go through each patch.
         best_ix = -1
-        best_val = float("-inf")
         best_neigh = []
-        for ii in selected_vertices:
-            neigh = pc[ii]
-            val = np.mean(iface[neigh])
-            if val > best_val:
-                best_ix = ii
-                best_val = val
-                best_neigh = neigh
+        if np.any(valid):
+            means = np.where(valid, sums / np.maximum(lengths, 1), -np.inf)
+            max_mean = np.max(means)
+            # Candidates within rounding of the maximum, checked with the exact mean in selection order.
+            candidates = np.where(means >= max_mean - 1e-9 * max(1.0, abs(max_mean)))[0]
+            best_val = float("-inf")
+            for row in candidates:
+                neigh = patches[row, :lengths[row]]
+                val = np.mean(iface[neigh])
+                if val > best_val:
+                    best_ix = selected_vertices[row]
+                    best_val = val
+                    best_neigh = neigh
 
         # Now that a site has been identified, clear the iface values so that the same site is not picked again.
         iface[best_neigh] *= 0.5
         target_vertices.append(best_ix)
+        if len(best_neigh) > 0:
+            affected = np.unique(np.concatenate(
+                [vertex_rows[vertex_offsets[v]:vertex_offsets[v + 1]] for v in best_neigh]))
+            sums[affected] = np.sum(np.where(mask[affected], iface[patches[affected]], 0.0), axis=1)
 
     return target_vertices
 
@@ -290,7 +339,14 @@ def test_alignments(transformation, source_structure, target_pcd_tree, interface
 def match_descriptors(directory_list, pids, target_desc, params):
     """ 
         Match descriptors to the target descriptor.
+        If params['seed_db_dir'] is set, the packed seed database (seed_descriptor_db.py) is scanned
+        instead of the per-seed files; if params['seed_index_dir'] is set, its IVF index
+        (seed_descriptor_index.py, resolved against params['seed_db_dir'] if set) is queried instead.
     """
+    if params.get('seed_index_dir'):
+        return open_seed_index(params['seed_index_dir'], params.get('seed_db_dir')).match_descriptors(directory_list, pids, target_desc, params)
+    if params.get('seed_db_dir'):
+        return open_seed_db(params['seed_db_dir']).match_descriptors(directory_list, pids, target_desc, params)
 
     all_matched_names = []
     all_matched_vix = []
@@ -356,45 +412,107 @@ def match_descriptors(directory_list, pids, target_desc, params):
             
     return matched_dict
 
+def match_descriptors_batch(directory_list, pids, target_descs, params):
+    """ 
+        Match several target descriptors (n_targets x n_feat) against the seeds in one pass over
+        the seed library. Returns one dictionary per target descriptor, equal to the result of
+        match_descriptors for that descriptor. The interface vertices of each seed are compared
+        to all target descriptors at once (seed_descriptor_db.descriptor_pairs). An IVF index
+        (params['seed_index_dir']) is still queried once per target descriptor.
+    """
+    if params.get('seed_index_dir'):
+        return [match_descriptors(directory_list, pids, target_desc, params) for target_desc in target_descs]
+    if params.get('seed_db_dir'):
+        return open_seed_db(params['seed_db_dir']).match_descriptors_batch(directory_list, pids, target_descs, params)
+
+    matched_dicts = [{} for _ in range(len(target_descs))]
+    count_proteins = 0
+    count_descriptors = 0
+    for ppi_pair_id in directory_list:
+        if 'seed_pdb_list' in params and ppi_pair_id not in params['seed_pdb_list']:
+            continue
+
+        if '.npy' in ppi_pair_id or '.txt' in ppi_pair_id:
+            continue
+
+        mydescdir = os.path.join(params['seed_desc_dir'], ppi_pair_id)
+        for pid in pids:
+            try:
+                fields = ppi_pair_id.split('_')
+                if pid == 'p1':
+                    pdb_chain_id = fields[0]+'_'+fields[1]
+                elif pid == 'p2':
+                    pdb_chain_id = fields[0]+'_'+fields[2]
+                iface = np.load(params['seed_iface_dir']+'/pred_'+pdb_chain_id+'.npy')[0]
+                descs = np.load(mydescdir+'/'+pid+'_desc_straight.npy')
+            except:
+                continue
+            name = (ppi_pair_id, pid)
+            count_proteins += 1
+            count_descriptors += len(iface)
+
+            true_iface = np.where(iface > params['iface_cutoff'])[0]
+            rows, target_ixs = descriptor_pairs(descs[true_iface], target_descs, params['desc_dist_cutoff'])
+            order = np.lexsort((rows, target_ixs))
+            for row, target_ix in zip(rows[order], target_ixs[order]):
+                matched_dicts[target_ix].setdefault(name, []).append(true_iface[row])
+            if count_proteins % 1000 == 0:
+                print('Compared {} target descriptors with {} \'fragments\' from {} proteins'.format(len(target_descs), count_descriptors, count_proteins))
+
+    print('Iterated over {} fragments from {} proteins; matched {} based on descriptor similarity.'.format(\
+            count_descriptors, count_proteins, [sum(len(x) for x in d.values()) for d in matched_dicts]))
+    return matched_dicts
+
 def count_clashes(transformation, source_surface_vertices, source_structure, \
         target_ca_pcd_tree, target_pcd_tree, radius=2.0, clashing_ca_thresh=1.0, clashing_thresh=5.0):
     """
         count_clashes and align if the threshold passes. 
     """
 
-    structure_ca_coords = np.array([atom.get_coord() for atom in source_structure.get_atoms() if atom.get_id() == 'CA'])
-    structure_ca_coord_pcd = PointCloud()
-    structure_ca_coord_pcd.points = Vector3dVector(structure_ca_coords)
-    structure_ca_coord_pcd_notTransformed = copy.deepcopy(structure_ca_coord_pcd)
-    structure_ca_coord_pcd.transform(transformation)
-    d_nn_ca, i_nn_ca = target_pcd_tree.query(np.asarray(structure_ca_coord_pcd.points),k=1,distance_upper_bound=radius)
-    clashing_ca = np.sum(d_nn_ca<=radius)
+    structure_ca_coords, structure_atoms, structure_coords = get_structure_coords(source_structure)
+    clashing_ca, clashing = count_clashes_batch(np.array([transformation]), structure_ca_coords, structure_coords, \
+            target_pcd_tree, radius=radius, clashing_ca_thresh=clashing_ca_thresh)
+    clashing_ca, clashing = clashing_ca[0], clashing[0]
     if clashing_ca > clashing_ca_thresh:
         return clashing_ca, 0.0
 
-    structure_atoms = [atom for atom in source_structure.get_atoms() if not atom.get_name().startswith('H')]
-    structure_coords = np.array([atom.get_coord() for atom in structure_atoms])
-    structure_coord_pcd = PointCloud()
-    structure_coord_pcd.points = Vector3dVector(structure_coords)
-    structure_coord_pcd_notTransformed = copy.deepcopy(structure_coord_pcd)
-    structure_coord_pcd.transform(transformation)
-    # Invoke cKDTree with (structure_coord_pcd)
-    d_nn, i_nn = target_pcd_tree.query(np.asarray(structure_coord_pcd.points),k=1,distance_upper_bound=radius)
-    clashing = np.sum(d_nn<=radius)
-
     if clashing > clashing_thresh:
         return clashing_ca, clashing 
 
     # Transform the input structure. - This is a bit of a bad programming practice: shouldn't be a for loop..
-    for ix, v in enumerate(structure_coord_pcd.points):
+    for ix, v in enumerate(transform_coords(transformation, structure_coords)):
         structure_atoms[ix].set_coord(v)
 
     return clashing_ca,clashing
 
+def count_clashes_batch(transformations, ca_coords, heavy_coords, target_pcd_tree, radius=2.0, clashing_ca_thresh=1.0):
+    """
+        CA and heavy atom clashes of a structure in several poses (transformations [n, 4, 4]), 
+        with one KD-tree query per atom type. Heavy atoms are only counted (otherwise 0) for poses 
+        whose CA clashes are within clashing_ca_thresh, as in count_clashes.
+    """
+    transformations = np.asarray(transformations)
+
+    def count(coords, poses):
+        moved = np.einsum('bij,nj->bni', transformations[poses,:3,:3], coords) + transformations[poses,None,:3,3]
+        d_nn, _ = target_pcd_tree.query(moved.reshape(-1,3),k=1,distance_upper_bound=radius)
+        return np.sum((d_nn<=radius).reshape(len(poses),-1), axis=1)
+
+    clashing_ca = count(ca_coords, np.arange(len(transformations)))
+    clashing = np.zeros(len(transformations), dtype=clashing_ca.dtype)
+    poses = np.where(clashing_ca <= clashing_ca_thresh)[0]
+    if len(poses) > 0:
+        clashing[poses] = count(heavy_coords, poses)
+    return clashing_ca, clashing
+
 
 def multidock(source_pcd, source_patch_coords, source_descs, 
             cand_pts, target_pcd, target_descs,
                params):
+    if params.get('registration_engine', 'open3d') == 'batch':
+        # numpy RANSAC + ICP over all candidate patches at once (batch_registration.py).
+        return multidock_batch(source_pcd, source_patch_coords, source_descs, 
+                cand_pts, target_pcd, target_descs, params)
     ransac_radius=params['ransac_radius'] 
     ransac_iter=params['ransac_iter']
     all_results = []
@@ -449,15 +567,22 @@ def align_and_save(out_filename_base, patch, source_structure,
     #mesh = Simple_mesh(np.asarray(patch.points))
     #mesh.set_attribute('vertex_charge', point_importance)
     #mesh.save_mesh(out_filename_base+'_patch.ply')
+
+def write_aligned_seed(out_filename_base, source_pdb_fn, transformation):
+    """ Write the seed PDB source_pdb_fn moved by the 4x4 transformation (as align_and_save). """
+    source_struct = PDBParser().get_structure(os.path.basename(source_pdb_fn), source_pdb_fn)
+    atoms = list(source_struct.get_atoms())
+    coords = transform_coords(transformation, np.array([atom.get_coord() for atom in atoms]))
+    for atom, coord in zip(atoms, coords):
+        atom.set_coord(coord)
+    align_and_save(out_filename_base, None, source_struct, None)
     
 
 # Compute different types of scores: 
-# -- Compute the neural network score
-def compute_nn_score(target_pcd, source_pcd, corr, 
+# -- Compute the features of the neural network score
+def compute_nn_features(target_pcd, source_pcd, 
         target_desc, source_desc, 
-        target_ckdtree, nn_score, 
-        vertex_to_atom_dist, nn_score_cutoff=1.0):
-
+        target_ckdtree, vertex_to_atom_dist):
 
     # Compute nn scores 
     # Compute all points correspondences and distances for nn
@@ -488,16 +613,50 @@ def compute_nn_score(target_pcd, source_pcd, corr,
     vert_atom_dist = 1.0/vert_atom_dist
 
     features = np.vstack([distance, desc_dist, normal_dp, vert_atom_dist]).T
+    return features, desc_dist_score
+
+# -- Compute the neural network score
+def compute_nn_score(target_pcd, source_pcd, corr, 
+        target_desc, source_desc, 
+        target_ckdtree, nn_score, 
+        vertex_to_atom_dist, nn_score_cutoff=1.0):
+    return compute_nn_scores_batch(target_pcd, [source_pcd], target_desc, [source_desc], 
+            target_ckdtree, nn_score, [vertex_to_atom_dist], nn_score_cutoff)[0]
 
-    nn_score_pred, point_importance = \
-                    nn_score.eval_model(
-#                            features, nn_score_cutoff
-                            features, 0.9 
+# -- Compute the neural network score of several alignments to the same target with one predict call
+# (point importance is None for every alignment if point_importance is False).
+def compute_nn_scores_batch(target_pcd, source_pcds, 
+        target_desc, source_descs, 
+        target_ckdtree, nn_score, 
+        vertex_to_atom_dists, nn_score_cutoff=1.0, point_importance=True):
+
+    all_features = []
+    all_desc_dist_scores = []
+    for source_pcd, source_desc, vertex_to_atom_dist in zip(source_pcds, source_descs, vertex_to_atom_dists):
+        features, desc_dist_score = compute_nn_features(target_pcd, source_pcd, 
+                target_desc, source_desc, target_ckdtree, vertex_to_atom_dist)
+        all_features.append(features)
+        all_desc_dist_scores.append(desc_dist_score)
+
+    nn_score_pred, all_point_importance = \
+                    nn_score.eval_model_batch(
+#                            all_features, nn_score_cutoff
+                            all_features, 0.9, point_importance=point_importance
                             )
 
-    ret = (np.array([nn_score_pred[0][0], desc_dist_score]).T, point_importance)
+    ret = [(np.array([nn_score_pred[k][0], all_desc_dist_scores[k]]).T, all_point_importance[k]) 
+            for k in range(len(all_features))]
     return ret 
 
+# -- Compute the point importance of an alignment scored by compute_nn_scores_batch(..., point_importance=False)
+def compute_point_importance(target_pcd, source_pcd, 
+        target_desc, source_desc, 
+        target_ckdtree, nn_score, 
+        vertex_to_atom_dist, nn_score_pred):
+    features, _ = compute_nn_features(target_pcd, source_pcd, 
+            target_desc, source_desc, target_ckdtree, vertex_to_atom_dist)
+    return nn_score.eval_point_importance([features], [nn_score_pred], 0.9)[0]
+
 def align_protein(name, \
         target_patch, \
         target_patch_descs, \
@@ -509,6 +668,11 @@ def align_protein(name, \
         nn_score, \
         site_outdir, \
         params):
+    """
+    Align, score and filter every matched patch of a seed (name: (ppi_pair_id, pid)) to the
+    target patch. Accepted alignments are written to site_outdir, or with a results database
+    (results_sink.uses_results_db) returned as a list of results_sink.Hit (empty otherwise).
+    """
     ppi_pair_id = name[0]
     pid = name[1]
     pdb = ppi_pair_id.split('_')[0]
@@ -523,8 +687,11 @@ def align_protein(name, \
         chain = ppi_pair_id.split('_')[2]
         chain_number = 2
         
-    # Load source ply file, coords, and descriptors.
-    source_pcd, source_desc, source_iface = load_protein_pcd(ppi_pair_id, chain_number, source_paths, flipped_features=False, read_mesh=False)
+    # Load source ply file, coords, and descriptors (cached across sites and targets).
+    source_data = load_seed(ppi_pair_id, pid, source_paths, params['seed_precomp_dir'], params)
+    source_pcd = source_data.pcd()
+    source_desc = source_data.desc
+    source_iface = source_data.iface
     
     # Randomly rotate the source ply file, and store the random transformation matrix (for benchmark purposes only)
     random_transformation = get_center_and_random_rotate(source_pcd)
@@ -534,7 +701,7 @@ def align_protein(name, \
     # Get coordinates for all matched vertices.
     source_vix = matched_dict[name]
 
-    source_coord =  get_patch_coords(params['seed_precomp_dir'], ppi_pair_id, pid, cv=source_vix)
+    source_coord = source_data.patch_coords(source_vix)
     
     # Perform all alignments to target. 
     all_results, all_source_patch, all_source_patch_desc, all_source_idx = multidock(
@@ -545,21 +712,31 @@ def align_protein(name, \
 
     # Score the results using a 'lightweight' scoring function.
     all_source_scores = [None]*len(source_vix)
+    scored = []
     for viii in range(len(source_vix)):
         if len(all_results[viii].correspondence_set)/float(len(np.asarray(all_source_patch[viii].points))) < 0.3:
             # Ignore those with poor fitness.
             all_source_scores[viii] = ([0,0], np.zeros_like(all_source_idx[viii]))
         else:
-            # Compute the distance between every source_surface_vertices and every target vertex.
-            d_vi_at, _= target_pcd_tree.query(np.asarray(all_source_patch[viii].points), k=1)
-
-            all_source_scores[viii] = compute_nn_score(target_patch, all_source_patch[viii], np.asarray(all_results[viii].correspondence_set),
-                 target_patch_descs, all_source_patch_desc[viii], \
-                target_ckdtree, nn_score, d_vi_at, 1.0) # Ignore point importance for speed.
+            scored.append(viii)
+    # Score all alignments that pass the fitness filter together.
+    # Point importance is not used by the saved outputs; unless disabled, it is not computed.
+    defer_point_importance = params.get('defer_point_importance', True)
+    all_d_vi_at = {}
+    if len(scored) > 0:
+        # Compute the distance between every source_surface_vertices and every target vertex.
+        for viii in scored:
+            all_d_vi_at[viii] = target_pcd_tree.query(np.asarray(all_source_patch[viii].points), k=1)[0]
+        batch_scores = compute_nn_scores_batch(target_patch, [all_source_patch[viii] for viii in scored],
+             target_patch_descs, [all_source_patch_desc[viii] for viii in scored], \
+            target_ckdtree, nn_score, [all_d_vi_at[viii] for viii in scored], 1.0, # Ignore point importance for speed.
+            point_importance=not defer_point_importance)
+        for viii, score in zip(scored, batch_scores):
+            all_source_scores[viii] = score
             if len(np.asarray(all_results[viii].correspondence_set)) <= 2.0:
                 if all_source_scores[viii][0][0] > 0.9: 
                     print('Error in masif_seed_search; check scoring.')
-                    return
+                    return []
 
     # All_point_importance: impact of each vertex on the score. 
     all_point_importance = [x[1] for x in all_source_scores]
@@ -568,34 +745,54 @@ def align_protein(name, \
     
     # Filter anything below neural network score cutoff
     top_scorers = np.where(scores[:,0] > params['nn_score_cutoff'])[0]
+
+    # With a results database (results_sink.py), accepted alignments are returned instead of written.
+    results_db = uses_results_db(params)
+    hits = []
     
     if len(top_scorers) > 0:
         source_outdir = os.path.join(site_outdir, '{}'.format(ppi_pair_id))
 
-        # Load source structure 
-        source_struct = parser.get_structure('{}_{}'.format(pdb,chain), os.path.join(params['seed_pdb_dir'],'{}_{}.pdb'.format(pdb,chain)))
+        # Source structure coordinates (cached); the structure itself is only parsed if an alignment is written.
+        source_pdb_fn = os.path.join(params['seed_pdb_dir'],'{}_{}.pdb'.format(pdb,chain))
+        source_struct = None
+        ca_coords, heavy_coords = source_data.structure_coords(source_pdb_fn)
         # Use the preexisting random rotation matrix that was applied to the patch.
-        random_rotate_source_struct(source_struct, random_transformation)
+        ca_coords = transform_coords(random_transformation, ca_coords)
+        heavy_coords = transform_coords(random_transformation, heavy_coords)
+
+        # Count clashes of all poses at once.
+        all_clashing_ca, all_clashing_total = count_clashes_batch([all_results[j].transformation for j in top_scorers], \
+                ca_coords, heavy_coords, target_pcd_tree, clashing_ca_thresh=params['allowed_CA_clashes'])
 
         # Perform the transformation on the atoms
-        for j in top_scorers:
+        for j, clashing_ca, clashing_total in zip(top_scorers, all_clashing_ca, all_clashing_total):
             res = all_results[j]
 
-            source_structure_cp = copy.deepcopy(source_struct)
-            
-            # Count clashes and if threshold passes, align the pdb.
-            clashing_ca, clashing_total = count_clashes(res.transformation, np.asarray(all_source_patch[j].points), source_structure_cp, \
-                target_ca_pcd_tree, target_pcd_tree, clashing_ca_thresh=params['allowed_CA_clashes'], clashing_thresh=params['allowed_heavy_atom_clashes'])
-
             # Check if the number of clashes exceeds the number allowed. 
             if clashing_ca <= params['allowed_CA_clashes'] and clashing_total <= params['allowed_heavy_atom_clashes']:
+                if results_db:
+                    print('Selected fragment: {} fragment_id: {} score: {:.4f} desc_dist_score: {:.4f} clashes(CA): {} clashes(total):{}\n'.format(j , ppi_pair_id, scores[j][0], scores[j][1], clashing_ca, clashing_total))
+                    # Transformation of the seed PDB as stored in the library.
+                    hits.append(Hit(ppi_pair_id, pid, j, source_vix[j], scores[j][0], scores[j][1], \
+                            clashing_ca, clashing_total, np.dot(res.transformation, random_transformation)))
+                    continue
+
+                # Only structures that are written are transformed (hydrogens are removed when saving).
+                if source_struct is None:
+                    source_struct = parser.get_structure('{}_{}'.format(pdb,chain), source_pdb_fn)
+                    _, heavy_atoms, _ = get_structure_coords(source_struct)
+                for atom, coord in zip(heavy_atoms, transform_coords(res.transformation, heavy_coords)):
+                    atom.set_coord(coord)
 
                 if not os.path.exists(source_outdir):
                     os.makedirs(source_outdir)
 
                 # Align and save the pdb + patch 
+                # Point importance only colours the patch ply, which align_and_save does not write;
+                # if that is enabled again, compute it here with compute_point_importance.
                 out_fn = source_outdir+'/{}_{}_{}'.format(pdb, chain, j)
-                align_and_save(out_fn, all_source_patch[j], source_structure_cp, \
+                align_and_save(out_fn, all_source_patch[j], source_struct, \
                                             point_importance=all_point_importance[j])
 
                 # Recompute the score with clashes.
@@ -627,3 +824,5 @@ def align_protein(name, \
                 mesh.set_attribute('vertex_iface', source_iface) 
                 mesh.save_mesh(out_fn+'.ply')
                 #save_ply(out_fn+'.ply', out_vertices, mesh.faces, out_normals, charges=mesh.get_attribute('vertex_charge'))
+
+    return hits
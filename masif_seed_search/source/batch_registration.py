@@ -0,0 +1,328 @@
+"""
+batch_registration.py: numpy registration engine for multidock, selected with
+params['registration_engine'] = 'batch' (default 'open3d').
+
+Registers all candidate patches of a seed against the target patch at once, following the
+Open3D calls of multidock:
+  - descriptor correspondences: nearest target descriptor of every source patch point
+    (one KD-tree over the target patch descriptors per call);
+  - RANSAC on 3 correspondences, for all candidates together in chunks of hypotheses:
+    batched Kabsch solves, then the edge length (0.9), distance (1.0) and normal (pi/2)
+    checkers; passing hypotheses are scored by fitness/inlier RMSE within ransac_radius.
+    Stops after params['ransac_iter'] hypotheses or 500 validations, as Open3D, or once
+    the fitness reaches params['registration_fitness_stop'] (if set);
+  - point-to-plane ICP (max distance 1.0, 30 iterations, relative fitness/RMSE 1e-6),
+    with one 6x6 linear solve per candidate and iteration, batched.
+Results expose the attributes of Open3D's results used by align_protein (transformation,
+correspondence_set, fitness), and patches the PointCloud/Feature attributes used by the
+scoring functions (points, normals, transform, data).
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Hypotheses drawn per candidate at a time.
+ransac_chunk = 100
+ransac_max_validation = 500
+edge_length_similarity = 0.9
+correspondence_max_distance = 1.0
+normal_max_angle = np.pi / 2
+icp_max_distance = 1.0
+icp_max_iteration = 30
+icp_relative_fitness = 1e-6
+icp_relative_rmse = 1e-6
+
+
+class PatchCloud:
+
+    """ Points and normals of a patch (numpy arrays), transformed in place like a PointCloud. """
+
+    def __init__(self, points, normals):
+        self.points = points
+        self.normals = normals
+
+    def transform(self, transformation):
+        self.points = np.dot(self.points, transformation[:3, :3].T) + transformation[:3, 3]
+        self.normals = np.dot(self.normals, transformation[:3, :3].T)
+        return self
+
+
+class PatchFeature:
+
+    """ Descriptors of a patch as a [n_dims, n_points] array, like Feature.data. """
+
+    def __init__(self, data):
+        self.data = data
+
+
+class RegistrationResult:
+    def __init__(self, transformation, correspondence_set, fitness, inlier_rmse):
+        self.transformation = transformation
+        self.correspondence_set = correspondence_set
+        self.fitness = fitness
+        self.inlier_rmse = inlier_rmse
+
+
+def transform_points(transformations, points):
+    """ Apply transformations [B, 4, 4] to points [B, n, 3]. """
+    return np.einsum("bij,bnj->bni", transformations[:, :3, :3], points) + transformations[:, None, :3, 3]
+
+
+def kabsch(source, target):
+    """ Rigid transformations [B, 4, 4] that best map source [B, k, 3] onto target [B, k, 3]. """
+    source_center = np.mean(source, axis=1)
+    target_center = np.mean(target, axis=1)
+    H = np.einsum(
+        "bki,bkj->bij", source - source_center[:, None, :], target - target_center[:, None, :]
+    )
+    U, _, Vt = np.linalg.svd(H)
+    V = np.transpose(Vt, (0, 2, 1))
+    Ut = np.transpose(U, (0, 2, 1))
+    d = np.sign(np.linalg.det(np.matmul(V, Ut)))
+    d[d == 0] = 1.0
+    D = np.zeros((len(H), 3, 3))
+    D[:, 0, 0] = 1.0
+    D[:, 1, 1] = 1.0
+    D[:, 2, 2] = d
+    R = np.matmul(np.matmul(V, D), Ut)
+    transformations = np.tile(np.eye(4), (len(H), 1, 1))
+    transformations[:, :3, :3] = R
+    transformations[:, :3, 3] = target_center - np.einsum("bij,bj->bi", R, source_center)
+    return transformations
+
+
+def sample_triplets(n_points, n_samples, random_state):
+    """ [len(n_points), n_samples, 3] distinct indices below n_points (per row). """
+    n = n_points[:, None]
+    u = random_state.uniform(size=(len(n_points), n_samples, 3))
+    i0 = np.floor(u[:, :, 0] * n).astype(np.int64)
+    i1 = np.floor(u[:, :, 1] * (n - 1)).astype(np.int64)
+    i1 += i1 >= i0
+    i2 = np.floor(u[:, :, 2] * (n - 2)).astype(np.int64)
+    low = np.minimum(i0, i1)
+    high = np.maximum(i0, i1)
+    i2 += i2 >= low
+    i2 += i2 >= high
+    return np.stack([i0, i1, i2], axis=2)
+
+
+def evaluate_transformations(transformations, points, n_points, target_tree, max_distance):
+    """
+    Fitness, inlier RMSE, nearest target point and inlier mask of points [B, n, 3]
+    (first n_points[b] rows valid) after transformations [B, 4, 4].
+    """
+    moved = transform_points(transformations, points)
+    dist, nearest = target_tree.query(moved.reshape(-1, 3), distance_upper_bound=max_distance)
+    dist = dist.reshape(moved.shape[:2])
+    nearest = nearest.reshape(moved.shape[:2])
+    inliers = (np.arange(points.shape[1])[None, :] < n_points[:, None]) & np.isfinite(dist)
+    n_inliers = np.sum(inliers, axis=1)
+    error2 = np.sum(np.where(inliers, dist, 0.0) ** 2, axis=1)
+    # An empty patch has fitness 0, as in Open3D.
+    fitness = n_inliers / np.maximum(n_points, 1).astype(np.float64)
+    rmse = np.sqrt(error2 / np.maximum(n_inliers, 1))
+    return fitness, rmse, moved, nearest, inliers
+
+
+def ransac_batch(
+    source_points, source_normals, n_points, corr, target_points, target_normals, target_tree, params, random_state
+):
+    """ Best RANSAC transformation [C, 4, 4] of every candidate patch. """
+    n_cands = len(n_points)
+    max_iteration = params["ransac_iter"]
+    max_distance = params["ransac_radius"]
+    fitness_stop = params.get("registration_fitness_stop")
+    cos_normal = np.cos(normal_max_angle)
+
+    best_transformation = np.tile(np.eye(4), (n_cands, 1, 1))
+    best_fitness = np.zeros(n_cands)
+    best_rmse = np.zeros(n_cands)
+    n_iteration = np.zeros(n_cands, dtype=np.int64)
+    n_validation = np.zeros(n_cands, dtype=np.int64)
+    active = n_points >= 3
+    pairs = [(0, 1), (0, 2), (1, 2)]
+    while np.any(active):
+        cands = np.where(active)[0]
+        samples = sample_triplets(n_points[cands], ransac_chunk, random_state)
+        in_budget = np.arange(ransac_chunk)[None, :] < (max_iteration - n_iteration[cands])[:, None]
+        source = source_points[cands[:, None, None], samples]
+        target_ix = corr[cands[:, None, None], samples]
+        target = target_points[target_ix]
+
+        # Edge length checker (before estimation).
+        passed = in_budget.copy()
+        for a, b in pairs:
+            d_source = np.sqrt(np.sum(np.square(source[:, :, a] - source[:, :, b]), axis=-1))
+            d_target = np.sqrt(np.sum(np.square(target[:, :, a] - target[:, :, b]), axis=-1))
+            passed &= d_source >= d_target * edge_length_similarity
+            passed &= d_target >= d_source * edge_length_similarity
+
+        # Estimate, then distance and normal checkers.
+        hyp_cand, hyp_ix = np.where(passed)
+        transformations = kabsch(source[hyp_cand, hyp_ix], target[hyp_cand, hyp_ix])
+        moved = transform_points(transformations, source[hyp_cand, hyp_ix])
+        ok = np.all(
+            np.sqrt(np.sum(np.square(moved - target[hyp_cand, hyp_ix]), axis=-1)) <= correspondence_max_distance,
+            axis=1,
+        )
+        rotated_normals = np.einsum(
+            "bij,bnj->bni",
+            transformations[:, :3, :3],
+            source_normals[cands[hyp_cand][:, None], samples[hyp_cand, hyp_ix]],
+        )
+        ok &= np.all(
+            np.sum(rotated_normals * target_normals[target_ix[hyp_cand, hyp_ix]], axis=-1) >= cos_normal, axis=1
+        )
+        passed[hyp_cand[~ok], hyp_ix[~ok]] = False
+        transformations = transformations[ok]
+        hyp_cand, hyp_ix = hyp_cand[ok], hyp_ix[ok]
+
+        # Validations beyond max_validation (in hypothesis order) are not used.
+        rank = n_validation[cands][:, None] + np.cumsum(passed, axis=1)
+        within = rank[hyp_cand, hyp_ix] <= ransac_max_validation
+        transformations = transformations[within]
+        hyp_cand, hyp_ix = hyp_cand[within], hyp_ix[within]
+        n_validation[cands] = np.minimum(n_validation[cands] + np.sum(passed, axis=1), ransac_max_validation)
+        n_iteration[cands] += np.sum(in_budget, axis=1)
+
+        if len(hyp_cand) > 0:
+            fitness, rmse, _, _, _ = evaluate_transformations(
+                transformations,
+                source_points[cands[hyp_cand]],
+                n_points[cands[hyp_cand]],
+                target_tree,
+                max_distance,
+            )
+            # Best hypothesis of each candidate: highest fitness, then lowest RMSE, then first drawn.
+            order = np.lexsort((hyp_ix, rmse, -fitness, hyp_cand))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = hyp_cand[order][1:] != hyp_cand[order][:-1]
+            best = order[first]
+            c = cands[hyp_cand[best]]
+            better = (fitness[best] > best_fitness[c]) | (
+                (fitness[best] == best_fitness[c]) & (rmse[best] < best_rmse[c])
+            )
+            c, best = c[better], best[better]
+            best_transformation[c] = transformations[best]
+            best_fitness[c] = fitness[best]
+            best_rmse[c] = rmse[best]
+
+        active &= (n_iteration < max_iteration) & (n_validation < ransac_max_validation)
+        if fitness_stop is not None:
+            active &= best_fitness < fitness_stop
+    return best_transformation
+
+
+def vector6_to_matrix(x):
+    """ Open3D's TransformVector6dToMatrix4d for x [B, 6]: Rz(x2) Ry(x1) Rx(x0), then translation. """
+    ca, sa = np.cos(x[:, 0]), np.sin(x[:, 0])
+    cb, sb = np.cos(x[:, 1]), np.sin(x[:, 1])
+    cg, sg = np.cos(x[:, 2]), np.sin(x[:, 2])
+    transformations = np.tile(np.eye(4), (len(x), 1, 1))
+    transformations[:, 0, 0] = cg * cb
+    transformations[:, 0, 1] = cg * sb * sa - sg * ca
+    transformations[:, 0, 2] = cg * sb * ca + sg * sa
+    transformations[:, 1, 0] = sg * cb
+    transformations[:, 1, 1] = sg * sb * sa + cg * ca
+    transformations[:, 1, 2] = sg * sb * ca - cg * sa
+    transformations[:, 2, 0] = -sb
+    transformations[:, 2, 1] = cb * sa
+    transformations[:, 2, 2] = cb * ca
+    transformations[:, :3, 3] = x[:, 3:]
+    return transformations
+
+
+def icp_point_to_plane_batch(source_points, n_points, init_transformation, target_points, target_normals, target_tree):
+    """ Point-to-plane ICP of every candidate; returns transformations, correspondences and fitness. """
+    transformation = np.array(init_transformation)
+    fitness, rmse, moved, nearest, inliers = evaluate_transformations(
+        transformation, source_points, n_points, target_tree, icp_max_distance
+    )
+    active = np.ones(len(n_points), dtype=bool)
+    for _ in range(icp_max_iteration):
+        cands = np.where(active)[0]
+        nearest_ix = np.where(inliers[cands], nearest[cands], 0)
+        q = target_points[nearest_ix]
+        n = target_normals[nearest_ix]
+        w = inliers[cands][:, :, None]
+        r = np.sum((moved[cands] - q) * n, axis=-1)[:, :, None] * w
+        J = np.concatenate([np.cross(moved[cands], n), n], axis=-1) * w
+        JTJ = np.einsum("bni,bnj->bij", J, J)
+        JTr = np.einsum("bni,bn->bi", J, r[:, :, 0])
+        # Identity update where the system has no solution (e.g. no correspondences).
+        solvable = np.abs(np.linalg.det(JTJ)) >= 1e-6
+        x = np.zeros((len(cands), 6))
+        if np.any(solvable):
+            x[solvable] = np.linalg.solve(JTJ[solvable], -JTr[solvable][:, :, None])[:, :, 0]
+        transformation[cands] = np.matmul(vector6_to_matrix(x), transformation[cands])
+
+        prev_fitness, prev_rmse = fitness[cands], rmse[cands]
+        fitness_c, rmse_c, moved_c, nearest_c, inliers_c = evaluate_transformations(
+            transformation[cands], source_points[cands], n_points[cands], target_tree, icp_max_distance
+        )
+        fitness[cands], rmse[cands] = fitness_c, rmse_c
+        moved[cands], nearest[cands], inliers[cands] = moved_c, nearest_c, inliers_c
+        converged = (np.abs(prev_fitness - fitness_c) < icp_relative_fitness) & (
+            np.abs(prev_rmse - rmse_c) < icp_relative_rmse
+        )
+        active[cands[converged]] = False
+        if not np.any(active):
+            break
+
+    correspondence_sets = []
+    for c in range(len(n_points)):
+        source_ix = np.where(inliers[c])[0]
+        correspondence_sets.append(np.stack([source_ix, nearest[c, source_ix]], axis=1))
+    return transformation, correspondence_sets, fitness, rmse
+
+
+def multidock_batch(source_pcd, source_patch_coords, source_descs, cand_pts, target_pcd, target_descs, params, random_state=None):
+    """ Same inputs and outputs as alignment_utils.multidock, registered with this engine. """
+    if random_state is None:
+        random_state = np.random
+    points = np.asarray(source_pcd.points)
+    normals = np.asarray(source_pcd.normals)
+    shift = params["surface_outward_shift"]
+    target_points = np.asarray(target_pcd.points)
+    target_normals = np.asarray(target_pcd.normals)
+    target_tree = cKDTree(target_points)
+    feature_tree = cKDTree(np.asarray(target_descs[0].data).T)
+
+    patch_idxs = [np.asarray(source_patch_coords[pt], dtype=np.int64) for pt in cand_pts]
+    n_points = np.array([len(idx) for idx in patch_idxs], dtype=np.int64)
+    max_points = max(np.max(n_points), 3) if len(n_points) > 0 else 3
+    source_points = np.zeros((len(cand_pts), max_points, 3))
+    source_normals = np.zeros((len(cand_pts), max_points, 3))
+    corr = np.zeros((len(cand_pts), max_points), dtype=np.int64)
+    patch_descs = []
+    for c, idx in enumerate(patch_idxs):
+        source_points[c, : len(idx)] = points[idx] + shift * normals[idx]
+        source_normals[c, : len(idx)] = normals[idx]
+        descs = source_descs[0, idx, :]
+        corr[c, : len(idx)] = feature_tree.query(descs)[1]
+        patch_descs.append(descs.T)
+
+    init_transformation = ransac_batch(
+        source_points, source_normals, n_points, corr, target_points, target_normals, target_tree, params, random_state
+    )
+    transformation, correspondence_sets, fitness, rmse = icp_point_to_plane_batch(
+        source_points, n_points, init_transformation, target_points, target_normals, target_tree
+    )
+    # Patches of fewer than 3 points are never registered by RANSAC: unregistered, fitness 0.
+    for c in np.where(n_points < 3)[0]:
+        transformation[c] = np.eye(4)
+        correspondence_sets[c] = np.zeros((0, 2), dtype=np.int64)
+        fitness[c] = 0.0
+        rmse[c] = 0.0
+
+    all_results = []
+    all_source_patch = []
+    all_source_desc = []
+    for c, idx in enumerate(patch_idxs):
+        all_results.append(
+            RegistrationResult(transformation[c], correspondence_sets[c], fitness[c], rmse[c])
+        )
+        patch = PatchCloud(source_points[c, : len(idx)], source_normals[c, : len(idx)])
+        all_source_patch.append(patch.transform(transformation[c]))
+        all_source_desc.append([PatchFeature(patch_descs[c])])
+    return all_results, all_source_patch, all_source_desc, patch_idxs
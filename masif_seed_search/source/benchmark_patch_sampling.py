@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""
+benchmark_patch_sampling.py: Library size and binder recovery of seed libraries whose patch
+centres are subsampled by farthest-point sampling (seed_descriptor_db.py --fps_spacing).
+
+A seed descriptor database is built for every spacing (0: all vertices) in work_dir, and the
+benchmark targets are searched against each (as masif_seed_search_campaign.py, with results
+in work_dir/search_<library>/<target>/results.sqlite). Reported per library: number of seed vertices,
+vertices above params['iface_cutoff'] and disk size relative to the full library, and the
+number of targets whose correct partner (benchmark_pdbs.txt) is among the k best seeds by NN
+score. The search outputs can also be read with analysis_utils.parse_results_db.
+
+Usage (with the parameter files of computational_benchmark/make_param_files.py on the
+PYTHONPATH, as in run_search.slurm):
+    python benchmark_patch_sampling.py -o work_dir -b benchmark_pdbs.txt [--spacings 2 3 4]
+        [--metric geodesic] params_6QTL_A [params_7DC8_AB ...]
+The target of params_<PDB>_<chain> is <PDB>_<chain>, as in run_search.slurm.
+"""
+
+import os
+import importlib
+from argparse import ArgumentParser
+import numpy as np
+
+from masif_seed_search_campaign import match_campaign
+from parallel_alignment import AlignmentPool, load_nn_score
+from patch_sampling import fps_metrics
+from results_sink import db_filename, read_hits
+from search_target import SearchTarget
+from seed_descriptor_db import SeedDescriptorDB, build_seed_db
+
+
+def library_name(spacing, metric):
+    if spacing <= 0:
+        return "seed_db_full"
+    return "seed_db_{}_{:g}".format(metric, spacing)
+
+
+def library_size(db_dir, iface_cutoff):
+    """ Rows, rows above iface_cutoff and bytes on disk of a seed descriptor database. """
+    db = SeedDescriptorDB(db_dir)
+    n_iface = 0
+    for start, end in db.iter_blocks():
+        n_iface += int(np.sum(np.asarray(db.iface[start:end]) > iface_cutoff))
+    n_bytes = sum(os.path.getsize(os.path.join(db_dir, fn)) for fn in os.listdir(db_dir))
+    return len(db), n_iface, n_bytes
+
+
+def correct_partners(benchmark_definition):
+    """ {target: correct partner}, both ways, as in analysis_utils.parse_results. """
+    correct_partner = {}
+    with open(benchmark_definition) as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0 or line.startswith("#"):
+                continue
+            pdb_id, chain_1, chain_2 = line.split(",")[:3]
+            correct_partner["{}_{}".format(pdb_id, chain_1)] = "{}_{}".format(pdb_id, chain_2)
+            correct_partner["{}_{}".format(pdb_id, chain_2)] = "{}_{}".format(pdb_id, chain_1)
+    return correct_partner
+
+
+def partner_rank(db_fn, target_name, partner):
+    """ Rank (1: best) of partner among the seeds of a search by best NN score; None if not found. """
+    best = {}
+    for row in read_hits(db_fn, target=target_name):
+        best[row["ppi_pair_id"]] = max(best.get(row["ppi_pair_id"], -np.inf), row["nn_score"])
+    if partner not in best:
+        return None
+    return 1 + sum(score > best[partner] for score in best.values())
+
+
+def search_library(targets, target_params, db_dir, out_dir, nn_scores, pool=None):
+    """
+    Search every target (with its parameters target_params) against the database in db_dir,
+    with results in out_dir/<target>, aligning seeds on pool (AlignmentPool) if given.
+    """
+    for target, params in zip(targets, target_params):
+        params = dict(params)
+        params.pop("seed_index_dir", None)
+        params.update(seed_db_dir=db_dir, out_dir_template=os.path.join(out_dir, "{}"), results_db=True)
+        target.params = params
+        target.start_run(params["out_dir_template"].format(target.target_name))
+    all_matched_dicts = match_campaign(targets)
+    for target_ix, target in enumerate(targets):
+        params = target.params
+        nn_key = (params["nn_score_atomic_fn"], params["max_npoints"])
+        if params.get("num_workers", 1) <= 1 and nn_key not in nn_scores:
+            nn_scores[nn_key] = load_nn_score(params)
+        source_paths = {
+            "surf_dir": params["seed_surf_dir"],
+            "iface_dir": params["seed_iface_dir"],
+            "desc_dir": params["seed_desc_dir"],
+        }
+        target.search_sites(all_matched_dicts[target_ix], source_paths, nn_scores.get(nn_key), pool=pool)
+        target.finish_run()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-o", "--work_dir", required=True, help="Directory of the libraries and search results")
+    parser.add_argument("-b", "--benchmark_definition", required=True, help="benchmark_pdbs.txt")
+    parser.add_argument("--spacings", type=float, nargs="+", default=[2.0, 3.0, 4.0], help="Sampling spacings (A)")
+    parser.add_argument("--metric", default="geodesic", choices=fps_metrics)
+    parser.add_argument("-k", "--k_values", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("params", nargs="+", help="Parameter modules of the benchmark targets")
+    args = parser.parse_args()
+
+    correct_partner = correct_partners(args.benchmark_definition)
+    targets = []
+    target_params = []
+    for params_module in args.params:
+        params = importlib.import_module(params_module, package=None).params
+        fields = params_module.split("_")
+        targets.append(SearchTarget(params, "{}_{}".format(fields[1], fields[2])))
+        target_params.append(params)
+    # All benchmark targets search the same seed library.
+    library_params = target_params[0]
+
+    # One pool of alignment workers for all libraries, forked before any network is loaded here.
+    num_workers = max(params.get("num_workers", 1) for params in target_params)
+    pool = AlignmentPool(num_workers) if num_workers > 1 else None
+    nn_scores = {}
+    report = []
+    for spacing in [0.0] + list(args.spacings):
+        name = library_name(spacing, args.metric)
+        db_dir = os.path.join(args.work_dir, name)
+        if not os.path.exists(os.path.join(db_dir, "ids.npy")):
+            build_seed_db(library_params, db_dir, fps_spacing=spacing, fps_metric=args.metric)
+        out_dir = os.path.join(args.work_dir, "search_" + name)
+        search_library(targets, target_params, db_dir, out_dir, nn_scores, pool=pool)
+        ranks = [
+            partner_rank(os.path.join(out_dir, target.target_name, db_filename), target.target_name,
+                         correct_partner[target.target_name])
+            for target in targets
+        ]
+        report.append((name, library_size(db_dir, library_params["iface_cutoff"]), ranks))
+    if pool is not None:
+        pool.close()
+
+    (_, (full_rows, full_iface, full_bytes), full_ranks) = report[0]
+    for name, (n_rows, n_iface, n_bytes), ranks in report:
+        print("{}: {} vertices ({:.1%}), {} above iface_cutoff ({:.1%}), {:.1f} MB ({:.1%})".format(
+            name, n_rows, n_rows / float(full_rows), n_iface, n_iface / float(max(full_iface, 1)),
+            n_bytes / 1e6, n_bytes / float(full_bytes)))
+        print("    correct partner in top k of {} targets: {}".format(len(targets), ", ".join(
+            "k={}: {} ({:+d})".format(
+                k,
+                sum(r is not None and r <= k for r in ranks),
+                sum(r is not None and r <= k for r in ranks) - sum(r is not None and r <= k for r in full_ranks),
+            )
+            for k in args.k_values
+        )))
+        lost = [t.target_name for t, r, r_full in zip(targets, ranks, full_ranks) if r is None and r_full is not None]
+        if len(lost) > 0:
+            print("    partner no longer found for {}".format(", ".join(lost)))
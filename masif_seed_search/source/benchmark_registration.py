@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+benchmark_registration.py: Compare the Open3D and batch registration engines of multidock
+(params['registration_engine']) on the matched seeds of benchmark targets.
+
+For every target site, the first n_seeds matched seeds are docked with both engines from the
+same random pose. Reported per target: time per docked patch, fraction of patches passing the
+fitness filter of align_protein with each engine (and agreement), mean ICP fitness, and the
+RMSD between the patch poses found by the two engines.
+
+Usage (with the parameter files of computational_benchmark/make_param_files.py on the
+PYTHONPATH, as in run_search.slurm):
+    python benchmark_registration.py [-n n_seeds] params_6QTL_A [params_7DC8_AB ...]
+The target of params_<PDB>_<chain> is <PDB>_<chain>, as in run_search.slurm.
+"""
+
+import os
+import time
+import importlib
+from argparse import ArgumentParser
+import numpy as np
+
+from alignment_utils import (
+    get_patch_coords,
+    get_patch_geo,
+    get_target_vix,
+    load_protein_pcd,
+    match_descriptors_batch,
+    multidock,
+    get_center_and_random_rotate,
+)
+from seed_cache import load_seed
+
+# Fitness filter of align_protein.
+min_fitness = 0.3
+
+
+def target_sites(params, target_name):
+    """ Target point cloud, descriptors and the vertices of the searched sites. """
+    target_paths = {
+        "surf_dir": params["target_surf_dir"],
+        "iface_dir": params["target_iface_dir"],
+        "desc_dir": params["target_desc_dir"],
+    }
+    target_pcd, target_desc, target_iface = load_protein_pcd(
+        target_name, 1, target_paths, flipped_features=True, read_mesh=False
+    )
+    target_coord = get_patch_coords(params["target_precomp_dir"], target_name, "p1")
+    selected_vertices = None
+    if "target_point" in params:
+        dists = np.sqrt(
+            np.sum(np.square(np.asarray(target_pcd.points) - np.array(params["target_point"]["coord"])), axis=1)
+        )
+        selected_vertices = np.where(dists < params["target_point"]["cutoff"])[0]
+    site_vixs = get_target_vix(
+        target_coord, target_iface, num_sites=params["num_sites"], selected_vertices=selected_vertices
+    )
+    return target_pcd, target_desc, target_coord, site_vixs
+
+
+def dock_both(name, source_vix, target_patch, target_patch_descs, params, seed):
+    """ Dock one seed with both engines; returns per-patch fitness, RMSD and engine timings. """
+    source_paths = {
+        "surf_dir": params["seed_surf_dir"],
+        "iface_dir": params["seed_iface_dir"],
+        "desc_dir": params["seed_desc_dir"],
+    }
+    source_data = load_seed(name[0], name[1], source_paths, params["seed_precomp_dir"], params)
+    source_coord = source_data.patch_coords(source_vix)
+    out = {}
+    for engine in ["open3d", "batch"]:
+        np.random.seed(seed)
+        source_pcd = source_data.pcd()
+        source_pcd.transform(get_center_and_random_rotate(source_pcd))
+        engine_params = dict(params, registration_engine=engine)
+        tic = time.time()
+        results, patches, _, _ = multidock(
+            source_pcd, source_coord, source_data.desc, source_vix, target_patch, target_patch_descs, engine_params
+        )
+        elapsed = time.time() - tic
+        fitness = np.array(
+            [len(r.correspondence_set) / float(len(np.asarray(p.points))) for r, p in zip(results, patches)]
+        )
+        out[engine] = (fitness, [np.asarray(p.points) for p in patches], elapsed)
+    rmsd = np.array(
+        [
+            np.sqrt(np.mean(np.sum(np.square(a - b), axis=1)))
+            for a, b in zip(out["open3d"][1], out["batch"][1])
+        ]
+    )
+    return out["open3d"][0], out["batch"][0], rmsd, out["open3d"][2], out["batch"][2]
+
+
+def benchmark_target(params, target_name, n_seeds, seed=0):
+    target_pcd, target_desc, target_coord, site_vixs = target_sites(params, target_name)
+    seed_ppi_pair_ids = sorted(os.listdir(params["seed_desc_dir"]))
+    matched_dicts = match_descriptors_batch(
+        seed_ppi_pair_ids, ["p1", "p2"], target_desc[0][np.array(site_vixs)], params
+    )
+    fitness_o3d, fitness_batch, rmsd = [], [], []
+    time_o3d = time_batch = 0.0
+    for site_vix, matched_dict in zip(site_vixs, matched_dicts):
+        target_patch, target_patch_descs, _ = get_patch_geo(
+            target_pcd, target_coord, site_vix, target_desc, flip_normals=True,
+            outward_shift=params["surface_outward_shift"],
+        )
+        for ix, name in enumerate(list(matched_dict.keys())[:n_seeds]):
+            f_o3d, f_batch, r, t_o3d, t_batch = dock_both(
+                name, matched_dict[name], target_patch, target_patch_descs, params, seed + ix
+            )
+            fitness_o3d.append(f_o3d)
+            fitness_batch.append(f_batch)
+            rmsd.append(r)
+            time_o3d += t_o3d
+            time_batch += t_batch
+    if len(rmsd) == 0:
+        print("{}: no matched seeds".format(target_name))
+        return
+    fitness_o3d = np.concatenate(fitness_o3d)
+    fitness_batch = np.concatenate(fitness_batch)
+    rmsd = np.concatenate(rmsd)
+    n = len(rmsd)
+    pass_o3d = fitness_o3d >= min_fitness
+    pass_batch = fitness_batch >= min_fitness
+    print("{}: {} patches from {} sites".format(target_name, n, len(site_vixs)))
+    print("    time per patch: open3d {:.4f}s, batch {:.4f}s ({:.1f}x)".format(
+        time_o3d / n, time_batch / n, time_o3d / max(time_batch, 1e-9)))
+    print("    pass fitness filter: open3d {:.3f}, batch {:.3f}, agreement {:.3f}".format(
+        np.mean(pass_o3d), np.mean(pass_batch), np.mean(pass_o3d == pass_batch)))
+    print("    mean fitness: open3d {:.3f}, batch {:.3f}".format(np.mean(fitness_o3d), np.mean(fitness_batch)))
+    both = pass_o3d & pass_batch
+    if np.any(both):
+        print("    pose RMSD when both pass: median {:.2f}A, below 2A {:.3f}".format(
+            np.median(rmsd[both]), np.mean(rmsd[both] < 2.0)))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-n", "--n_seeds", type=int, default=20, help="Matched seeds docked per site")
+    parser.add_argument("params", nargs="+", help="Parameter modules of the benchmark targets")
+    args = parser.parse_args()
+
+    for params_module in args.params:
+        params = importlib.import_module(params_module, package=None).params
+        fields = params_module.split("_")
+        benchmark_target(params, "{}_{}".format(fields[1], fields[2]), args.n_seeds)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+masif_seed_search_campaign.py: MaSIF seed search of several targets against the same seed
+library in one process.
+
+The sites of all targets are matched in a single pass over the seed library (one pass per
+group of targets with the same library and matching cutoffs), the scoring network is loaded
+once, and seeds matched by several targets are read once (seed_cache.py). Each target is
+otherwise searched as by masif_seed_search_nn.py, with its own parameters and output
+directory (params['out_dir_template']), results database and journal.
+
+Usage (same PYTHONPATH as masif_seed_search_nn.py, with the parameter modules on it):
+    python masif_seed_search_campaign.py campaign_file [seed_list]
+campaign_file has one target per line: "params_module target_name" (# starts a comment).
+"""
+
+import os
+import sys
+import importlib
+import numpy as np
+
+from alignment_utils import match_descriptors_batch
+from parallel_alignment import AlignmentPool, load_nn_score
+from seed_cache import get_seed_cache
+from search_target import SearchTarget
+
+# Parameters that define which seed patches match a site: targets that share them are matched together.
+match_params = [
+    "seed_desc_dir",
+    "seed_iface_dir",
+    "seed_db_dir",
+    "seed_db_codes",
+    "seed_db_code_margin",
+    "seed_db_rerank",
+    "seed_index_dir",
+    "seed_index_n_probe",
+    "seed_pdb_list",
+    "iface_cutoff",
+    "desc_dist_cutoff",
+]
+
+
+def read_campaign(campaign_fn):
+    """ (params, target_name) of every target of a campaign file. """
+    campaign = []
+    with open(campaign_fn) as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if len(line) == 0:
+                continue
+            params_module, target_name = line.split()
+            campaign.append((importlib.import_module(params_module, package=None).params, target_name))
+    return campaign
+
+
+def match_key(params):
+    return tuple(str(params.get(key)) for key in match_params)
+
+
+def match_campaign(targets, seed_ppi_pair_ids=None):
+    """
+    Matched seeds of the pending sites of every target ({target_ix: [matched_dict per site]}),
+    with one pass over the seed library per group of targets with the same match_key.
+    """
+    groups = {}
+    for target_ix, target in enumerate(targets):
+        groups.setdefault(match_key(target.params), []).append(target_ix)
+    all_matched_dicts = {}
+    for target_ixs in groups.values():
+        params = targets[target_ixs[0]].params
+        group_seeds = seed_ppi_pair_ids
+        if group_seeds is None:
+            group_seeds = np.array(os.listdir(params["seed_desc_dir"]))
+        site_descs = [
+            targets[ix].site_descs(targets[ix].pending_site_vixs)
+            for ix in target_ixs
+            if len(targets[ix].pending_site_vixs) > 0
+        ]
+        n_sites = sum(len(x) for x in site_descs)
+        print(
+            "Starting to match {} target descriptors of {} targets to descriptors from {} proteins; this may take a while.".format(
+                n_sites, len(target_ixs), len(group_seeds)
+            )
+        )
+        matched_dicts = []
+        if n_sites > 0:
+            matched_dicts = match_descriptors_batch(group_seeds, ["p1", "p2"], np.concatenate(site_descs, axis=0), params)
+        # Split the matches of the concatenated sites back per target.
+        start = 0
+        for ix in target_ixs:
+            n = len(targets[ix].pending_site_vixs)
+            all_matched_dicts[ix] = matched_dicts[start : start + n]
+            start += n
+    return all_matched_dicts
+
+
+if __name__ == "__main__":
+    campaign = read_campaign(sys.argv[1])
+    seed_ppi_pair_ids = None
+    if len(sys.argv) == 3:
+        # Use a split of the seed matches.
+        with open(sys.argv[2]) as seed_list:
+            seed_ppi_pair_ids = [x.rstrip() for x in seed_list.readlines()]
+
+    # Load every target and set up its output (sites finished by an earlier run are skipped).
+    targets = []
+    for params, target_name in campaign:
+        print("Loading target {}".format(target_name))
+        target = SearchTarget(params, target_name)
+        target.start_run(params["out_dir_template"].format(target_name), seed_ppi_pair_ids)
+        targets.append(target)
+
+    all_matched_dicts = match_campaign(targets, seed_ppi_pair_ids)
+
+    # One pool of alignment workers for all targets, forked before any network is loaded here.
+    num_workers = max([target.params.get("num_workers", 1) for target in targets] + [1])
+    pool = AlignmentPool(num_workers) if num_workers > 1 else None
+
+    # One scoring network per network file; with several alignment workers, each worker loads its own copy once.
+    nn_scores = {}
+    for target_ix, target in enumerate(targets):
+        params = target.params
+        print("Searching target {} ({} of {})".format(target.target_name, target_ix + 1, len(targets)))
+        nn_key = (params["nn_score_atomic_fn"], params["max_npoints"])
+        if params.get("num_workers", 1) <= 1 and nn_key not in nn_scores:
+            nn_scores[nn_key] = load_nn_score(params)
+        source_paths = {}
+        source_paths["surf_dir"] = params["seed_surf_dir"]
+        source_paths["iface_dir"] = params["seed_iface_dir"]
+        source_paths["desc_dir"] = params["seed_desc_dir"]
+        target.search_sites(all_matched_dicts[target_ix], source_paths, nn_scores.get(nn_key), pool=pool)
+        target.finish_run()
+    if pool is not None:
+        pool.close()
+
+    print(get_seed_cache(targets[0].params).report() if len(targets) > 0 else "No targets.")
+    print("Done!")
@@ -4,7 +4,6 @@ import os
 from argparse import ArgumentParser
 import shutil
 import importlib
-from pdb import set_trace
 
 import numpy as np
 from scipy.spatial import cKDTree
@@ -13,6 +12,7 @@ from Bio.PDB import PDBParser
 
 from alignment_evaluation_nn import AlignmentEvaluationNN
 from alignment_utils import get_target_vix, load_protein_pcd, get_patch_coords, compute_nn_score, get_patch_geo
+from seed_cache import load_seed
 from default_config.masif_opts import masif_opts
 
 
@@ -110,7 +110,8 @@ if __name__ == "__main__":
     binder_paths['surf_dir'] = params['binder_surf_dir'] 
     binder_paths['iface_dir'] = params['binder_iface_dir'] 
     binder_paths['desc_dir'] = params['binder_desc_dir']
-    binder_pcd, binder_desc, binder_iface = load_protein_pcd(binder_ppi_pair_id, binder_chain_ix, binder_paths, flipped_features=False, read_mesh=False)
+    binder_data = load_seed(binder_ppi_pair_id, binder_pid, binder_paths, params['binder_precomp_dir'], params)
+    binder_pcd, binder_desc, binder_iface = binder_data.pcd(), binder_data.desc, binder_data.iface
 
 
     # Output
@@ -146,7 +147,7 @@ if __name__ == "__main__":
         dists = np.sqrt(np.sum(np.square(np.asarray(binder_pcd.points) - mymesh.vertices[site_vix][None, :]), axis=1))
         binder_center_idx = np.argmin(dists)
 
-        binder_coord =  get_patch_coords(params['binder_precomp_dir'], binder_ppi_pair_id, binder_pid, cv=[binder_center_idx])
+        binder_coord = binder_data.patch_coords([binder_center_idx])
         binder_patch, binder_patch_descs, binder_patch_idx = get_patch_geo(binder_pcd, binder_coord, binder_center_idx, binder_desc, outward_shift=params['surface_outward_shift'])
 
         # Write out the patches themselves
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+materialise.py: Write aligned seed PDBs (and optionally seed patches) for a subset of the hits
+recorded in the results database of a seed search (results_sink.py), e.g. of a search run
+with params['output_mode'] = 'transform'.
+
+Files are written where the search itself writes them:
+    out_dir/site_<site_ix>/<ppi_pair_id>/<pdb>_<chain>_<point_id>.pdb (and _patch.ply)
+
+Usage (same PYTHONPATH as masif_seed_search_nn.py):
+    python materialise.py params_module target_name [--top N] [--sites 0 2] [--seeds 1ABC_A ...]
+                          [--patches] [-j n_processes]
+"""
+
+import os
+import importlib
+import multiprocessing
+from argparse import ArgumentParser
+
+from results_sink import Hit, db_filename, read_hits, seed_chain, write_hit
+
+
+def select_hits(rows, top=0, sites=None, seeds=None):
+    """ Rows of the selected sites and seed chains; with top > 0, the top best of each site. """
+    selected = []
+    count = {}
+    # read_hits returns the rows of each site best first.
+    for row in rows:
+        if sites is not None and row["site_ix"] not in sites:
+            continue
+        if seeds is not None and row["ppi_pair_id"] not in seeds and seed_chain(row["ppi_pair_id"], row["pid"]) not in seeds:
+            continue
+        count[row["site_ix"]] = count.get(row["site_ix"], 0) + 1
+        if top > 0 and count[row["site_ix"]] > top:
+            continue
+        selected.append(row)
+    return selected
+
+
+# Set before the pool starts; inherited by forked workers.
+materialise_state = {}
+
+
+def materialise_one(row):
+    site_outdir = os.path.join(materialise_state["outdir"], "site_{}".format(row["site_ix"]))
+    hit = Hit(**{key: row[key] for key in Hit._fields})
+    write_hit(hit, site_outdir, materialise_state["params"], patch=materialise_state["patches"])
+    return row
+
+
+def materialise(params, target_name, top=0, sites=None, seeds=None, patches=False, num_workers=1):
+    outdir = params["out_dir_template"].format(target_name)
+    rows = select_hits(read_hits(os.path.join(outdir, db_filename), target=target_name), top, sites, seeds)
+    print("Writing {} aligned seeds of {} to {}".format(len(rows), target_name, outdir))
+    materialise_state.update(outdir=outdir, params=params, patches=patches)
+    if num_workers <= 1:
+        for row in rows:
+            materialise_one(row)
+    else:
+        with multiprocessing.get_context("fork").Pool(num_workers) as pool:
+            # Group the hits of a seed so that a chunk reuses its cached surface (--patches).
+            rows = sorted(rows, key=lambda row: (row["ppi_pair_id"], row["pid"]))
+            for _ in pool.imap_unordered(materialise_one, rows, chunksize=16):
+                pass
+    materialise_state.clear()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("params", help="Parameter module of the search")
+    parser.add_argument("target_name")
+    parser.add_argument("--top", type=int, default=0, help="Best hits (NN score) per site; 0: all")
+    parser.add_argument("--sites", type=int, nargs="+", help="Site indices (site_<ix>); default: all")
+    parser.add_argument("--seeds", nargs="+", help="Seed ppi_pair_ids or chains (PDB_chain); default: all")
+    parser.add_argument("--patches", action="store_true", help="Also write the aligned seed patches")
+    parser.add_argument("-j", "--num_workers", type=int, default=1)
+    args = parser.parse_args()
+
+    params = importlib.import_module(args.params, package=None).params
+    materialise(
+        params,
+        args.target_name,
+        top=args.top,
+        sites=args.sites,
+        seeds=args.seeds,
+        patches=args.patches,
+        num_workers=args.num_workers,
+    )
@@ -0,0 +1,255 @@
+"""
+parallel_alignment.py: Second stage of MaSIF seed search (align_protein for every matched seed
+of a target site) on a pool of worker processes.
+
+The pool (AlignmentPool) is forked once per run and serves every site of every target, so
+each worker loads the alignment neural network once per network file and keeps its seed cache
+(seed_cache.py) across sites and targets. The network is not fork-safe once loaded, so the
+parent must not load it when num_workers > 1 (see load_nn_score). The data of a site (target
+patch, KD-trees, matched seeds and parameters) is written once to a file of the pool and read
+by each worker at its first task of that site. The output of each seed is captured in the
+worker and printed by the parent in the order of matched_dict, so logs and progress counters
+are the same as in a serial run.
+"""
+
+import io
+import os
+import sys
+import pickle
+import shutil
+import tempfile
+import multiprocessing
+from contextlib import redirect_stdout
+import numpy as np
+from scipy.spatial import cKDTree
+
+from geometry.open3d_import import Feature, PointCloud, Vector3dVector
+from alignment_utils import align_protein
+from seed_cache import get_seed_cache
+
+# State of a worker: the site it is aligning (site_fn and its data) and its networks.
+worker_state = {}
+
+
+def load_nn_score(params):
+    """ Load the alignment scoring network used by masif_seed_search_nn.py. """
+    from alignment_evaluation_nn import AlignmentEvaluationNN
+
+    nn_score = AlignmentEvaluationNN(
+        params["nn_score_atomic_fn"], selected_features=[0, 1, 2, 3], max_npoints=params["max_npoints"]
+    )
+    nn_score.restore_model()
+    return nn_score
+
+
+def seed_task(params, task_ix):
+    """
+    Reseed np.random before aligning the task_ix-th seed of a site (its index in matched_dict),
+    so that poses and scores do not depend on num_workers or on resuming from a journal.
+    """
+    np.random.seed((params.get("random_seed", 0) + task_ix) % (2 ** 32))
+
+
+def load_site(site_fn):
+    """ Data of a site written by AlignmentPool.start_site, with the target patch rebuilt. """
+    with open(site_fn, "rb") as f:
+        site = pickle.load(f)
+    points, normals, descs = site.pop("target_patch")
+    target_patch = PointCloud()
+    target_patch.points = Vector3dVector(points)
+    target_patch.normals = Vector3dVector(normals)
+    target_patch_descs = [Feature(), Feature(), Feature()]
+    target_patch_descs[0].data = descs
+    site.update(
+        target_patch=target_patch,
+        target_patch_descs=target_patch_descs,
+        target_ckdtree=cKDTree(points),
+    )
+    return site
+
+
+def align_one(task):
+    site_fn, task_ix, name = task
+    if worker_state.get("site_fn") != site_fn:
+        worker_state["site"] = load_site(site_fn)
+        worker_state["site_fn"] = site_fn
+    site = worker_state["site"]
+    params = site["params"]
+    # One network per network file, loaded by the first task that needs it.
+    nn_scores = worker_state.setdefault("nn_scores", {})
+    nn_key = (params["nn_score_atomic_fn"], params["max_npoints"])
+    if nn_key not in nn_scores:
+        nn_scores[nn_key] = load_nn_score(params)
+    seed_task(params, task_ix)
+    cache = get_seed_cache(params)
+    cache_hits, cache_misses = cache.hits, cache.misses
+    out = io.StringIO()
+    with redirect_stdout(out):
+        hits = align_protein(
+            name,
+            site["target_patch"],
+            site["target_patch_descs"],
+            site["target_ckdtree"],
+            site["target_ca_pcd_tree"],
+            site["target_pcd_tree"],
+            site["source_paths"],
+            site["matched_dict"],
+            nn_scores[nn_key],
+            site["site_outdir"],
+            params,
+        )
+    return out.getvalue(), hits, cache.hits - cache_hits, cache.misses - cache_misses
+
+
+class AlignmentPool:
+
+    """
+    Worker processes aligning the seeds of every site of a run. Create it before the parent
+    loads any network (workers are forked when it is created), and close it at the end.
+    """
+
+    def __init__(self, num_workers):
+        self.num_workers = num_workers
+        self.site_dir = tempfile.mkdtemp(prefix="masif_seed_search_sites_")
+        self.n_sites = 0
+        sys.stdout.flush()
+        self.pool = multiprocessing.get_context("fork").Pool(num_workers)
+
+    def start_site(self, target_patch, target_patch_descs, target_ca_pcd_tree, target_pcd_tree,
+                   source_paths, matched_dict, site_outdir, params):
+        """ Write the data of a site for the workers; returns the file that identifies it in tasks. """
+        site_fn = os.path.join(self.site_dir, "site_{}.pkl".format(self.n_sites))
+        self.n_sites += 1
+        # Open3D geometries are not picklable: the patch is sent as arrays.
+        site = dict(
+            target_patch=(
+                np.asarray(target_patch.points),
+                np.asarray(target_patch.normals),
+                np.asarray(target_patch_descs[0].data),
+            ),
+            target_ca_pcd_tree=target_ca_pcd_tree,
+            target_pcd_tree=target_pcd_tree,
+            source_paths=source_paths,
+            matched_dict=matched_dict,
+            site_outdir=site_outdir,
+            params=params,
+        )
+        with open(site_fn, "wb") as f:
+            pickle.dump(site, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return site_fn
+
+    def align(self, site_fn, tasks):
+        """ Results of align_one for the (index, name) tasks of a site, in the order of tasks. """
+        return self.pool.imap(align_one, [(site_fn, ix, name) for ix, name in tasks])
+
+    def end_site(self, site_fn):
+        # Every task of the site is done, so no worker reads the file again.
+        os.remove(site_fn)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        shutil.rmtree(self.site_dir, ignore_errors=True)
+
+    def terminate(self):
+        self.pool.terminate()
+        self.pool.join()
+        shutil.rmtree(self.site_dir, ignore_errors=True)
+
+
+def align_matched_seeds(
+    matched_dict,
+    target_patch,
+    target_patch_descs,
+    target_ckdtree,
+    target_ca_pcd_tree,
+    target_pcd_tree,
+    source_paths,
+    nn_score,
+    site_outdir,
+    params,
+    results_sink=None,
+    journal=None,
+    pool=None,
+):
+    """
+    Call align_protein for every seed in matched_dict, on params['num_workers'] processes
+    (default 1: serial, in this process, with nn_score). With several workers every seed is
+    aligned in the pool, even at sites with a single seed, and nn_score is not used: each
+    worker loads the network itself. pool (AlignmentPool) is the pool of the run; without it
+    a pool is created for this site only. The alignments returned by
+    align_protein (params['results_db']) are added to results_sink in the same order.
+    Seeds already aligned according to journal (search_journal.py) are skipped, and every
+    aligned seed is recorded in it.
+    """
+    num_workers = params.get("num_workers", 1)
+    names = list(matched_dict.keys())
+    # Tasks keep their index in matched_dict, so that they are reseeded the same way after a resume.
+    tasks = [(ix, name) for ix, name in enumerate(names) if journal is None or not journal.is_completed(name)]
+    if len(tasks) < len(names):
+        print("Skipping {} seeds aligned before (journal).".format(len(names) - len(tasks)))
+
+    def report_progress(ix, count_matched_fragments):
+        if (ix + 1) % 1000 == 0:
+            print(
+                "So far, MaSIF has aligned {} fragments from {} proteins.".format(
+                    count_matched_fragments, ix + 1
+                )
+            )
+
+    def add_hits(name, hits):
+        if results_sink is not None:
+            for hit in hits:
+                results_sink.add(hit)
+        if journal is not None:
+            journal.record(name, hits)
+
+    count_matched_fragments = 0
+    if len(tasks) == 0:
+        return
+    if num_workers <= 1:
+        if nn_score is None:
+            nn_score = load_nn_score(params)
+        for ix, name in tasks:
+            seed_task(params, ix)
+            hits = align_protein(
+                name,
+                target_patch,
+                target_patch_descs,
+                target_ckdtree,
+                target_ca_pcd_tree,
+                target_pcd_tree,
+                source_paths,
+                matched_dict,
+                nn_score,
+                site_outdir,
+                params,
+            )
+            add_hits(name, hits)
+            report_progress(ix, count_matched_fragments)
+            count_matched_fragments += len(matched_dict[name])
+        return
+
+    site_pool = pool if pool is not None else AlignmentPool(min(num_workers, len(tasks)))
+    try:
+        site_fn = site_pool.start_site(
+            target_patch, target_patch_descs, target_ca_pcd_tree, target_pcd_tree,
+            source_paths, matched_dict, site_outdir, params,
+        )
+        # imap returns results in submission order, whichever worker finishes first.
+        cache = get_seed_cache(params)
+        for (ix, name), (output, hits, cache_hits, cache_misses) in zip(tasks, site_pool.align(site_fn, tasks)):
+            sys.stdout.write(output)
+            add_hits(name, hits)
+            cache.hits += cache_hits
+            cache.misses += cache_misses
+            report_progress(ix, count_matched_fragments)
+            count_matched_fragments += len(matched_dict[name])
+        site_pool.end_site(site_fn)
+    except BaseException:
+        # A pool of the run is terminated by its owner.
+        if pool is None:
+            site_pool.terminate()
+        raise
+    if pool is None:
+        site_pool.close()
@@ -0,0 +1,65 @@
+"""
+patch_sampling.py: Farthest-point sampling of patch centres on a surface mesh.
+
+Neighbouring vertices of a seed surface have almost identical patches, which align to the
+same poses. A seed library built with a sampling spacing (seed_descriptor_db.py --fps_spacing)
+keeps only the patch centres chosen here: every vertex is within the spacing of a centre, and
+centres are at least the spacing apart. Distances are geodesic (along the mesh edges) or
+Euclidean.
+"""
+
+import numpy as np
+import scipy.linalg
+import scipy.sparse
+from scipy.sparse.csgraph import dijkstra
+
+fps_metrics = ["geodesic", "euclidean"]
+
+
+def mesh_graph(verts, faces):
+    """ Sparse adjacency matrix of a mesh, weighted by edge length (the graph of geodists). """
+    n = len(verts)
+    f = np.array(faces, dtype = int)
+    rowi = np.concatenate([f[:,0], f[:,0], f[:,1], f[:,1], f[:,2], f[:,2]], axis = 0)
+    rowj = np.concatenate([f[:,1], f[:,2], f[:,0], f[:,2], f[:,0], f[:,1]], axis = 0)
+    # Edges shared by two faces would be summed by the sparse matrix constructor.
+    _, unique_ix = np.unique(rowi * n + rowj, return_index=True)
+    rowi = rowi[unique_ix]
+    rowj = rowj[unique_ix]
+    edgew = scipy.linalg.norm(verts[rowi] - verts[rowj], axis=1)
+    return scipy.sparse.csr_matrix((edgew, (rowi, rowj)), shape=(n, n))
+
+
+def farthest_point_sampling(verts, spacing, faces=None, metric="geodesic", start=0):
+    """
+    Sorted indices of the vertices chosen by farthest-point sampling from vertex start, until
+    every vertex is within spacing of a chosen one. Geodesic distances need the faces and are
+    computed up to 2 * spacing; farther vertices (and other connected components) count as
+    equally far, the first of them being chosen next.
+    """
+    if metric not in fps_metrics:
+        raise ValueError("Unknown sampling metric {} (use one of {})".format(metric, fps_metrics))
+    verts = np.asarray(verts, dtype=np.float64)
+    if len(verts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if metric == "geodesic":
+        graph = mesh_graph(verts, faces)
+    min_dist = np.full(len(verts), np.inf)
+    centres = []
+    centre = start
+    while min_dist[centre] >= spacing:
+        centres.append(centre)
+        if metric == "geodesic":
+            dists = dijkstra(graph, directed=False, indices=centre, limit=2 * spacing)
+        else:
+            dists = np.sqrt(np.sum(np.square(verts - verts[centre]), axis=1))
+        np.minimum(min_dist, dists, out=min_dist)
+        centre = np.argmax(min_dist)
+    return np.sort(np.array(centres, dtype=np.int64))
+
+
+def sample_surface(ply_fn, spacing, metric="geodesic"):
+    """ farthest_point_sampling of the vertices of a surface (.ply) file. """
+    import pymesh
+    mesh = pymesh.load_mesh(ply_fn)
+    return farthest_point_sampling(mesh.vertices, spacing, faces=mesh.faces, metric=metric)
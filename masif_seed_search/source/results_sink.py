@@ -0,0 +1,214 @@
+"""
+results_sink.py: Single-table record of the alignments accepted by MaSIF seed search.
+
+With params['results_db'] set, align_protein does not write a .pdb and a .score file per
+accepted alignment; it returns the alignments (Hit) and the search adds them to a
+ResultsSink, one row per alignment in out_dir/results.sqlite:
+    target, site_ix, site_vix          target run and site
+    ppi_pair_id, pid, point_id         seed chain and index of the matched vertex (as in
+    source_vix                         the name of the .pdb file) and the vertex itself
+    nn_score, desc_dist_score          scores of the alignment
+    clashing_ca, clashing_heavy        clash counts
+    transformation                     float64 4x4 matrix (16 values, row major) that maps the
+                                       seed PDB, as stored in the library, onto the target
+                                       (includes the random rotation of the benchmark)
+With params['site_top_k'] > 0, only the site_top_k alignments of each site with the highest
+NN score are kept (a heap per site; earlier alignments win ties). Aligned PDBs are written
+for the kept alignments only, when the site is finished; with params['output_mode'] =
+'transform' (which implies results_db) no PDB is written at all, and materialise.py writes
+aligned PDBs and patches from the table for a chosen subset of hits.
+"""
+
+import os
+import heapq
+import sqlite3
+from collections import namedtuple
+import numpy as np
+
+db_filename = "results.sqlite"
+
+Hit = namedtuple(
+    "Hit",
+    [
+        "ppi_pair_id",
+        "pid",
+        "point_id",
+        "source_vix",
+        "nn_score",
+        "desc_dist_score",
+        "clashing_ca",
+        "clashing_heavy",
+        "transformation",
+    ],
+)
+
+columns = [
+    "target",
+    "site_ix",
+    "site_vix",
+    "ppi_pair_id",
+    "pid",
+    "point_id",
+    "source_vix",
+    "nn_score",
+    "desc_dist_score",
+    "clashing_ca",
+    "clashing_heavy",
+    "transformation",
+]
+
+create_table = """
+CREATE TABLE IF NOT EXISTS hits (
+    target TEXT, site_ix INTEGER, site_vix INTEGER,
+    ppi_pair_id TEXT, pid TEXT, point_id INTEGER, source_vix INTEGER,
+    nn_score REAL, desc_dist_score REAL, clashing_ca INTEGER, clashing_heavy INTEGER,
+    transformation BLOB
+)
+"""
+
+
+def seed_chain(ppi_pair_id, pid):
+    """ PDB chain name of a seed, e.g. 1ABC_A for (1ABC_A_B, p1). """
+    fields = ppi_pair_id.split("_")
+    return "{}_{}".format(fields[0], fields[1] if pid == "p1" else fields[2])
+
+
+def hit_filename(site_outdir, hit):
+    """ Base name (without extension) of the aligned PDB of a hit, as written by align_protein. """
+    return os.path.join(
+        site_outdir, hit.ppi_pair_id, "{}_{}".format(seed_chain(hit.ppi_pair_id, hit.pid), hit.point_id)
+    )
+
+
+def read_transformation(blob):
+    return np.frombuffer(blob, dtype=np.float64).reshape(4, 4)
+
+
+class ResultsSink:
+
+    """ Accepted alignments of one target run, kept per site and written to SQLite. """
+
+    def __init__(self, db_fn, target_name, top_k=0):
+        self.db_fn = db_fn
+        self.target_name = target_name
+        self.top_k = top_k
+        self.conn = sqlite3.connect(db_fn)
+        self.conn.execute(create_table)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS hits_site ON hits (target, site_ix)")
+        self.conn.commit()
+        self.site = None
+        self.heap = []
+        self.count = 0
+
+    def start_site(self, site_ix, site_vix):
+        self.site = (site_ix, site_vix)
+        self.heap = []
+        self.count = 0
+
+    def add(self, hit):
+        # Min-heap on (score, -arrival): the root is the lowest score, latest among ties.
+        entry = (hit.nn_score, -self.count, hit)
+        self.count += 1
+        if self.top_k <= 0 or len(self.heap) < self.top_k:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def end_site(self):
+        """ Write the kept hits of the current site (replacing earlier rows of the site); returns them best first. """
+        hits = [entry[2] for entry in sorted(self.heap, key=lambda x: x[:2], reverse=True)]
+        site_ix, site_vix = self.site
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM hits WHERE target = ? AND site_ix = ?", (self.target_name, int(site_ix))
+            )
+            self.conn.executemany(
+                "INSERT INTO hits VALUES ({})".format(", ".join("?" * len(columns))),
+                [
+                    (
+                        self.target_name,
+                        int(site_ix),
+                        int(site_vix),
+                        hit.ppi_pair_id,
+                        hit.pid,
+                        int(hit.point_id),
+                        int(hit.source_vix),
+                        float(hit.nn_score),
+                        float(hit.desc_dist_score),
+                        int(hit.clashing_ca),
+                        int(hit.clashing_heavy),
+                        np.asarray(hit.transformation, dtype=np.float64).tobytes(),
+                    )
+                    for hit in hits
+                ],
+            )
+        self.site = None
+        self.heap = []
+        return hits
+
+    def close(self):
+        self.conn.close()
+
+
+def uses_results_db(params):
+    return params.get("results_db", False) or params.get("output_mode", "pdb") == "transform"
+
+
+def open_results_sink(outdir, target_name, params):
+    """ ResultsSink of a target run if params['results_db'] is set (or implied), else None. """
+    if not uses_results_db(params):
+        return None
+    return ResultsSink(os.path.join(outdir, db_filename), target_name, top_k=params.get("site_top_k", 0))
+
+
+def write_hit(hit, site_outdir, params, patch=False):
+    """
+    Write the aligned seed PDB of a hit, named as by align_protein, and with patch=True the
+    aligned seed patch (surface points shifted outward as for the alignment) as _patch.ply.
+    """
+    from alignment_utils import write_aligned_seed, transform_coords
+    from seed_cache import load_seed
+    from simple_mesh import Simple_mesh
+
+    out_fn = hit_filename(site_outdir, hit)
+    os.makedirs(os.path.dirname(out_fn), exist_ok=True)
+    source_pdb_fn = os.path.join(params["seed_pdb_dir"], seed_chain(hit.ppi_pair_id, hit.pid) + ".pdb")
+    write_aligned_seed(out_fn, source_pdb_fn, hit.transformation)
+    if patch:
+        source_paths = {
+            "surf_dir": params["seed_surf_dir"],
+            "iface_dir": params["seed_iface_dir"],
+            "desc_dir": params["seed_desc_dir"],
+        }
+        source_data = load_seed(hit.ppi_pair_id, hit.pid, source_paths, params["seed_precomp_dir"], params)
+        patch_idxs = source_data.patch_coords([hit.source_vix])[hit.source_vix]
+        patch_pts = source_data.points[patch_idxs] + params["surface_outward_shift"] * source_data.normals[patch_idxs]
+        mesh = Simple_mesh(transform_coords(hit.transformation, patch_pts))
+        mesh.set_attribute("vertex_iface", source_data.iface[patch_idxs])
+        mesh.save_mesh(out_fn + "_patch.ply")
+
+
+def write_site_pdbs(hits, site_outdir, params):
+    """ Write the aligned seed PDB of every hit, unless params['output_mode'] is 'transform'. """
+    if params.get("output_mode", "pdb") == "transform":
+        return
+    for hit in hits:
+        write_hit(hit, site_outdir, params)
+
+
+def read_hits(db_fn, target=None):
+    """ Rows of a results database as a list of dicts (transformation as a 4x4 array), best first per site. """
+    conn = sqlite3.connect(db_fn)
+    query = "SELECT {} FROM hits".format(", ".join(columns))
+    args = ()
+    if target is not None:
+        query += " WHERE target = ?"
+        args = (target,)
+    query += " ORDER BY target, site_ix, nn_score DESC"
+    rows = []
+    for values in conn.execute(query, args):
+        row = dict(zip(columns, values))
+        row["transformation"] = read_transformation(row["transformation"])
+        rows.append(row)
+    conn.close()
+    return rows
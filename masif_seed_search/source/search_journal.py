@@ -0,0 +1,176 @@
+"""
+search_journal.py: Progress journal of a seed search, to resume runs that were killed.
+
+With params['journal'] set, masif_seed_search_nn.py appends one JSON line to
+out_dir/journal.jsonl whenever a unit of work is finished:
+    {"site_ix": 0, "seed": ["1ABC_A_B", "p1"], "hits": [...]}   all matched patches of a seed
+                                                                aligned at a site
+    {"site_ix": 0, "done": true}                                 site finished (results written)
+The hits of a seed are those returned by align_protein (results_sink.Hit) when results are
+recorded in a results database; otherwise align_protein has already written its files.
+
+When the search is started again, finished sites are skipped (they are not matched again),
+and the seeds already aligned at the other sites are skipped, their hits being added back to
+the results sink. The first line of the journal records the search parameters (journal_params),
+the target sites and a hash of the seed list of the run; if they have changed, the journal is
+started over.
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+
+from results_sink import Hit
+
+journal_filename = "journal.jsonl"
+
+# Parameters that change which seeds are matched, the poses they are aligned to, how the poses
+# are scored or accepted, and how hits are recorded.
+journal_params = [
+    "desc_dist_cutoff",
+    "iface_cutoff",
+    "nn_score_cutoff",
+    "allowed_CA_clashes",
+    "allowed_heavy_atom_clashes",
+    "nn_score_atomic_fn",
+    "max_npoints",
+    "registration_engine",
+    "registration_fitness_stop",
+    "ransac_radius",
+    "ransac_iter",
+    "surface_outward_shift",
+    "random_seed",
+    "seed_desc_dir",
+    "seed_iface_dir",
+    "seed_surf_dir",
+    "seed_precomp_dir",
+    "seed_pdb_dir",
+    "seed_db_dir",
+    "seed_db_codes",
+    "seed_db_code_margin",
+    "seed_db_rerank",
+    "seed_index_dir",
+    "seed_index_n_probe",
+    "seed_pdb_list",
+    "results_db",
+    "output_mode",
+    "site_top_k",
+]
+
+
+def hit_to_json(hit):
+    return [
+        hit.ppi_pair_id,
+        hit.pid,
+        int(hit.point_id),
+        int(hit.source_vix),
+        float(hit.nn_score),
+        float(hit.desc_dist_score),
+        int(hit.clashing_ca),
+        int(hit.clashing_heavy),
+        np.asarray(hit.transformation, dtype=np.float64).tolist(),
+    ]
+
+
+def hit_from_json(values):
+    return Hit(*values[:8], transformation=np.array(values[8]))
+
+
+class SearchJournal:
+
+    """ Finished sites and (site, seed) units of a target run, read back from and appended to a JSONL file. """
+
+    def __init__(self, fn, header):
+        self.fn = fn
+        self.done_sites = set()
+        self.completed = {}
+        self.hits = {}
+        self.site_ix = None
+        if os.path.exists(fn):
+            with open(fn) as f:
+                lines = f.readlines()
+            if len(lines) > 0 and self.parse(lines[0]) == header:
+                for line in lines[1:]:
+                    entry = self.parse(line)
+                    # A line cut by a killed run is skipped (and its unit redone).
+                    if entry is None:
+                        continue
+                    if entry.get("done", False):
+                        self.done_sites.add(entry["site_ix"])
+                    else:
+                        name = tuple(entry["seed"])
+                        self.completed.setdefault(entry["site_ix"], set()).add(name)
+                        self.hits.setdefault(entry["site_ix"], []).extend(hit_from_json(x) for x in entry["hits"])
+            else:
+                if len(lines) > 0:
+                    print("Search parameters changed since the journal {} was written; starting over.".format(fn))
+                os.remove(fn)
+        new_journal = not os.path.exists(fn)
+        self.out = open(fn, "a")
+        if new_journal:
+            self.write(header)
+        elif not lines[-1].endswith("\n"):
+            self.out.write("\n")
+
+    @staticmethod
+    def parse(line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def write(self, entry):
+        # One line per unit, flushed so that it survives the process being killed.
+        self.out.write(json.dumps(entry) + "\n")
+        self.out.flush()
+
+    def site_done(self, site_ix):
+        return int(site_ix) in self.done_sites
+
+    def start_site(self, site_ix):
+        self.site_ix = int(site_ix)
+
+    def is_completed(self, name):
+        return tuple(name) in self.completed.get(self.site_ix, ())
+
+    def site_hits(self):
+        """ Hits of the seeds already aligned at the current site, in the order they were found. """
+        return self.hits.get(self.site_ix, [])
+
+    def record(self, name, hits):
+        self.write({"site_ix": self.site_ix, "seed": list(name), "hits": [hit_to_json(hit) for hit in hits]})
+
+    def end_site(self):
+        self.write({"site_ix": self.site_ix, "done": True})
+        self.done_sites.add(self.site_ix)
+        self.completed.pop(self.site_ix, None)
+        self.hits.pop(self.site_ix, None)
+        self.site_ix = None
+
+    def close(self):
+        self.out.close()
+
+
+def seed_list_hash(seed_ppi_pair_ids):
+    """ SHA-1 of a seed list (in any order); None for the whole library. """
+    if seed_ppi_pair_ids is None:
+        return None
+    return hashlib.sha1("\n".join(sorted(str(x) for x in seed_ppi_pair_ids)).encode()).hexdigest()
+
+
+def open_journal(outdir, params, site_vixs, seed_ppi_pair_ids=None):
+    """
+    SearchJournal of a target run if params['journal'] is set, else None. seed_ppi_pair_ids is
+    the seed list the run was restricted to (None: all seeds of the library).
+    """
+    if not params.get("journal", False):
+        return None
+    header = {
+        "params": {key: params[key] for key in journal_params if key in params},
+        "site_vixs": [int(vix) for vix in site_vixs],
+        "seed_list": seed_list_hash(seed_ppi_pair_ids),
+    }
+    # Compare as read back from the file.
+    header = json.loads(json.dumps(header))
+    return SearchJournal(os.path.join(outdir, journal_filename), header)
@@ -0,0 +1,223 @@
+"""
+search_target.py: Target side of MaSIF seed search: surface, descriptors and structure of the
+target and the vertices of the searched sites (params['num_sites'], restricted to
+params['target_residue'] or params['target_point'] and params['selected_site_ixs']), and the
+search of its sites once seeds are matched (start_run, search_sites, finish_run), shared by
+masif_seed_search_nn.py and masif_seed_search_campaign.py.
+"""
+
+import os
+import shutil
+import numpy as np
+import pymesh
+from scipy.spatial import cKDTree
+from Bio.PDB import PDBParser
+
+from alignment_utils import get_patch_coords, get_patch_geo, get_target_vix, load_protein_pcd
+from parallel_alignment import AlignmentPool, align_matched_seeds
+from results_sink import open_results_sink, write_site_pdbs
+from search_journal import open_journal
+
+
+class SearchTarget:
+
+    """ A target of seed search: everything needed from it to match seeds, and the search of its sites. """
+
+    def __init__(self, params, target_name):
+        self.params = params
+        self.target_name = target_name
+        target_ppi_pair_id = target_name
+        target_pid = 'p1'
+        target_chain_ix = 1
+
+        # Go through every 12A patch in the target protein -- get a sorted least in order of the highest iface mean in the patch
+        self.target_ply_fn = os.path.join(params['target_ply_iface_dir'], target_name+'.ply')
+        mymesh = pymesh.load_mesh(self.target_ply_fn)
+        iface = mymesh.get_attribute('vertex_iface')
+        self.target_coord = get_patch_coords(params['target_precomp_dir'], target_ppi_pair_id, target_pid)
+
+        # Define target paths (for interface scores, descriptors, ply files)
+        target_paths = {}
+        target_paths['surf_dir'] = params['target_surf_dir']
+        target_paths['iface_dir'] = params['target_iface_dir']
+        target_paths['desc_dir'] = params['target_desc_dir']
+
+        # Load the target point cloud, descriptors, interface and mesh.
+        self.target_pcd, self.target_desc, self.target_iface, self.target_mesh = load_protein_pcd(
+                target_ppi_pair_id, target_chain_ix, target_paths, flipped_features=True, read_mesh=True)
+
+        # Open the pdb structure of the target, load into point clouds for fast access.
+        parser = PDBParser()
+        self.target_pdb_path = os.path.join(params['target_pdb_dir'],'{}.pdb'.format(target_name))
+        target_struct = parser.get_structure(self.target_pdb_path, self.target_pdb_path)
+        target_atom_coords = [atom.get_coord() for atom in target_struct.get_atoms() if not atom.get_name().startswith('H') ]
+        target_ca_coords = [atom.get_coord() for atom in target_struct.get_atoms() if atom.get_id() == 'CA']
+        # Create kdtree search trees (for fast comparision).
+        self.target_ca_pcd_tree = cKDTree(np.array(target_ca_coords))
+        self.target_pcd_tree = cKDTree(np.array(target_atom_coords))
+
+        # If a specific residue is selected, then go after that residue
+        if 'target_residue' in params:
+            # Use the tuple for biopython: (' ', resid, ' ')
+            target_chain = params['target_residue']['chain']
+            target_cutoff = params['target_residue']['cutoff']
+            target_atom_id = params['target_residue']['atom_id']
+            target_resid = [x.id for x in target_struct[0][target_chain].get_residues() if x.id[1] == params['target_residue']['resid']]
+            assert len(target_resid) == 1, print(f"Target residue ID not unique: {target_resid}")
+            target_resid = target_resid[0]
+            print(f"Using residue: {target_resid}")
+            coord = target_struct[0][target_chain][target_resid][target_atom_id].get_coord()
+            # find atom indices close to the target.
+            dists = np.sqrt(np.sum(np.square(mymesh.vertices - coord), axis=1))
+            neigh_indices = np.where(dists<target_cutoff)[0]
+            # Get a target vertex for every target site.
+            target_vertices = get_target_vix(self.target_coord, iface,num_sites=params['num_sites'],selected_vertices=neigh_indices)
+
+        elif 'target_point' in params:
+            coord = np.array(params['target_point']['coord'])
+            target_cutoff = params['target_point']['cutoff']
+
+            # find atom indices close to the target.
+            dists = np.sqrt(np.sum(np.square(mymesh.vertices - coord), axis=1))
+            neigh_indices = np.where(dists < target_cutoff)[0]
+            # Get a target vertex for every target site.
+            target_vertices = get_target_vix(self.target_coord, iface, num_sites=params['num_sites'], selected_vertices=neigh_indices)
+
+        else:
+            # Get a target vertex for every target site.
+            target_vertices = get_target_vix(self.target_coord, iface,num_sites=params['num_sites'])
+
+        # Go through every target site in the target
+        if 'selected_site_ixs' in params:
+            self.site_ixs = params['selected_site_ixs']
+            self.site_vixs = [vix for ix,vix in enumerate(target_vertices) if ix in self.site_ixs]
+        else:
+            self.site_ixs = [ix for ix,vix in enumerate(target_vertices)]
+            self.site_vixs = target_vertices
+
+    def site_descs(self, site_vixs=None):
+        """ Descriptors of the site vertices (default: all searched sites), one row per site. """
+        if site_vixs is None:
+            site_vixs = self.site_vixs
+        return self.target_desc[0][np.array(site_vixs)]
+
+    def site_patch(self, site_vix):
+        """ Target patch, its descriptors and a KD-tree of its points at the site centred at site_vix. """
+        # Get the geodesic patch and descriptor patch for each target patch
+        target_patch, target_patch_descs, target_patch_idx = \
+                    get_patch_geo(self.target_pcd,self.target_coord,site_vix,\
+                            self.target_desc, flip_normals=True, outward_shift=self.params['surface_outward_shift'])
+
+        # Make a ckdtree with the target vertices.
+        target_ckdtree = cKDTree(target_patch.points)
+        return target_patch, target_patch_descs, target_ckdtree
+
+    def start_run(self, outdir, seed_ppi_pair_ids=None):
+        """
+        Set up the output of a search of this target in outdir: copies of the target files,
+        the results sink and the journal (of a search restricted to seed_ppi_pair_ids, if given).
+        Sets the sites still to search (pending_site_ixs, pending_site_vixs).
+        """
+        params = self.params
+        self.outdir = outdir
+        if not os.path.exists(outdir):
+            os.makedirs(outdir, exist_ok=True)
+
+        # Copy the pdb structure and the ply file of the target
+        shutil.copy(self.target_pdb_path, outdir)
+        shutil.copy(self.target_ply_fn, outdir)
+
+        # Table of accepted alignments (params['results_db'] or params['output_mode'] = 'transform'); None writes one .pdb and .score file per alignment.
+        self.results_sink = open_results_sink(outdir, self.target_name, params)
+
+        # Go through every target site in the target
+        site_ixs = self.site_ixs
+        site_vixs = self.site_vixs
+
+        # Progress journal (params['journal']): sites finished by an earlier run of this search are skipped.
+        self.journal = open_journal(outdir, params, site_vixs, seed_ppi_pair_ids)
+        if self.journal is not None:
+            done_site_ixs = [ix for ix in site_ixs if self.journal.site_done(ix)]
+            if len(done_site_ixs) > 0:
+                print('Resuming search: skipping finished sites {}'.format(done_site_ixs))
+            site_vixs = [vix for ix,vix in zip(site_ixs,site_vixs) if not self.journal.site_done(ix)]
+            site_ixs = [ix for ix in site_ixs if not self.journal.site_done(ix)]
+        self.pending_site_ixs = site_ixs
+        self.pending_site_vixs = site_vixs
+
+    def search_sites(self, all_matched_dicts, source_paths, nn_score, pool=None):
+        """
+        Align the matched seeds (one dictionary per pending site) to every pending site.
+        With params['num_workers'] > 1, seeds are aligned on pool (AlignmentPool), or on a pool
+        created for the sites of this target.
+        """
+        params = self.params
+        if pool is None and params.get('num_workers', 1) > 1:
+            pool = AlignmentPool(params['num_workers'])
+            try:
+                self.search_sites(all_matched_dicts, source_paths, nn_score, pool=pool)
+            except BaseException:
+                pool.terminate()
+                raise
+            pool.close()
+            return
+        outdir = self.outdir
+        results_sink = self.results_sink
+        journal = self.journal
+
+        # Go through every selected site
+        for site_ix, site_vix, matched_dict in zip(self.pending_site_ixs,self.pending_site_vixs,all_matched_dicts):
+            print('Starting site {}\n'.format(site_vix))
+            site_outdir = os.path.join(outdir, 'site_{}'.format(site_ix))
+            if not os.path.exists(site_outdir):
+                os.makedirs(site_outdir, exist_ok=True)
+            # Get the geodesic patch and descriptor patch for each target patch, and a ckdtree with its vertices.
+            target_patch, target_patch_descs, target_ckdtree = self.site_patch(site_vix)
+
+            # Write out the patch itself.
+            out_patch = open(site_outdir+'/target.vert', 'w+')
+            for point in target_patch.points:
+                out_patch.write('{}, {}, {}\n'.format(point[0], point[1], point[2]))
+            out_patch.close()
+
+            if journal is not None:
+                journal.start_site(site_ix)
+            if len(matched_dict.keys())==0:
+                if journal is not None:
+                    journal.end_site()
+                continue
+
+            print(" ")
+            print("Second stage of MaSIF seed search: each matched descriptor is aligned and scored; this may take a while..")
+            if results_sink is not None:
+                results_sink.start_site(site_ix, site_vix)
+                # Hits of the seeds aligned at this site before the search was interrupted.
+                if journal is not None:
+                    for hit in journal.site_hits():
+                        results_sink.add(hit)
+            align_matched_seeds(matched_dict, \
+                        target_patch, \
+                        target_patch_descs, \
+                        target_ckdtree, \
+                        self.target_ca_pcd_tree, \
+                        self.target_pcd_tree, \
+                        source_paths, \
+                        nn_score, \
+                        site_outdir, \
+                        params, \
+                        results_sink=results_sink, \
+                        journal=journal, \
+                        pool=pool
+                        )
+            if results_sink is not None:
+                kept_hits = results_sink.end_site()
+                write_site_pdbs(kept_hits, site_outdir, params)
+                print('Kept {} of {} accepted alignments of site {}'.format(len(kept_hits), results_sink.count, site_ix))
+            if journal is not None:
+                journal.end_site()
+
+    def finish_run(self):
+        if self.results_sink is not None:
+            self.results_sink.close()
+        if self.journal is not None:
+            self.journal.close()
@@ -0,0 +1,140 @@
+"""
+seed_cache.py: In-process cache of the per-seed data read by the alignment stage of MaSIF seed
+search (surface points and normals, descriptors, interface scores and patch indices).
+
+A seed that matches several target sites, or several targets searched by the same process,
+is read from disk once: the PLY file, the interface and descriptor arrays and the patch
+indices (input_output/patch_indices.py) are loaded on the first request and kept as numpy
+arrays. Entries are keyed by (ppi_pair_id, pid) and evicted least-recently-used once their
+total size exceeds params['seed_cache_mb'] (default 1024; 0 disables the cache).
+
+With params['num_workers'] > 1, each alignment worker has its own cache for the lifetime of
+its pool; the hit and miss counts of the workers are added to the cache of the parent.
+"""
+
+import os
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+
+from geometry.open3d_import import PointCloud, Vector3dVector, read_point_cloud
+from input_output.patch_indices import load_patch_indices
+
+default_cache_mb = 1024
+
+
+class SeedData:
+
+    """ Surface, descriptors, interface scores and patch indices of one seed chain. """
+
+    def __init__(self, points, normals, desc, iface, patch_indices):
+        self.points = points
+        self.normals = normals
+        self.desc = desc
+        self.iface = iface
+        self.patch_indices = patch_indices
+        self.nbytes = sum(x.nbytes for x in (points, normals, desc, iface, patch_indices))
+        self.ca_coords = None
+        self.heavy_coords = None
+
+    def pcd(self):
+        """ A new point cloud of the surface (callers transform it in place). """
+        pcd = PointCloud()
+        pcd.points = Vector3dVector(self.points)
+        pcd.normals = Vector3dVector(self.normals)
+        return pcd
+
+    def patch_coords(self, cv):
+        """ Same as alignment_utils.get_patch_coords(..., cv=cv). """
+        return {key: self.patch_indices[key] for key in cv}
+
+    def structure_coords(self, pdb_fn):
+        """
+        CA and heavy-atom coordinates of the seed structure, parsed from pdb_fn on first use
+        (a few KB per seed; not counted in nbytes).
+        """
+        if self.ca_coords is None:
+            from Bio.PDB import PDBParser
+            from alignment_utils import get_structure_coords
+
+            structure = PDBParser().get_structure(os.path.basename(pdb_fn), pdb_fn)
+            self.ca_coords, _, self.heavy_coords = get_structure_coords(structure)
+        return self.ca_coords, self.heavy_coords
+
+
+def read_seed_data(ppi_pair_id, pid, paths, precomp_dir):
+    """ Read a seed chain from disk, as load_protein_pcd (straight descriptors) and get_patch_coords. """
+    fields = ppi_pair_id.split("_")
+    chain_number = 1 if pid == "p1" else 2
+    pdb_chain = "{}_{}".format(fields[0], fields[chain_number])
+    pcd = read_point_cloud(str(Path(paths["surf_dir"]) / "{}.ply".format(pdb_chain)))
+    iface = np.squeeze(np.load(Path(paths["iface_dir"]) / "pred_{}.npy".format(pdb_chain)))
+    desc = np.load(
+        Path(paths["desc_dir"]) / ppi_pair_id / "p{}_desc_straight.npy".format(chain_number)
+    )
+    # Read into memory (not memory-mapped): cached entries outlive many lookups.
+    patch_indices = load_patch_indices(os.path.join(precomp_dir, ppi_pair_id), pid, mmap_mode=None)
+    return SeedData(
+        np.array(pcd.points),
+        np.array(pcd.normals),
+        np.array([desc]),
+        iface,
+        patch_indices,
+    )
+
+
+class SeedCache:
+
+    """ LRU cache of SeedData bounded by the total size of the cached arrays. """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, ppi_pair_id, pid, paths, precomp_dir):
+        key = (ppi_pair_id, pid)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        data = read_seed_data(ppi_pair_id, pid, paths, precomp_dir)
+        if data.nbytes <= self.max_bytes:
+            self.entries[key] = data
+            self.nbytes += data.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+        return data
+
+    def report(self):
+        n_requests = self.hits + self.misses
+        return "Seed cache: {} hits, {} misses ({:.1f}% hit rate), {} evictions, {} seeds in {:.1f} MB".format(
+            self.hits,
+            self.misses,
+            100.0 * self.hits / max(n_requests, 1),
+            self.evictions,
+            len(self.entries),
+            self.nbytes / 2.0 ** 20,
+        )
+
+
+# Cache of this process, created by the first call to get_seed_cache.
+seed_cache = None
+
+
+def get_seed_cache(params):
+    global seed_cache
+    if seed_cache is None:
+        seed_cache = SeedCache(int(params.get("seed_cache_mb", default_cache_mb) * 2 ** 20))
+    return seed_cache
+
+
+def load_seed(ppi_pair_id, pid, paths, precomp_dir, params):
+    """ SeedData of a seed chain, from the cache of this process. """
+    return get_seed_cache(params).get(ppi_pair_id, pid, paths, precomp_dir)
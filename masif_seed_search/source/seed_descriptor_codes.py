@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+"""
+seed_descriptor_codes.py: Compressed descriptors of a seed descriptor database
+(seed_descriptor_db.py), so that a scan reads a few bytes per seed vertex instead of the
+float32 descriptor.
+
+Codes (written to the database directory):
+    pq        pq_codebooks.npy  float32 [M, 256, D / M]  per-library codebook of every subspace
+              pq_codes.npy      uint8   [N, M]           nearest centroid of every subvector
+              (product quantisation; D * 4 / M times smaller, e.g. 16x for D = 80, M = 20)
+    float16   descs_float16.npy float16 [N, D]           (2x smaller)
+With params['seed_db_codes'] = 'pq' (or 'float16'), match_descriptors computes the distance of
+every target descriptor to the codes (for pq, with a table of the squared distances of each
+target subvector to the centroids of its subspace: asymmetric distance computation). Pairs
+whose code distance is below desc_dist_cutoff * (1 + params['seed_db_code_margin']) are then
+re-ranked with the full descriptors (params['seed_db_rerank'], default True), which are read
+only for these pairs. Without re-ranking, or when descs.npy was removed (--drop_full), pairs
+are matched on the code distance alone.
+
+Usage: python seed_descriptor_codes.py -p params_module [--codes pq|float16] [-m n_subspaces]
+           [--drop_full] [--report n_queries]
+--report prints, for several margins, the recall and precision of the compressed scan against
+the exact scan, the fraction of pairs re-ranked and the scan time, and the size of the codes.
+"""
+
+import os
+import sys
+import time
+import importlib
+from argparse import ArgumentParser
+import numpy as np
+from numpy.lib.format import open_memmap
+from scipy.cluster.vq import kmeans2
+
+from seed_descriptor_db import SeedDescriptorDB, code_files, db_pids, squared_dists
+
+pq_centroids = 256
+
+
+def build_codes(db, kind="pq", n_subspaces=20, n_train=100000, seed=0):
+    """ Write the codes of kind ('pq' or 'float16') of every row of db to db.db_dir. """
+    if db.descs is None:
+        raise ValueError("{} has no full descriptors (removed with --drop_full); cannot build {} codes".format(db.db_dir, kind))
+    n_rows, n_dims = db.descs.shape
+    if kind == "float16":
+        descs_db = open_memmap(
+            os.path.join(db.db_dir, "descs_float16.npy"), mode="w+", dtype=np.float16, shape=(n_rows, n_dims)
+        )
+        for start, end in db.iter_blocks():
+            descs_db[start:end] = db.descs[start:end]
+        descs_db.flush()
+    elif kind == "pq":
+        if n_dims % n_subspaces != 0:
+            raise ValueError("{} subspaces do not divide {} descriptor dimensions".format(n_subspaces, n_dims))
+        sub_dims = n_dims // n_subspaces
+        # Train one codebook per subspace on a sample.
+        rng = np.random.RandomState(seed)
+        train_rows = np.sort(rng.choice(n_rows, min(n_train, n_rows), replace=False))
+        train = np.asarray(db.descs[train_rows], dtype=np.float64)
+        n_centroids = min(pq_centroids, len(train_rows))
+        codebooks = np.zeros((n_subspaces, pq_centroids, sub_dims), dtype=np.float32)
+        np.random.seed(seed)
+        for m in range(n_subspaces):
+            centroids, _ = kmeans2(train[:, m * sub_dims : (m + 1) * sub_dims], n_centroids, iter=20, minit="points")
+            codebooks[m, :n_centroids] = centroids
+            # Unused code values repeat the first centroid.
+            codebooks[m, n_centroids:] = centroids[0]
+        codes_db = open_memmap(
+            os.path.join(db.db_dir, "pq_codes.npy"), mode="w+", dtype=np.uint8, shape=(n_rows, n_subspaces)
+        )
+        codebooks_sq = np.sum(np.square(codebooks), axis=2)
+        for start, end in db.iter_blocks(1 << 16):
+            descs = np.asarray(db.descs[start:end])
+            for m in range(n_subspaces):
+                codes_db[start:end, m] = np.argmin(
+                    squared_dists(descs[:, m * sub_dims : (m + 1) * sub_dims], codebooks[m], codebooks_sq[m]), axis=1
+                )
+        codes_db.flush()
+        np.save(os.path.join(db.db_dir, "pq_codebooks.npy"), codebooks)
+    else:
+        raise ValueError("Unknown descriptor codes {} (use one of {})".format(kind, sorted(code_files)))
+    print(
+        "Wrote {} codes of {} descriptors to {} ({:.1f}x smaller than the descriptors)".format(
+            kind, n_rows, db.db_dir, db.descs.nbytes / float(codes_nbytes(db.db_dir, kind))
+        )
+    )
+
+
+def codes_nbytes(db_dir, kind):
+    return sum(os.path.getsize(os.path.join(db_dir, fn)) for fn in code_files[kind])
+
+
+class PQCodes:
+
+    """ Product-quantised descriptors, compared to target descriptors with distance tables. """
+
+    def __init__(self, db_dir):
+        self.codebooks = np.load(os.path.join(db_dir, "pq_codebooks.npy"))
+        self.codes = np.load(os.path.join(db_dir, "pq_codes.npy"), mmap_mode="r")
+
+    def squared_dists(self, rows, target_descs):
+        """ Squared distances [len(rows), n_targets] of the target descriptors to the codes of rows. """
+        n_subspaces, _, sub_dims = self.codebooks.shape
+        targets = np.asarray(target_descs, dtype=np.float32).reshape(len(target_descs), n_subspaces, sub_dims)
+        # tables[m, k, t]: squared distance of subvector m of target t to centroid k of subspace m.
+        tables = np.sum(np.square(self.codebooks[:, :, None, :] - targets.transpose(1, 0, 2)[:, None, :, :]), axis=3)
+        codes = np.asarray(self.codes[rows])
+        d2 = np.zeros((len(rows), len(targets)), dtype=np.float32)
+        for m in range(n_subspaces):
+            d2 += tables[m][codes[:, m]]
+        return d2
+
+
+class Float16Codes:
+
+    """ Descriptors rounded to float16. """
+
+    def __init__(self, db_dir):
+        self.descs = np.load(os.path.join(db_dir, "descs_float16.npy"), mmap_mode="r")
+
+    def squared_dists(self, rows, target_descs):
+        """ Squared distances [len(rows), n_targets] of the target descriptors to the codes of rows. """
+        targets = np.asarray(target_descs, dtype=np.float32)
+        return squared_dists(self.descs[rows], targets, np.sum(np.square(targets), axis=1))
+
+
+code_classes = {"pq": PQCodes, "float16": Float16Codes}
+
+
+def open_codes(db_dir):
+    """ {kind: codes} of the codes written to db_dir. """
+    return {
+        kind: code_classes[kind](db_dir)
+        for kind, fns in code_files.items()
+        if all(os.path.exists(os.path.join(db_dir, fn)) for fn in fns)
+    }
+
+
+def codes_report(db, kind, radius, iface_cutoff, n_queries=100, margins=(0.0, 0.05, 0.1, 0.2, 0.3), seed=0):
+    """
+    Match n_queries database descriptors (perturbed) in one batch scan of the full descriptors
+    and of the codes (without re-ranking, and re-ranked at several margins): recall and
+    precision against the full scan, fraction of pairs re-ranked and scan time.
+    """
+    if db.descs is None:
+        raise ValueError("{} has no full descriptors (removed with --drop_full); the report needs them".format(db.db_dir))
+    rng = np.random.RandomState(seed)
+    queries = np.asarray(db.descs[np.sort(rng.choice(len(db), n_queries))])
+    queries = queries + rng.normal(scale=radius / np.sqrt(queries.shape[1]), size=queries.shape)
+    queries = queries.astype(np.float32)
+    params = {"iface_cutoff": iface_cutoff, "desc_dist_cutoff": radius, "seed_db_prefilter": False}
+
+    def scan(scan_params):
+        tic = time.time()
+        matched_dicts = db.match_descriptors_batch(db.proteins, db_pids, queries, scan_params)
+        found = set(
+            (target_ix, name, vix)
+            for target_ix, matched_dict in enumerate(matched_dicts)
+            for name, vixs in matched_dict.items()
+            for vix in vixs
+        )
+        return found, time.time() - tic
+
+    truth, scan_time = scan(params)
+    selected_proteins = np.ones(len(db.proteins), dtype=bool)
+    pid_mask = np.ones(len(db_pids), dtype=bool)
+    n_pairs = 0
+    for start, end in db.iter_blocks():
+        n_pairs += len(db.candidate_rows(start, end, selected_proteins, pid_mask, iface_cutoff)) * n_queries
+
+    print(
+        "{} codes: {:.1f} MB, descriptors: {:.1f} MB ({:.1f}x)".format(
+            kind, codes_nbytes(db.db_dir, kind) / 1e6, db.descs.nbytes / 1e6,
+            db.descs.nbytes / float(codes_nbytes(db.db_dir, kind)),
+        )
+    )
+    print("Full scan: {:.2f}s, {} matches".format(scan_time, len(truth)))
+    settings = [(False, 0.0)] + [(True, margin) for margin in margins]
+    for rerank, margin in settings:
+        scan_params = dict(params, seed_db_codes=kind, seed_db_rerank=rerank, seed_db_code_margin=margin)
+        found, elapsed = scan(scan_params)
+        n_reranked = 0
+        if rerank:
+            for start, end in db.iter_blocks():
+                rows = db.candidate_rows(start, end, selected_proteins, pid_mask, iface_cutoff)
+                d2 = db.codes[kind].squared_dists(rows, queries)
+                n_reranked += int(np.sum(d2 < (radius * (1 + margin)) ** 2))
+        print(
+            "{}: recall {:.4f}, precision {:.4f}, {:.3%} of {} pairs re-ranked, {:.2f}s".format(
+                "re-ranked, margin {}".format(margin) if rerank else "codes only",
+                len(found & truth) / float(max(len(truth), 1)),
+                len(found & truth) / float(max(len(found), 1)),
+                n_reranked / float(max(n_pairs, 1)),
+                n_pairs,
+                elapsed,
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-p", "--params", required=True, help="Seed search parameter module")
+    parser.add_argument("-d", "--db_dir", default=None, help="Database directory")
+    parser.add_argument("--codes", default="pq", choices=sorted(code_files), help="Kind of codes")
+    parser.add_argument("-m", "--n_subspaces", type=int, default=20, help="Number of product quantisation subspaces")
+    parser.add_argument("--drop_full", action="store_true", help="Delete the float32 descriptors after encoding")
+    parser.add_argument("--report", type=int, default=0, help="Number of queries of the report")
+    args = parser.parse_args()
+
+    params = importlib.import_module(args.params, package=None).params
+    db_dir = args.db_dir if args.db_dir is not None else params.get("seed_db_dir")
+    if db_dir is None:
+        print("Set params['seed_db_dir'] or pass -d.")
+        sys.exit(1)
+    db = SeedDescriptorDB(db_dir)
+    if db.descs is None and (args.codes not in db.codes or args.report > 0):
+        print(
+            "{} has no full descriptors (removed with --drop_full): cannot build {} codes or report; "
+            "rebuild the database with seed_descriptor_db.py.".format(db_dir, args.codes)
+        )
+        sys.exit(1)
+    if args.codes not in db.codes:
+        build_codes(db, args.codes, args.n_subspaces)
+        db = SeedDescriptorDB(db_dir)
+    if args.report > 0:
+        codes_report(db, args.codes, params["desc_dist_cutoff"], params["iface_cutoff"], args.report)
+    if args.drop_full:
+        descs_fn = os.path.join(db_dir, "descs.npy")
+        if os.path.exists(descs_fn):
+            # Scans of this database then match on the codes alone.
+            del db
+            os.remove(descs_fn)
+            print("Removed {}".format(descs_fn))
+        else:
+            print("{} was already removed".format(descs_fn))
@@ -0,0 +1,515 @@
+#!/usr/bin/env python
+"""
+seed_descriptor_db.py: Pack the MaSIF-search descriptors and MaSIF-site interface scores of a
+seed library into one memory-mapped database, so that match_descriptors scans a contiguous
+matrix instead of opening two files per seed.
+
+Database layout (one directory):
+    descs.npy     float32 [N, D]  straight descriptors of every seed vertex
+    iface.npy     float32 [N]     MaSIF-site interface score of every seed vertex
+    ids.npy       int32   [N, 3]  (protein index, pid index, vertex index) of every row
+    proteins.txt  ppi_pair_id of every protein index, one per line
+Rows of one (protein, pid) are contiguous and ordered by vertex. A database built with a
+sampling spacing (--fps_spacing, patch_sampling.py) has rows only for the patch centres chosen
+by farthest-point sampling of each seed surface; their ids keep the surface vertex indices.
+
+Optional PCA prefilter (build_pca_codes, written to the same directory):
+    pca_mean.npy        float64 [D]
+    pca_components.npy  float64 [D, K]  orthonormal principal axes
+    pca_codes.npy       float32 [N, K]  projection of every centred descriptor on the axes
+    pca_residuals.npy   float32 [N]     norm of the part of every centred descriptor off the axes
+Since the axes are orthonormal, |code(a) - code(b)|^2 + (|res(a)| - |res(b)|)^2 <= |a - b|^2.
+When these files exist, a scan first compares the K-dimensional codes and reads the full
+descriptors only of the (seed, target) pairs whose lower bound is below desc_dist_cutoff, so
+its result is unchanged (params['seed_db_prefilter'] = False scans without the prefilter).
+
+Compressed descriptors (product-quantised or float16 codes, seed_descriptor_codes.py) can be
+scanned instead of descs.npy with params['seed_db_codes'].
+
+Usage: python seed_descriptor_db.py -p params_module [-o db_dir] [-l seed_list]
+           [--fps_spacing spacing [--fps_metric geodesic|euclidean]]
+           [--pca n_components] [--report n_queries]
+The database is written to params['seed_db_dir'] unless -o is given; set params['seed_db_dir']
+in the search parameters to use it. --pca adds the prefilter to the database (built first if
+it does not exist yet); --report prints the recall, fraction of pairs kept by the prefilter and
+scan time with and without it.
+"""
+
+import os
+import sys
+import time
+import importlib
+from argparse import ArgumentParser
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from patch_sampling import fps_metrics, sample_surface
+
+db_pids = ["p1", "p2"]
+
+# Number of rows scanned at a time; bounds the temporary memory of a scan.
+scan_block_rows = 1 << 20
+
+pca_files = ["pca_mean.npy", "pca_components.npy", "pca_codes.npy", "pca_residuals.npy"]
+
+# Files of the compressed descriptors of every kind (seed_descriptor_codes.py).
+code_files = {"pq": ["pq_codebooks.npy", "pq_codes.npy"], "float16": ["descs_float16.npy"]}
+
+
+def squared_dists(descs, centers, centers_sq):
+    """ Squared distances [n, m] of descs to centers, with the |a|^2 + |b|^2 - 2ab expansion. """
+    descs = np.asarray(descs, dtype=np.float32)
+    d2 = np.sum(np.square(descs), axis=1)[:, None] + centers_sq[None, :]
+    d2 -= 2 * np.dot(descs, np.asarray(centers, dtype=np.float32).T)
+    return np.maximum(d2, 0)
+
+
+def descriptor_pairs(descs, target_descs, cutoff):
+    """
+    (row of descs, target index) of the descriptors within cutoff of the target descriptors,
+    found with the matrix-product expansion of the squared distance and rechecked with the
+    distance of alignment_utils.match_descriptors.
+    """
+    target_descs = np.asarray(target_descs)
+    targets_sq = np.sum(np.square(np.asarray(target_descs, dtype=np.float32)), axis=1)
+    d2 = squared_dists(descs, target_descs, targets_sq)
+    # Tolerance for the float32 rounding of the expansion.
+    tol = 1e-4 * (np.sum(np.square(np.asarray(descs, dtype=np.float32)), axis=1)[:, None] + targets_sq[None, :]) + 1e-6
+    cand_rows, cand_targets = np.where(d2 < cutoff ** 2 + tol)
+    diff = np.sqrt(np.sum(np.square(descs[cand_rows] - target_descs[cand_targets]), axis=1))
+    keep = diff < cutoff
+    return cand_rows[keep], cand_targets[keep]
+
+
+def seed_files(params, ppi_pair_id, pid):
+    """ Interface score and descriptor files of one seed chain, as read by match_descriptors. """
+    fields = ppi_pair_id.split("_")
+    if pid == "p1":
+        pdb_chain_id = fields[0] + "_" + fields[1]
+    else:
+        pdb_chain_id = fields[0] + "_" + fields[2]
+    iface_fn = params["seed_iface_dir"] + "/pred_" + pdb_chain_id + ".npy"
+    desc_fn = os.path.join(params["seed_desc_dir"], ppi_pair_id, pid + "_desc_straight.npy")
+    return iface_fn, desc_fn
+
+
+def seed_surface_file(params, ppi_pair_id, pid):
+    """ Surface (.ply) of one seed chain, whose vertices are those of its descriptors. """
+    fields = ppi_pair_id.split("_")
+    chain = fields[1] if pid == "p1" else fields[2]
+    return os.path.join(params["seed_surf_dir"], "{}_{}.ply".format(fields[0], chain))
+
+
+def build_seed_db(params, db_dir, ppi_pair_ids=None, fps_spacing=0.0, fps_metric="geodesic"):
+    """
+    Build the database in db_dir from params['seed_iface_dir'] and params['seed_desc_dir'].
+    ppi_pair_ids defaults to every directory of seed_desc_dir. Chains without both files are
+    skipped, like in match_descriptors. With fps_spacing > 0, only the patch centres chosen by
+    farthest-point sampling of the surfaces in params['seed_surf_dir'] are kept (chains
+    without a surface are skipped).
+    """
+    if ppi_pair_ids is None:
+        ppi_pair_ids = sorted(os.listdir(params["seed_desc_dir"]))
+    ppi_pair_ids = [x for x in ppi_pair_ids if ".npy" not in x and ".txt" not in x]
+
+    # First pass: find the chains with data and their sizes (descriptors are only mmapped).
+    entries = []
+    n_rows = 0
+    n_vertices = 0
+    n_dims = None
+    for protein_ix, ppi_pair_id in enumerate(ppi_pair_ids):
+        for pid_ix, pid in enumerate(db_pids):
+            try:
+                iface_fn, desc_fn = seed_files(params, ppi_pair_id, pid)
+                descs = np.load(desc_fn, mmap_mode="r")
+                if not os.path.exists(iface_fn):
+                    continue
+            except Exception:
+                continue
+            vixs = np.arange(len(descs))
+            if fps_spacing > 0:
+                surf_fn = seed_surface_file(params, ppi_pair_id, pid)
+                if not os.path.exists(surf_fn):
+                    continue
+                vixs = sample_surface(surf_fn, fps_spacing, fps_metric)
+                assert len(vixs) == 0 or vixs[-1] < len(descs), "{} has more vertices than {}".format(surf_fn, desc_fn)
+            n_dims = descs.shape[1]
+            entries.append((protein_ix, pid_ix, iface_fn, desc_fn, vixs))
+            n_rows += len(vixs)
+            n_vertices += len(descs)
+    if n_dims is None:
+        raise ValueError("No seed descriptors found in {}".format(params["seed_desc_dir"]))
+
+    if not os.path.exists(db_dir):
+        os.makedirs(db_dir)
+    # A prefilter or codes of an earlier database no longer match its rows.
+    for fn in pca_files + [fn for fns in code_files.values() for fn in fns]:
+        if os.path.exists(os.path.join(db_dir, fn)):
+            os.remove(os.path.join(db_dir, fn))
+    descs_db = open_memmap(
+        os.path.join(db_dir, "descs.npy"), mode="w+", dtype=np.float32, shape=(n_rows, n_dims)
+    )
+    iface_db = open_memmap(
+        os.path.join(db_dir, "iface.npy"), mode="w+", dtype=np.float32, shape=(n_rows,)
+    )
+    ids_db = open_memmap(
+        os.path.join(db_dir, "ids.npy"), mode="w+", dtype=np.int32, shape=(n_rows, 3)
+    )
+
+    # Second pass: copy.
+    start = 0
+    for count, (protein_ix, pid_ix, iface_fn, desc_fn, vixs) in enumerate(entries):
+        iface = np.load(iface_fn)[0]
+        descs = np.load(desc_fn)
+        assert len(iface) == len(descs), "{} and {} have different lengths".format(iface_fn, desc_fn)
+        n = len(vixs)
+        descs_db[start : start + n] = descs[vixs]
+        iface_db[start : start + n] = iface[vixs]
+        ids_db[start : start + n, 0] = protein_ix
+        ids_db[start : start + n, 1] = pid_ix
+        ids_db[start : start + n, 2] = vixs
+        start += n
+        if (count + 1) % 1000 == 0:
+            print("Packed {} chains ({} descriptors)".format(count + 1, start))
+    descs_db.flush()
+    iface_db.flush()
+    ids_db.flush()
+    with open(os.path.join(db_dir, "proteins.txt"), "w") as f:
+        for ppi_pair_id in ppi_pair_ids:
+            f.write(ppi_pair_id + "\n")
+    print(
+        "Wrote {} descriptors of {} chains from {} proteins to {}".format(
+            n_rows, len(entries), len(ppi_pair_ids), db_dir
+        )
+    )
+    if fps_spacing > 0:
+        print(
+            "Kept {} of {} vertices ({:.1%}) with {} sampling at {}A spacing".format(
+                n_rows, n_vertices, n_rows / float(max(n_vertices, 1)), fps_metric, fps_spacing
+            )
+        )
+
+
+def build_pca_codes(db, n_components=16, n_train=100000, seed=0):
+    """
+    Fit the principal axes of the descriptors of db on a sample of n_train rows and write the
+    PCA prefilter files (codes and residual norms of every row) to db.db_dir.
+    """
+    rng = np.random.RandomState(seed)
+    train_rows = np.sort(rng.choice(len(db), min(n_train, len(db)), replace=False))
+    train = np.asarray(db.descs[train_rows], dtype=np.float64)
+    mean = np.mean(train, axis=0)
+    _, singular_values, vt = np.linalg.svd(train - mean, full_matrices=False)
+    n_components = min(n_components, len(vt))
+    components = vt[:n_components].T
+    explained = np.sum(np.square(singular_values[:n_components])) / np.sum(np.square(singular_values))
+
+    codes_db = open_memmap(
+        os.path.join(db.db_dir, "pca_codes.npy"), mode="w+", dtype=np.float32, shape=(len(db), n_components)
+    )
+    residuals_db = open_memmap(
+        os.path.join(db.db_dir, "pca_residuals.npy"), mode="w+", dtype=np.float32, shape=(len(db),)
+    )
+    for start, end in db.iter_blocks(1 << 16):
+        codes, residuals = pca_encode(db.descs[start:end], mean, components)
+        codes_db[start:end] = codes
+        residuals_db[start:end] = residuals
+    codes_db.flush()
+    residuals_db.flush()
+    np.save(os.path.join(db.db_dir, "pca_mean.npy"), mean)
+    np.save(os.path.join(db.db_dir, "pca_components.npy"), components)
+    print(
+        "Wrote {}-dimensional PCA codes of {} descriptors ({:.1%} of the sample variance) to {}".format(
+            n_components, len(db), explained, db.db_dir
+        )
+    )
+
+
+def pca_encode(descs, mean, components):
+    """ Codes (float32 [n, K]) and residual norms (float32 [n]) of descs. """
+    centered = np.asarray(descs, dtype=np.float64) - mean
+    codes = np.dot(centered, components)
+    residuals = np.sqrt(np.maximum(np.sum(np.square(centered), axis=1) - np.sum(np.square(codes), axis=1), 0))
+    return codes.astype(np.float32), residuals.astype(np.float32)
+
+
+class PCAPrefilter:
+
+    """ Lower bounds of descriptor distances from the PCA codes written by build_pca_codes. """
+
+    def __init__(self, db_dir):
+        self.mean = np.load(os.path.join(db_dir, "pca_mean.npy"))
+        self.components = np.load(os.path.join(db_dir, "pca_components.npy"))
+        self.codes = np.load(os.path.join(db_dir, "pca_codes.npy"), mmap_mode="r")
+        self.residuals = np.load(os.path.join(db_dir, "pca_residuals.npy"), mmap_mode="r")
+
+    def candidate_pairs(self, rows, target_descs, cutoff):
+        """
+        (position in rows, target index) of the pairs whose distance lower bound is below
+        cutoff, i.e. every pair that can be within cutoff.
+        """
+        target_codes, target_residuals = pca_encode(target_descs, self.mean, self.components)
+        targets_sq = np.sum(np.square(target_codes), axis=1)
+        codes = np.asarray(self.codes[rows])
+        residuals = np.asarray(self.residuals[rows])
+        lb2 = squared_dists(codes, target_codes, targets_sq)
+        lb2 += np.square(residuals[:, None] - target_residuals[None, :])
+        # Tolerance for the float32 codes and the rounding of the expansion.
+        tol = (
+            1e-4
+            * (
+                (np.sum(np.square(codes), axis=1) + np.square(residuals))[:, None]
+                + (targets_sq + np.square(target_residuals))[None, :]
+            )
+            + 1e-6
+        )
+        return np.where(lb2 < cutoff ** 2 + tol)
+
+
+class SeedDescriptorDB:
+
+    """ Read-only view of a database written by build_seed_db. """
+
+    def __init__(self, db_dir):
+        from seed_descriptor_codes import open_codes
+
+        self.db_dir = db_dir
+        # Databases reduced to their codes (seed_descriptor_codes.py --drop_full) have no descs.npy.
+        self.descs = None
+        if os.path.exists(os.path.join(db_dir, "descs.npy")):
+            self.descs = np.load(os.path.join(db_dir, "descs.npy"), mmap_mode="r")
+        self.iface = np.load(os.path.join(db_dir, "iface.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(db_dir, "ids.npy"), mmap_mode="r")
+        with open(os.path.join(db_dir, "proteins.txt")) as f:
+            self.proteins = [line.rstrip("\n") for line in f]
+        self.protein_index = {name: ix for ix, name in enumerate(self.proteins)}
+        self.prefilter = None
+        if self.descs is not None and all(os.path.exists(os.path.join(db_dir, fn)) for fn in pca_files):
+            self.prefilter = PCAPrefilter(db_dir)
+        self.codes = open_codes(db_dir)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def select_proteins(self, directory_list, params):
+        """
+        Boolean mask over protein indices: proteins of directory_list (and of
+        params['seed_pdb_list'] if set), as filtered by match_descriptors.
+        Also returns the position of each protein in directory_list, used to order results.
+        """
+        selected = np.zeros(len(self.proteins), dtype=bool)
+        order = np.zeros(len(self.proteins), dtype=np.int64)
+        seed_pdb_list = set(params["seed_pdb_list"]) if "seed_pdb_list" in params else None
+        for position, ppi_pair_id in enumerate(directory_list):
+            if seed_pdb_list is not None and ppi_pair_id not in seed_pdb_list:
+                continue
+            protein_ix = self.protein_index.get(ppi_pair_id)
+            if protein_ix is not None and not selected[protein_ix]:
+                selected[protein_ix] = True
+                order[protein_ix] = position
+        return selected, order
+
+    def iter_blocks(self, block_rows=scan_block_rows):
+        for start in range(0, len(self), block_rows):
+            yield start, min(start + block_rows, len(self))
+
+    def candidate_rows(self, start, end, selected_proteins, pid_mask, iface_cutoff):
+        """ Rows in [start, end) of selected proteins/pids whose interface score passes. """
+        ids = self.ids[start:end]
+        keep = (np.asarray(self.iface[start:end]) > iface_cutoff) & selected_proteins[ids[:, 0]]
+        keep &= pid_mask[ids[:, 1]]
+        return start + np.where(keep)[0]
+
+    def match_descriptors(self, directory_list, pids, target_desc, params):
+        """ Same result as alignment_utils.match_descriptors, scanning the database. """
+        selected_proteins, order = self.select_proteins(directory_list, params)
+        pid_mask = np.array([pid in pids for pid in db_pids])
+        matched_rows = []
+        for start, end in self.iter_blocks():
+            rows = self.candidate_rows(start, end, selected_proteins, pid_mask, params["iface_cutoff"])
+            if len(rows) == 0:
+                continue
+            matched_rows.append(rows[self.block_pairs(rows, target_desc[None, :], params)[0]])
+        n_proteins = int(np.sum(selected_proteins))
+        matched_rows = np.concatenate(matched_rows) if len(matched_rows) > 0 else []
+        if len(matched_rows) == 0:
+            print("matched no descriptors")
+            return {}
+        print(
+            "Scanned {} descriptors from {} proteins; matched {} based on descriptor similarity.".format(
+                len(self), n_proteins, len(matched_rows)
+            )
+        )
+        return self.rows_to_matched_dict(matched_rows, order)
+
+    def match_descriptors_batch(self, directory_list, pids, target_descs, params):
+        """
+        match_descriptors for several target descriptors ([n_targets, D]) in one scan of the
+        database; each returned dictionary equals the single-target result.
+        """
+        selected_proteins, order = self.select_proteins(directory_list, params)
+        pid_mask = np.array([pid in pids for pid in db_pids])
+        matched_rows = [[] for _ in range(len(target_descs))]
+        for start, end in self.iter_blocks():
+            rows = self.candidate_rows(start, end, selected_proteins, pid_mask, params["iface_cutoff"])
+            if len(rows) == 0:
+                continue
+            cand_rows, cand_targets = self.block_pairs(rows, target_descs, params)
+            for target_ix in np.unique(cand_targets):
+                matched_rows[target_ix].append(rows[cand_rows[cand_targets == target_ix]])
+        print(
+            "Scanned {} descriptors from {} proteins for {} target descriptors; matched {}.".format(
+                len(self),
+                int(np.sum(selected_proteins)),
+                len(target_descs),
+                [sum(len(r) for r in target_rows) for target_rows in matched_rows],
+            )
+        )
+        return [
+            self.rows_to_matched_dict(np.concatenate(target_rows), order) if len(target_rows) > 0 else {}
+            for target_rows in matched_rows
+        ]
+
+    def scan_codes(self, params):
+        """ Codes scanned instead of the descriptors (params['seed_db_codes']), or None. """
+        kind = params.get("seed_db_codes")
+        if kind is None and self.descs is None:
+            # Only the codes are left.
+            kind = next(iter(sorted(self.codes)), None)
+        if kind is None:
+            return None
+        if kind not in self.codes:
+            raise ValueError("{} has no {} codes (see seed_descriptor_codes.py)".format(self.db_dir, kind))
+        return self.codes[kind]
+
+    def block_pairs(self, rows, target_descs, params):
+        """
+        (position in rows, target index) of the seed vertices of rows within
+        params['desc_dist_cutoff'] of the target descriptors ([n_targets, D]).
+        Candidate pairs are found with the matrix-product expansion of the squared distance, or
+        from the PCA codes (a lower bound), and rechecked with the distance of
+        alignment_utils.match_descriptors, reading the full descriptors of the candidates only.
+        With compressed codes, candidates within the cutoff plus params['seed_db_code_margin']
+        are re-ranked in the same way (params['seed_db_rerank']), or matched on the code distance.
+        """
+        cutoff = params["desc_dist_cutoff"]
+        codes = self.scan_codes(params)
+        if codes is not None:
+            d2 = codes.squared_dists(rows, target_descs)
+            if self.descs is None or not params.get("seed_db_rerank", True):
+                return np.where(d2 < cutoff ** 2)
+            margin = params.get("seed_db_code_margin", 0.1)
+            cand_rows, cand_targets = np.where(d2 < (cutoff * (1 + margin)) ** 2)
+            read_rows, cand_inverse = np.unique(cand_rows, return_inverse=True)
+            cand_descs = np.asarray(self.descs[rows[read_rows]])[cand_inverse]
+        elif self.prefilter is not None and params.get("seed_db_prefilter", True):
+            cand_rows, cand_targets = self.prefilter.candidate_pairs(rows, target_descs, cutoff)
+            read_rows, cand_inverse = np.unique(cand_rows, return_inverse=True)
+            cand_descs = np.asarray(self.descs[rows[read_rows]])[cand_inverse]
+        else:
+            return descriptor_pairs(np.asarray(self.descs[rows]), target_descs, cutoff)
+        diff = np.sqrt(np.sum(np.square(cand_descs - target_descs[cand_targets]), axis=1))
+        keep = diff < cutoff
+        return cand_rows[keep], cand_targets[keep]
+
+    def rows_to_matched_dict(self, rows, order):
+        """ {(ppi_pair_id, pid): [vix, ...]} in the order match_descriptors would produce. """
+        return self.ids_to_matched_dict(np.asarray(self.ids[np.sort(rows)]), order)
+
+    def ids_to_matched_dict(self, ids, order):
+        """ Same as rows_to_matched_dict, from the (protein, pid, vertex) ids of the matches. """
+        sort_ix = np.lexsort((ids[:, 2], ids[:, 1], order[ids[:, 0]]))
+        ids = ids[sort_ix]
+        matched_dict = {}
+        for protein_ix, pid_ix, vix in ids:
+            name = (self.proteins[protein_ix], db_pids[pid_ix])
+            if name not in matched_dict:
+                matched_dict[name] = []
+            matched_dict[name].append(vix)
+        return matched_dict
+
+
+# Databases opened in this process, keyed by directory.
+open_dbs = {}
+
+
+def open_seed_db(db_dir):
+    if db_dir not in open_dbs:
+        open_dbs[db_dir] = SeedDescriptorDB(db_dir)
+    return open_dbs[db_dir]
+
+
+def prefilter_report(db, radius, iface_cutoff, n_queries=100, seed=0):
+    """
+    Match n_queries database descriptors (perturbed) in one batch scan with and without the
+    PCA prefilter: recall, fraction of (seed, target) pairs whose full descriptors are read
+    and scan time.
+    """
+    if db.prefilter is None:
+        raise ValueError("{} has no PCA prefilter (build it with --pca)".format(db.db_dir))
+    rng = np.random.RandomState(seed)
+    queries = np.asarray(db.descs[np.sort(rng.choice(len(db), n_queries))])
+    queries = queries + rng.normal(scale=radius / np.sqrt(queries.shape[1]), size=queries.shape)
+    queries = queries.astype(np.float32)
+    params = {"iface_cutoff": iface_cutoff, "desc_dist_cutoff": radius}
+
+    def as_set(matched_dicts):
+        return set(
+            (target_ix, name, vix)
+            for target_ix, matched_dict in enumerate(matched_dicts)
+            for name, vixs in matched_dict.items()
+            for vix in vixs
+        )
+
+    results = {}
+    for use_prefilter in [False, True]:
+        params["seed_db_prefilter"] = use_prefilter
+        tic = time.time()
+        results[use_prefilter] = as_set(db.match_descriptors_batch(db.proteins, db_pids, queries, params))
+        print("Scan {} the prefilter: {:.2f}s".format("with" if use_prefilter else "without", time.time() - tic))
+
+    n_pairs = 0
+    n_kept = 0
+    selected_proteins = np.ones(len(db.proteins), dtype=bool)
+    pid_mask = np.ones(len(db_pids), dtype=bool)
+    for start, end in db.iter_blocks():
+        rows = db.candidate_rows(start, end, selected_proteins, pid_mask, iface_cutoff)
+        n_pairs += len(rows) * n_queries
+        n_kept += len(db.prefilter.candidate_pairs(rows, queries, radius)[0])
+    n_true = len(results[False])
+    print(
+        "{}-dimensional codes: recall {:.4f} ({} matches), {:.2%} of {} pairs read in full".format(
+            db.prefilter.codes.shape[1],
+            len(results[True] & results[False]) / float(max(n_true, 1)),
+            n_true,
+            n_kept / float(max(n_pairs, 1)),
+            n_pairs,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-p", "--params", required=True, help="Seed search parameter module")
+    parser.add_argument("-o", "--out_dir", default=None, help="Database directory")
+    parser.add_argument("-l", "--seed_list", default=None, help="File with the ppi_pair_ids to pack")
+    parser.add_argument("--fps_spacing", type=float, default=0.0, help="Keep patch centres this far apart (A); 0: all vertices")
+    parser.add_argument("--fps_metric", default="geodesic", choices=fps_metrics, help="Distance of the patch centre sampling")
+    parser.add_argument("--pca", type=int, default=0, help="Number of PCA components of the prefilter")
+    parser.add_argument("--report", type=int, default=0, help="Number of queries of the prefilter report")
+    args = parser.parse_args()
+
+    params = importlib.import_module(args.params, package=None).params
+    db_dir = args.out_dir if args.out_dir is not None else params.get("seed_db_dir")
+    if db_dir is None:
+        print("Set params['seed_db_dir'] or pass -o.")
+        sys.exit(1)
+    ppi_pair_ids = None
+    if args.seed_list is not None:
+        ppi_pair_ids = [x.rstrip() for x in open(args.seed_list) if x.strip()]
+    if (args.pca == 0 and args.report == 0) or not os.path.exists(os.path.join(db_dir, "ids.npy")):
+        build_seed_db(params, db_dir, ppi_pair_ids, fps_spacing=args.fps_spacing, fps_metric=args.fps_metric)
+    if args.pca > 0:
+        build_pca_codes(SeedDescriptorDB(db_dir), args.pca)
+    if args.report > 0:
+        prefilter_report(SeedDescriptorDB(db_dir), params["desc_dist_cutoff"], params["iface_cutoff"], args.report)
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+"""
+seed_descriptor_index.py: Inverted-file (IVF) index over the interface descriptors of a seed
+descriptor database (seed_descriptor_db.py), for the radius queries of match_descriptors.
+
+Seed vertices whose interface score passes the build cutoff are clustered with k-means and
+stored list by list, so that a query reads only the lists it visits. A list is visited only if
+its ball (centroid, radius of its furthest member) intersects the query ball; by the triangle
+inequality this pruning never loses a match. n_probe additionally caps the number of visited
+lists to the n_probe nearest centroids, trading recall for speed.
+
+Index layout (one directory):
+    centroids.npy     float32 [K, D]
+    radii.npy         float32 [K]     distance from each centroid to its furthest member
+    list_offsets.npy  int64   [K+1]   rows of list k are list_offsets[k]:list_offsets[k+1]
+    descs.npy         float32 [M, D]  descriptors, grouped by list
+    iface.npy         float32 [M]
+    ids.npy           int32   [M, 3]  (protein index, pid index, vertex index) into the database
+    info.txt          database directory, number of rows and SHA-1 of proteins.txt of the
+                      database, and interface cutoff used to build the index
+
+Usage: python seed_descriptor_index.py -p params_module [-o index_dir] [-k n_lists]
+           [--report n_queries]
+The index is written to params['seed_index_dir'] unless -o is given, from the database in
+params['seed_db_dir']. --report prints recall and query time of several n_probe values
+against the exact scan. An index is opened with the database of params['seed_db_dir'] (or the
+one it was built from), and must be rebuilt when that database is rebuilt.
+"""
+
+import os
+import sys
+import time
+import hashlib
+import importlib
+from argparse import ArgumentParser
+import numpy as np
+from numpy.lib.format import open_memmap
+from scipy.cluster.vq import kmeans2
+
+from seed_descriptor_db import SeedDescriptorDB, open_seed_db, db_pids, squared_dists
+
+# Slack added to the pruning bound to absorb float32 rounding of the distances.
+prune_eps = 1e-4
+
+
+def db_checksum(db_dir):
+    """ SHA-1 of the protein list of a database, to check that an index still matches it. """
+    with open(os.path.join(db_dir, "proteins.txt"), "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def build_seed_index(db, index_dir, iface_cutoff, n_lists=None, n_train=100000, seed=0):
+    """ Build an IVF index of the rows of db whose interface score is above iface_cutoff. """
+    if db.descs is None:
+        raise ValueError("{} has no full descriptors (removed with --drop_full); cannot build an index".format(db.db_dir))
+    # Rows kept by the index, found block by block.
+    rows = []
+    for start, end in db.iter_blocks():
+        rows.append(start + np.where(np.asarray(db.iface[start:end]) > iface_cutoff)[0])
+    rows = np.concatenate(rows)
+    if len(rows) == 0:
+        raise ValueError("No seed vertex with an interface score above {}".format(iface_cutoff))
+    if n_lists is None:
+        n_lists = int(max(1, min(len(rows) // 32, 4 * np.sqrt(len(rows)))))
+
+    # Train k-means on a sample.
+    rng = np.random.RandomState(seed)
+    train_rows = np.sort(rng.choice(rows, min(n_train, len(rows)), replace=False))
+    np.random.seed(seed)
+    centroids, _ = kmeans2(
+        np.asarray(db.descs[train_rows], dtype=np.float64), n_lists, iter=20, minit="points"
+    )
+    centroids = centroids.astype(np.float32)
+    centroids_sq = np.sum(np.square(centroids), axis=1)
+
+    # Assign every kept row to its nearest centroid.
+    assignment = np.zeros(len(rows), dtype=np.int64)
+    block_rows = 1 << 16
+    for start in range(0, len(rows), block_rows):
+        block = rows[start : start + block_rows]
+        assignment[start : start + block_rows] = np.argmin(
+            squared_dists(db.descs[block], centroids, centroids_sq), axis=1
+        )
+    order = np.argsort(assignment, kind="mergesort")
+    counts = np.bincount(assignment, minlength=n_lists)
+    list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    if not os.path.exists(index_dir):
+        os.makedirs(index_dir)
+    n_dims = db.descs.shape[1]
+    descs_ix = open_memmap(
+        os.path.join(index_dir, "descs.npy"), mode="w+", dtype=np.float32, shape=(len(rows), n_dims)
+    )
+    iface_ix = open_memmap(
+        os.path.join(index_dir, "iface.npy"), mode="w+", dtype=np.float32, shape=(len(rows),)
+    )
+    ids_ix = open_memmap(
+        os.path.join(index_dir, "ids.npy"), mode="w+", dtype=np.int32, shape=(len(rows), 3)
+    )
+    radii = np.zeros(n_lists, dtype=np.float32)
+    for k in range(n_lists):
+        start, end = list_offsets[k], list_offsets[k + 1]
+        if start == end:
+            continue
+        # Sorted rows read the database sequentially.
+        list_rows = np.sort(rows[order[start:end]])
+        descs = np.asarray(db.descs[list_rows])
+        descs_ix[start:end] = descs
+        iface_ix[start:end] = db.iface[list_rows]
+        ids_ix[start:end] = db.ids[list_rows]
+        radii[k] = np.max(np.sqrt(np.sum(np.square(descs - centroids[k]), axis=1)))
+    descs_ix.flush()
+    iface_ix.flush()
+    ids_ix.flush()
+    np.save(os.path.join(index_dir, "centroids.npy"), centroids)
+    np.save(os.path.join(index_dir, "radii.npy"), radii)
+    np.save(os.path.join(index_dir, "list_offsets.npy"), list_offsets)
+    with open(os.path.join(index_dir, "info.txt"), "w") as f:
+        f.write("db_dir {}\n".format(os.path.abspath(db.db_dir)))
+        f.write("db_rows {}\n".format(len(db)))
+        f.write("db_proteins_sha1 {}\n".format(db_checksum(db.db_dir)))
+        f.write("iface_cutoff {}\n".format(iface_cutoff))
+    print(
+        "Indexed {} of {} seed descriptors in {} lists (largest list: {})".format(
+            len(rows), len(db), n_lists, np.max(counts)
+        )
+    )
+
+
+class SeedDescriptorIndex:
+
+    """
+    Radius queries over an index written by build_seed_index, resolved against the database
+    db (or opened from db_dir, default: the database the index was built from).
+    """
+
+    def __init__(self, index_dir, db=None, db_dir=None):
+        self.index_dir = index_dir
+        info = {}
+        with open(os.path.join(index_dir, "info.txt")) as f:
+            for line in f:
+                key, value = line.rstrip("\n").split(" ", 1)
+                info[key] = value
+        self.iface_cutoff = float(info["iface_cutoff"])
+        if db is None:
+            db = open_seed_db(db_dir if db_dir is not None else info["db_dir"])
+        # ids.npy holds row indices into the database the index was built from.
+        if "db_rows" not in info or "db_proteins_sha1" not in info:
+            raise ValueError("Index {} does not record its seed database; remove it and run seed_descriptor_index.py again".format(index_dir))
+        if int(info["db_rows"]) != len(db) or info["db_proteins_sha1"] != db_checksum(db.db_dir):
+            raise ValueError(
+                "Index {} was built from a different seed database than {} ({} rows, now {}); "
+                "remove it and run seed_descriptor_index.py again".format(index_dir, db.db_dir, info["db_rows"], len(db))
+            )
+        self.db = db
+        self.centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+        self.centroids_sq = np.sum(np.square(self.centroids), axis=1)
+        self.radii = np.load(os.path.join(index_dir, "radii.npy"))
+        self.list_offsets = np.load(os.path.join(index_dir, "list_offsets.npy"))
+        self.descs = np.load(os.path.join(index_dir, "descs.npy"), mmap_mode="r")
+        self.iface = np.load(os.path.join(index_dir, "iface.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(index_dir, "ids.npy"), mmap_mode="r")
+
+    def probe_lists(self, target_desc, radius, n_probe=None):
+        """ Lists that can hold a point within radius of target_desc, nearest first. """
+        centroid_dists = np.sqrt(
+            squared_dists(target_desc[None, :], self.centroids, self.centroids_sq)[0]
+        )
+        lists = np.where(centroid_dists - self.radii < radius + prune_eps)[0]
+        lists = lists[np.argsort(centroid_dists[lists], kind="mergesort")]
+        if n_probe is not None:
+            lists = lists[:n_probe]
+        return lists
+
+    def query(self, target_desc, radius, iface_cutoff, n_probe=None):
+        """
+        Return the (protein, pid, vertex) ids and distances of the indexed seed vertices within
+        radius of target_desc and with an interface score above iface_cutoff.
+        Exact unless n_probe is set.
+        """
+        if iface_cutoff < self.iface_cutoff:
+            raise ValueError(
+                "Index built with iface_cutoff {}; cannot answer queries with {}".format(
+                    self.iface_cutoff, iface_cutoff
+                )
+            )
+        all_ids = []
+        all_dists = []
+        for k in np.sort(self.probe_lists(target_desc, radius, n_probe)):
+            start, end = self.list_offsets[k], self.list_offsets[k + 1]
+            diff = np.sqrt(np.sum(np.square(self.descs[start:end] - target_desc), axis=1))
+            keep = (diff < radius) & (np.asarray(self.iface[start:end]) > iface_cutoff)
+            if np.any(keep):
+                all_ids.append(np.asarray(self.ids[start:end])[keep])
+                all_dists.append(diff[keep])
+        if len(all_ids) == 0:
+            return np.zeros((0, 3), dtype=np.int32), np.zeros(0, dtype=np.float32)
+        return np.concatenate(all_ids), np.concatenate(all_dists)
+
+    def match_descriptors(self, directory_list, pids, target_desc, params):
+        """ Same result as alignment_utils.match_descriptors (exact unless n_probe is set). """
+        n_probe = params.get("seed_index_n_probe")
+        ids, _ = self.query(
+            target_desc, params["desc_dist_cutoff"], params["iface_cutoff"], n_probe
+        )
+        selected_proteins, order = self.db.select_proteins(directory_list, params)
+        pid_mask = np.array([pid in pids for pid in db_pids])
+        ids = ids[selected_proteins[ids[:, 0]] & pid_mask[ids[:, 1]]]
+        if len(ids) == 0:
+            print("matched no descriptors")
+            return {}
+        print(
+            "Searched {} indexed descriptors; matched {} based on descriptor similarity.".format(
+                len(self.ids), len(ids)
+            )
+        )
+        return self.db.ids_to_matched_dict(ids, order)
+
+
+# Indices opened in this process, keyed by directory.
+open_indices = {}
+
+
+def open_seed_index(index_dir, db_dir=None):
+    if (index_dir, db_dir) not in open_indices:
+        open_indices[(index_dir, db_dir)] = SeedDescriptorIndex(index_dir, db_dir=db_dir)
+    return open_indices[(index_dir, db_dir)]
+
+
+def recall_report(index, radius, iface_cutoff, n_queries=100, n_probes=(1, 2, 4, 8, 16, 32, 64), seed=0):
+    """
+    Query n_queries indexed descriptors (perturbed) and compare each n_probe setting against
+    the exact scan of the database (recall and median query time).
+    """
+    if index.db.descs is None:
+        raise ValueError("{} has no full descriptors (removed with --drop_full); the report needs them".format(index.db.db_dir))
+    rng = np.random.RandomState(seed)
+    queries = np.asarray(index.descs[np.sort(rng.choice(len(index.ids), n_queries))])
+    queries = queries + rng.normal(scale=radius / np.sqrt(queries.shape[1]), size=queries.shape)
+    queries = queries.astype(np.float32)
+    db = index.db
+
+    def exact(query):
+        found = []
+        for start, end in db.iter_blocks():
+            diff = np.sqrt(np.sum(np.square(db.descs[start:end] - query), axis=1))
+            keep = (diff < radius) & (np.asarray(db.iface[start:end]) > iface_cutoff)
+            found.append(np.asarray(db.ids[start:end])[keep])
+        return np.concatenate(found)
+
+    def as_set(ids):
+        return set(map(tuple, ids.tolist()))
+
+    tic = time.time()
+    truth = [as_set(exact(query)) for query in queries]
+    scan_time = (time.time() - tic) / n_queries
+    n_true = sum(len(t) for t in truth)
+    print("Exact scan: {:.4f}s per query, {:.1f} matches per query".format(scan_time, n_true / float(n_queries)))
+    for n_probe in list(n_probes) + [None]:
+        times = []
+        n_found = 0
+        n_lists = 0
+        for query, true_set in zip(queries, truth):
+            tic = time.time()
+            ids, _ = index.query(query, radius, iface_cutoff, n_probe)
+            times.append(time.time() - tic)
+            n_found += len(as_set(ids) & true_set)
+            n_lists += len(index.probe_lists(query, radius, n_probe))
+        print(
+            "n_probe={}: recall {:.4f}, {:.1f} lists visited, {:.4f}s per query".format(
+                "exact" if n_probe is None else n_probe,
+                n_found / float(max(n_true, 1)),
+                n_lists / float(n_queries),
+                np.median(times),
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-p", "--params", required=True, help="Seed search parameter module")
+    parser.add_argument("-o", "--out_dir", default=None, help="Index directory")
+    parser.add_argument("-k", "--n_lists", type=int, default=None, help="Number of lists")
+    parser.add_argument("--report", type=int, default=0, help="Number of queries of the recall report")
+    args = parser.parse_args()
+
+    params = importlib.import_module(args.params, package=None).params
+    index_dir = args.out_dir if args.out_dir is not None else params.get("seed_index_dir")
+    if index_dir is None or params.get("seed_db_dir") is None:
+        print("Set params['seed_db_dir'] and params['seed_index_dir'] (or pass -o).")
+        sys.exit(1)
+    db = SeedDescriptorDB(params["seed_db_dir"])
+    build = not os.path.exists(os.path.join(index_dir, "info.txt"))
+    if db.descs is None and (build or args.report > 0):
+        print(
+            "{} has no full descriptors (removed with --drop_full): cannot build an index or report; "
+            "rebuild the database with seed_descriptor_db.py.".format(params["seed_db_dir"])
+        )
+        sys.exit(1)
+    if build:
+        build_seed_index(db, index_dir, params["iface_cutoff"], args.n_lists)
+    if args.report > 0:
+        recall_report(
+            SeedDescriptorIndex(index_dir, db=db), params["desc_dist_cutoff"], params["iface_cutoff"], args.report
+        )
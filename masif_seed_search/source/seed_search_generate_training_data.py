@@ -11,7 +11,6 @@ import copy
 import scipy.sparse as spio
 from default_config.masif_opts import masif_opts
 import sys
-from IPython.core.debugger import set_trace
 from scipy.spatial import cKDTree
 import time
 import scipy.spatial 
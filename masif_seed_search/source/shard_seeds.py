@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+shard_seeds.py: Distributed MaSIF seed search of one target against a large seed library.
+
+1. split: write n seed lists (shard_000.txt, ...) that divide the library into shards of
+   similar alignment work. The weight of a seed is the number of its patches matched to the
+   sites of --target (one descriptor matching pass), or without --target the number of its
+   patches above params['iface_cutoff']. Seeds are assigned heaviest first to the lightest
+   shard (longest processing time first).
+       python shard_seeds.py split params_module -n 8 -o shard_dir [--target target_name]
+2. Run every shard as an independent search, with the seed list and the shard name:
+       python masif_seed_search_nn.py params_module target_name shard_dir/shard_003.txt shard_003
+   Its output goes to out_dir/shards/shard_003/ (see computational_benchmark/run_search_sharded.slurm).
+3. merge: rank the hits of all shards per site into out_dir/results.sqlite (keeping
+   params['site_top_k'] per site) and move the aligned PDBs of the kept hits to out_dir.
+       python shard_seeds.py merge params_module target_name
+Shard searches need a results database (params['results_db'] or params['output_mode'] =
+'transform', see results_sink.py).
+"""
+
+import os
+import heapq
+import shutil
+import importlib
+from argparse import ArgumentParser
+import numpy as np
+
+from results_sink import ResultsSink, Hit, db_filename, hit_filename, read_hits, uses_results_db
+
+shards_dirname = "shards"
+
+
+def shard_outdir(outdir, shard_name):
+    return os.path.join(outdir, shards_dirname, shard_name)
+
+
+def library_seeds(params):
+    """ ppi_pair_ids of the seed library, as scanned by masif_seed_search_nn.py. """
+    return sorted(x for x in os.listdir(params["seed_desc_dir"]) if ".npy" not in x and ".txt" not in x)
+
+
+def iface_weights(params, seed_ppi_pair_ids):
+    """ Number of patches of every seed that pass params['iface_cutoff'] (both chains). """
+    weights = {}
+    for ppi_pair_id in seed_ppi_pair_ids:
+        fields = ppi_pair_id.split("_")
+        weights[ppi_pair_id] = 0
+        for chain in fields[1:3]:
+            iface_fn = os.path.join(params["seed_iface_dir"], "pred_{}_{}.npy".format(fields[0], chain))
+            if os.path.exists(iface_fn):
+                weights[ppi_pair_id] += int(np.sum(np.load(iface_fn)[0] > params["iface_cutoff"]))
+    return weights
+
+
+def matched_weights(params, seed_ppi_pair_ids, target_name):
+    """ Number of patches of every seed matched to the sites of target_name. """
+    from alignment_utils import match_descriptors_batch
+    from search_target import SearchTarget
+
+    target = SearchTarget(params, target_name)
+    weights = {ppi_pair_id: 0 for ppi_pair_id in seed_ppi_pair_ids}
+    if len(target.site_vixs) == 0:
+        return weights
+    for matched_dict in match_descriptors_batch(seed_ppi_pair_ids, ["p1", "p2"], target.site_descs(), params):
+        for (ppi_pair_id, pid), vix in matched_dict.items():
+            weights[ppi_pair_id] += len(vix)
+    return weights
+
+
+def balance_shards(weights, n_shards):
+    """ Longest processing time first: each seed, heaviest first, goes to the lightest shard. """
+    shards = [[] for _ in range(n_shards)]
+    loads = [(0, shard_ix) for shard_ix in range(n_shards)]
+    for ppi_pair_id in sorted(weights, key=lambda x: (-weights[x], x)):
+        load, shard_ix = heapq.heappop(loads)
+        shards[shard_ix].append(ppi_pair_id)
+        heapq.heappush(loads, (load + weights[ppi_pair_id], shard_ix))
+    return [sorted(shard) for shard in shards]
+
+
+def split(params, n_shards, shard_dir, target_name=None):
+    seed_ppi_pair_ids = library_seeds(params)
+    if target_name is None:
+        weights = iface_weights(params, seed_ppi_pair_ids)
+    else:
+        weights = matched_weights(params, seed_ppi_pair_ids, target_name)
+    shards = balance_shards(weights, n_shards)
+    os.makedirs(shard_dir, exist_ok=True)
+    for shard_ix, shard in enumerate(shards):
+        with open(os.path.join(shard_dir, "shard_{:03d}.txt".format(shard_ix)), "w") as f:
+            f.writelines(ppi_pair_id + "\n" for ppi_pair_id in shard)
+        print("shard_{:03d}: {} seeds, weight {}".format(shard_ix, len(shard), sum(weights[x] for x in shard)))
+
+
+def merge(params, target_name):
+    if not uses_results_db(params):
+        raise ValueError("Merging shards needs params['results_db'] or params['output_mode'] = 'transform'.")
+    outdir = params["out_dir_template"].format(target_name)
+    shard_names = sorted(os.listdir(os.path.join(outdir, shards_dirname)))
+    # Hits of every site from every shard, in shard order (best first within a shard).
+    site_hits = {}
+    for shard_name in shard_names:
+        db_fn = os.path.join(shard_outdir(outdir, shard_name), db_filename)
+        if not os.path.exists(db_fn):
+            print("Shard {} has no results (not finished?)".format(shard_name))
+            continue
+        for row in read_hits(db_fn, target=target_name):
+            site_hits.setdefault((row["site_ix"], row["site_vix"]), []).append(
+                (shard_name, Hit(**{key: row[key] for key in Hit._fields}))
+            )
+
+    sink = ResultsSink(os.path.join(outdir, db_filename), target_name, top_k=params.get("site_top_k", 0))
+    for (site_ix, site_vix), hits in sorted(site_hits.items()):
+        # Seeds are disjoint across shards, so a hit is identified by its seed and point.
+        hit_shard = {}
+        sink.start_site(site_ix, site_vix)
+        for shard_name, hit in hits:
+            hit_shard[(hit.ppi_pair_id, hit.pid, hit.point_id)] = shard_name
+            sink.add(hit)
+        kept_hits = sink.end_site()
+        print("Site {}: kept {} of {} hits from {} shards".format(site_ix, len(kept_hits), len(hits), len(shard_names)))
+
+        site_dirname = "site_{}".format(site_ix)
+        site_outdir = os.path.join(outdir, site_dirname)
+        os.makedirs(site_outdir, exist_ok=True)
+        for shard_name in shard_names:
+            shard_site_outdir = os.path.join(shard_outdir(outdir, shard_name), site_dirname)
+            if os.path.exists(os.path.join(shard_site_outdir, "target.vert")):
+                shutil.copy(os.path.join(shard_site_outdir, "target.vert"), site_outdir)
+                break
+        if params.get("output_mode", "pdb") == "transform":
+            continue
+        for hit in kept_hits:
+            shard_site_outdir = os.path.join(
+                shard_outdir(outdir, hit_shard[(hit.ppi_pair_id, hit.pid, hit.point_id)]), site_dirname
+            )
+            source_fn = hit_filename(shard_site_outdir, hit) + ".pdb"
+            out_fn = hit_filename(site_outdir, hit) + ".pdb"
+            if os.path.exists(source_fn):
+                os.makedirs(os.path.dirname(out_fn), exist_ok=True)
+                os.replace(source_fn, out_fn)
+    sink.close()
+
+    # Target structure and surface, as copied by every shard.
+    for shard_name in shard_names:
+        for fn in os.listdir(shard_outdir(outdir, shard_name)):
+            if fn.endswith(".pdb") or fn.endswith(".ply"):
+                shutil.copy(os.path.join(shard_outdir(outdir, shard_name), fn), outdir)
+        break
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    subparsers = parser.add_subparsers(dest="command")
+    split_parser = subparsers.add_parser("split", help="Write balanced seed lists")
+    split_parser.add_argument("params", help="Parameter module of the search")
+    split_parser.add_argument("-n", "--n_shards", type=int, required=True)
+    split_parser.add_argument("-o", "--shard_dir", required=True)
+    split_parser.add_argument("--target", help="Balance by the patches matched to the sites of this target")
+    merge_parser = subparsers.add_parser("merge", help="Merge the shard results of a target")
+    merge_parser.add_argument("params", help="Parameter module of the search")
+    merge_parser.add_argument("target_name")
+    args = parser.parse_args()
+
+    params = importlib.import_module(args.params, package=None).params
+    if args.command == "split":
+        split(params, args.n_shards, args.shard_dir, target_name=args.target)
+    elif args.command == "merge":
+        merge(params, args.target_name)
+    else:
+        parser.print_help()
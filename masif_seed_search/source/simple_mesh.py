@@ -3,7 +3,6 @@
 # Use this to save patches or as part of the pymol plugin.
 # Pablo Gainza LPDI EPFL 2019
 import numpy as np
-from IPython.core.debugger import set_trace
 class Simple_mesh:
 
     def __init__(self, vertices=[], faces=[]):
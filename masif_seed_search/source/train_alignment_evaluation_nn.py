@@ -5,7 +5,6 @@ from scipy.spatial import cKDTree
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import roc_auc_score
 from tensorflow import keras
-from IPython.core.debugger import set_trace
 import os
 import time
 #import pandas as pd